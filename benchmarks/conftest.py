@@ -0,0 +1,55 @@
+# -*- coding: utf-8 -*-
+#
+# Copyright (C) 2015-2016 Hewlett Packard Enterprise Development LP
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#   http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing,
+# software distributed under the License is distributed on an
+# "AS IS" BASIS, WITHOUT WARRANTIES OR CONDITIONS OF ANY
+# KIND, either express or implied.  See the License for the
+# specific language governing permissions and limitations
+# under the License.
+
+"""
+Shared fixtures for the topology_lib_ip benchmarks.
+"""
+
+from __future__ import unicode_literals, absolute_import
+from __future__ import print_function, division
+
+from pytest import fixture
+
+
+class MockNode(object):
+    """
+    Engine node double that replies with canned outputs.
+
+    :param dict responses: Map of command prefixes to the raw output returned
+     when a command starting with that prefix is sent. The longest matching
+     prefix wins.
+    """
+
+    def __init__(self, responses):
+        self.responses = sorted(
+            responses.items(), key=lambda item: len(item[0]), reverse=True
+        )
+        self.ports = {}
+
+    def __call__(self, cmd, shell=None):
+        for prefix, response in self.responses:
+            if cmd.startswith(prefix):
+                return response
+        return ''
+
+
+@fixture
+def mock_node():
+    """
+    Factory of :class:`MockNode`.
+    """
+    return MockNode
@@ -0,0 +1,261 @@
+# -*- coding: utf-8 -*-
+#
+# Copyright (C) 2015-2016 Hewlett Packard Enterprise Development LP
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#   http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing,
+# software distributed under the License is distributed on an
+# "AS IS" BASIS, WITHOUT WARRANTIES OR CONDITIONS OF ANY
+# KIND, either express or implied.  See the License for the
+# specific language governing permissions and limitations
+# under the License.
+
+"""
+Corpus of ip command outputs for the benchmarks.
+
+The outputs of each iproute2 version are recorded for a single interface and
+turned into templates, which are replicated to build the output of nodes with
+any number of interfaces and addresses.
+"""
+
+from __future__ import unicode_literals, absolute_import
+from __future__ import print_function, division
+
+from json import dumps, loads
+
+
+# Single interface outputs of each iproute2 version, as templates.
+#
+# - ``addr``: 'ip addr show' header of an interface.
+# - ``inet`` and ``inet6``: address lines of 'ip addr show'.
+# - ``link``: 'ip -s link show' output of an interface.
+# - ``json``: 'ip -j -s -d addr show' output of an interface, if supported.
+VERSIONS = {
+    # RHEL 7 (iproute2-ss130716)
+    '3.10': {
+        'addr': (
+            '{index}: {dev}: <BROADCAST,MULTICAST,UP,LOWER_UP> mtu 1500 '
+            'qdisc pfifo_fast state UP qlen 1000\n'
+            '    link/ether {mac} brd ff:ff:ff:ff:ff:ff\n'
+        ),
+        'inet': (
+            '    inet {address}/{prefix} brd {broadcast} scope global {dev}\n'
+            '       valid_lft forever preferred_lft forever\n'
+        ),
+        'inet6': (
+            '    inet6 {address}/{prefix} scope global \n'
+            '       valid_lft forever preferred_lft forever\n'
+        ),
+        'link': (
+            '{index}: {dev}: <BROADCAST,MULTICAST,UP,LOWER_UP> mtu 1500 '
+            'qdisc pfifo_fast state UP mode DEFAULT qlen 1000\n'
+            '    link/ether {mac} brd ff:ff:ff:ff:ff:ff\n'
+            '    RX: bytes  packets  errors  dropped overrun mcast   \n'
+            '    {rx_bytes:<10d} {rx_packets:<8d} 0       0       0       0'
+            '       \n'
+            '    TX: bytes  packets  errors  dropped carrier collsns \n'
+            '    {tx_bytes:<10d} {tx_packets:<8d} 0       0       0       0'
+            '       \n'
+        ),
+        'json': None
+    },
+    # Debian 9 (iproute2-ss161212)
+    '4.9': {
+        'addr': (
+            '{index}: {dev}: <BROADCAST,MULTICAST,UP,LOWER_UP> mtu 1500 '
+            'qdisc pfifo_fast state UP group default qlen 1000\n'
+            '    link/ether {mac} brd ff:ff:ff:ff:ff:ff\n'
+        ),
+        'inet': (
+            '    inet {address}/{prefix} brd {broadcast} scope global {dev}\n'
+            '       valid_lft forever preferred_lft forever\n'
+        ),
+        'inet6': (
+            '    inet6 {address}/{prefix} scope global \n'
+            '       valid_lft forever preferred_lft forever\n'
+        ),
+        'link': (
+            '{index}: {dev}: <BROADCAST,MULTICAST,UP,LOWER_UP> mtu 1500 '
+            'qdisc pfifo_fast state UP mode DEFAULT group default qlen 1000\n'
+            '    link/ether {mac} brd ff:ff:ff:ff:ff:ff\n'
+            '    RX: bytes  packets  errors  dropped overrun mcast   \n'
+            '    {rx_bytes:<10d} {rx_packets:<8d} 0       0       0       0'
+            '       \n'
+            '    TX: bytes  packets  errors  dropped carrier collsns \n'
+            '    {tx_bytes:<10d} {tx_packets:<8d} 0       0       0       0'
+            '       \n'
+        ),
+        'json': None
+    },
+    # Debian 12 (iproute2-6.1.0)
+    '6.1': {
+        'addr': (
+            '{index}: {dev}: <BROADCAST,MULTICAST,UP,LOWER_UP> mtu 1500 '
+            'qdisc pfifo_fast state UP group default qlen 1000\n'
+            '    link/ether {mac} brd ff:ff:ff:ff:ff:ff\n'
+        ),
+        'inet': (
+            '    inet {address}/{prefix} brd {broadcast} scope global {dev}\n'
+            '       valid_lft forever preferred_lft forever\n'
+        ),
+        'inet6': (
+            '    inet6 {address}/{prefix} scope global nodad \n'
+            '       valid_lft forever preferred_lft forever\n'
+        ),
+        'link': (
+            '{index}: {dev}: <BROADCAST,MULTICAST,UP,LOWER_UP> mtu 1500 '
+            'qdisc pfifo_fast state UP mode DEFAULT group default qlen 1000\n'
+            '    link/ether {mac} brd ff:ff:ff:ff:ff:ff\n'
+            '    RX:  bytes packets errors dropped  missed   mcast'
+            '           \n'
+            '    {rx_bytes:>10d} {rx_packets:>7d}      0       0       0'
+            '       0 \n'
+            '    TX:  bytes packets errors dropped carrier collsns'
+            '           \n'
+            '    {tx_bytes:>10d} {tx_packets:>7d}      0       0       0'
+            '       0 \n'
+        ),
+        'json': (
+            '[{"ifindex":4,"ifname":"eth0","flags":["BROADCAST","MULTICAST",'
+            '"UP","LOWER_UP"],"mtu":1500,"qdisc":"pfifo_fast",'
+            '"operstate":"UP","group":"default","txqlen":1000,'
+            '"link_type":"ether","address":"02:fc:00:00:00:01",'
+            '"broadcast":"ff:ff:ff:ff:ff:ff","promiscuity":0,"allmulti":0,'
+            '"min_mtu":68,"max_mtu":65535,"num_tx_queues":1,'
+            '"num_rx_queues":1,"gso_max_size":65536,"gso_max_segs":65535,'
+            '"tso_max_size":65536,"tso_max_segs":65535,"gro_max_size":65536,'
+            '"parentbus":"virtio","parentdev":"virtio3","addr_info":[],'
+            '"stats64":{"rx":{"bytes":414194,"packets":92,"errors":0,'
+            '"dropped":0,"over_errors":0,"multicast":0},"tx":{"bytes":18090,'
+            '"packets":91,"errors":0,"dropped":0,"carrier_errors":0,'
+            '"collisions":0}}}]'
+        )
+    }
+}
+
+
+def _interface(index, naddrs):
+    """
+    Values of the interface number ``index`` of a generated node.
+    """
+    dev = 'eth{}'.format(index)
+    return {
+        'index': index + 2,
+        'dev': dev,
+        'mac': '02:00:00:00:{:02x}:{:02x}'.format(index // 256, index % 256),
+        'rx_bytes': 1000000 + index,
+        'rx_packets': 1000 + index,
+        'tx_bytes': 2000000 + index,
+        'tx_packets': 2000 + index,
+        'inet': [
+            {
+                'address': '10.{}.{}.{}'.format(index // 256, index % 256, n),
+                'broadcast': '10.{}.{}.255'.format(index // 256, index % 256),
+                'prefix': 24
+            } for n in range(1, naddrs + 1)
+        ],
+        'inet6': [
+            {
+                'address': '2001:db8:{:x}:{:x}::1'.format(index, n),
+                'prefix': 64
+            } for n in range(naddrs)
+        ]
+    }
+
+
+def ip_addr_show(version, ninterfaces, naddrs=1):
+    """
+    Build the 'ip addr show' output of a node.
+
+    :param str version: iproute2 version, a key of :data:`VERSIONS`.
+    :param int ninterfaces: Number of interfaces of the node.
+    :param int naddrs: Number of addresses of each family per interface.
+    :rtype: str
+    """
+    templates = VERSIONS[version]
+    output = []
+
+    for index in range(ninterfaces):
+        values = _interface(index, naddrs)
+        output.append(templates['addr'].format(**values))
+        for family in ('inet', 'inet6'):
+            for addr in values[family]:
+                output.append(templates[family].format(
+                    dev=values['dev'], **addr
+                ))
+
+    return ''.join(output)
+
+
+def ip_stats_link_show(version, ninterfaces):
+    """
+    Build the 'ip -s link show' output of a node.
+
+    :param str version: iproute2 version, a key of :data:`VERSIONS`.
+    :param int ninterfaces: Number of interfaces of the node.
+    :rtype: str
+    """
+    template = VERSIONS[version]['link']
+    return ''.join(
+        template.format(**_interface(index, 0))
+        for index in range(ninterfaces)
+    )
+
+
+def ip_json_addr_show(version, ninterfaces, naddrs=1):
+    """
+    Build the 'ip -j -s -d addr show' output of a node.
+
+    :param str version: iproute2 version, a key of :data:`VERSIONS`.
+    :param int ninterfaces: Number of interfaces of the node.
+    :param int naddrs: Number of addresses of each family per interface.
+    :rtype: str
+    :return: The output, or ``None`` if the version doesn't support JSON.
+    """
+    template = VERSIONS[version]['json']
+    if template is None:
+        return None
+
+    template = loads(template)[0]
+    output = []
+
+    for index in range(ninterfaces):
+        values = _interface(index, naddrs)
+        info = dict(template)
+        info.update({
+            'ifindex': values['index'],
+            'ifname': values['dev'],
+            'address': values['mac'],
+            'stats64': {
+                'rx': dict(
+                    template['stats64']['rx'],
+                    bytes=values['rx_bytes'], packets=values['rx_packets']
+                ),
+                'tx': dict(
+                    template['stats64']['tx'],
+                    bytes=values['tx_bytes'], packets=values['tx_packets']
+                )
+            },
+            'addr_info': [
+                {
+                    'family': 'inet', 'local': addr['address'],
+                    'prefixlen': addr['prefix'],
+                    'broadcast': addr['broadcast'], 'scope': 'global',
+                    'label': values['dev']
+                } for addr in values['inet']
+            ] + [
+                {
+                    'family': 'inet6', 'local': addr['address'],
+                    'prefixlen': addr['prefix'], 'scope': 'global',
+                    'nodad': True
+                } for addr in values['inet6']
+            ]
+        })
+        output.append(info)
+
+    return dumps(output, separators=(',', ':'))
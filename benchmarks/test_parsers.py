@@ -0,0 +1,103 @@
+# -*- coding: utf-8 -*-
+#
+# Copyright (C) 2015-2016 Hewlett Packard Enterprise Development LP
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#   http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing,
+# software distributed under the License is distributed on an
+# "AS IS" BASIS, WITHOUT WARRANTIES OR CONDITIONS OF ANY
+# KIND, either express or implied.  See the License for the
+# specific language governing permissions and limitations
+# under the License.
+
+"""
+Benchmarks of the ip output parsers and the show functions.
+"""
+
+from __future__ import unicode_literals, absolute_import
+from __future__ import print_function, division
+
+import pytest
+
+from corpus import (
+    VERSIONS, ip_addr_show, ip_stats_link_show, ip_json_addr_show
+)
+from topology_lib_ip.library import (
+    _parse_ip_addr_show, _parse_ip_stats_link_show, show_interface,
+    show_interfaces
+)
+
+
+pytest.importorskip('pytest_benchmark')
+
+JSON_VERSIONS = sorted(
+    version for version, templates in VERSIONS.items() if templates['json']
+)
+
+
+@pytest.mark.parametrize('naddrs', [1, 16, 128])
+@pytest.mark.parametrize('version', sorted(VERSIONS))
+def test_parse_ip_addr_show(benchmark, version, naddrs):
+    raw_result = ip_addr_show(version, 1, naddrs=naddrs)
+
+    result = benchmark(_parse_ip_addr_show, raw_result)
+
+    assert len(result['addresses']) == 2 * naddrs
+
+
+@pytest.mark.parametrize('version', sorted(VERSIONS))
+def test_parse_ip_stats_link_show(benchmark, version):
+    raw_result = ip_stats_link_show(version, 1)
+
+    result = benchmark(_parse_ip_stats_link_show, raw_result)
+
+    assert result['rx_bytes'] == 1000000
+
+
+@pytest.mark.parametrize('version', sorted(VERSIONS))
+def test_show_interface(benchmark, mock_node, version):
+    enode = mock_node({
+        'ip addr list': ip_addr_show(version, 1),
+        'ip -s link list': ip_stats_link_show(version, 1)
+    })
+
+    result = benchmark(show_interface, enode, 'eth0', use_json=False)
+
+    assert result['tx_bytes'] == 2000000
+
+
+@pytest.mark.parametrize('version', JSON_VERSIONS)
+def test_show_interface_json(benchmark, mock_node, version):
+    enode = mock_node({'ip -j': ip_json_addr_show(version, 1)})
+
+    result = benchmark(show_interface, enode, 'eth0', use_json=True)
+
+    assert result['tx_bytes'] == 2000000
+
+
+@pytest.mark.parametrize('ninterfaces', [1, 64, 4096])
+@pytest.mark.parametrize('version', sorted(VERSIONS))
+def test_show_interfaces(benchmark, mock_node, version, ninterfaces):
+    enode = mock_node({
+        'ip addr show': ip_addr_show(version, ninterfaces),
+        'ip -s link show': ip_stats_link_show(version, ninterfaces)
+    })
+
+    result = benchmark(show_interfaces, enode, use_json=False)
+
+    assert len(result) == ninterfaces
+
+
+@pytest.mark.parametrize('ninterfaces', [1, 64, 4096])
+@pytest.mark.parametrize('version', JSON_VERSIONS)
+def test_show_interfaces_json(benchmark, mock_node, version, ninterfaces):
+    enode = mock_node({'ip -j': ip_json_addr_show(version, ninterfaces)})
+
+    result = benchmark(show_interfaces, enode, use_json=True)
+
+    assert len(result) == ninterfaces
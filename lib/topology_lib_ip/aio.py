@@ -0,0 +1,614 @@
+# -*- coding: utf-8 -*-
+#
+# Copyright (C) 2015-2016 Hewlett Packard Enterprise Development LP
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#   http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing,
+# software distributed under the License is distributed on an
+# "AS IS" BASIS, WITHOUT WARRANTIES OR CONDITIONS OF ANY
+# KIND, either express or implied.  See the License for the
+# specific language governing permissions and limitations
+# under the License.
+
+"""
+topology_lib_ip asyncio interface.
+
+Coroutine versions of every function of :mod:`topology_lib_ip.library`, with
+the same arguments and results.
+
+Engine nodes whose ``__call__`` is a coroutine function are driven natively
+from the event loop. Any other node is driven by running the blocking library
+function in the default executor of the loop, so it never blocks the loop.
+
+::
+
+    from asyncio import gather
+    from topology_lib_ip import aio
+
+    await gather(*(
+        aio.interface(enode, '1', addr=addr, up=True)
+        for enode, addr in plan
+    ))
+
+This module requires Python 3.6 or later.
+"""
+
+from asyncio import get_event_loop, run_coroutine_threadsafe, sleep
+from collections import OrderedDict
+from functools import partial, wraps
+from inspect import iscoroutinefunction, Parameter
+from inspect import signature as inspect_signature
+
+from . import library
+from .cache import get_cache, invalidate
+from .capabilities import get_capabilities, _node_key
+from .netlink import netlink_socket
+from .library import (
+    _interface_cmds, _sub_interface_cmds, _remove_ip_cmd, _add_route_cmd,
+    _add_link_type_vlan_cmd, _remove_link_type_vlan_cmd, _batch_command,
+    _parse_ip_batch, _json_cmd, _decode_json, _merge_json_stats,
+    _json_link_stats, _parse_link_stats, _parse_ip_addr_show,
+    _parse_ip_stats_link_show, _split_ip_show, _ifname, _stats_sample,
+    _netns_command, _NetnsNode, _PIPELINES, IpBatch
+)
+
+try:
+    from time import monotonic
+except ImportError:
+    from time import time as monotonic
+
+
+def _is_async(enode):
+    """
+    Check if an engine node is called with a coroutine.
+    """
+    return iscoroutinefunction(enode) or \
+        iscoroutinefunction(getattr(enode, '__call__', None))
+
+
+async def _in_executor(func, *args, **kwargs):
+    """
+    Run a blocking function in the default executor of the event loop.
+    """
+    return await get_event_loop().run_in_executor(
+        None, partial(func, *args, **kwargs)
+    )
+
+
+async def _send(enode, cmd, shell=None):
+    """
+    Send a command to a node, awaiting async nodes and running sync nodes in
+    the executor. Commands queued by the pipeline of the node are sent
+    first, as in :func:`topology_lib_ip.library._send`.
+    """
+    if _PIPELINES:
+        pipeline = _PIPELINES.get(_node_key(enode))
+        if pipeline is not None and pipeline.pending:
+            await _in_executor(
+                library.flush_pipeline, _BlockingNode(enode, get_event_loop())
+                if _is_async(enode) else enode
+            )
+    if _is_async(enode):
+        return await enode(cmd, shell=shell)
+    return await _in_executor(enode, cmd, shell=shell)
+
+
+class _BlockingNode(object):
+    """
+    Blocking proxy of an async engine node.
+
+    Used to run library functions without a native coroutine version in an
+    executor thread, sending their commands through the event loop. The
+    per node state of the library is recorded under the async node.
+    """
+
+    def __init__(self, enode, loop):
+        self._proxied = enode
+        self._loop = loop
+
+    def __getattr__(self, name):
+        return getattr(self._proxied, name)
+
+    # Share the per node state of the library, like caches, with the node
+    def __hash__(self):
+        return hash(self._proxied)
+
+    def __eq__(self, other):
+        return self._proxied == other
+
+    def __ne__(self, other):
+        return not self == other
+
+    def __call__(self, cmd, shell=None):
+        return run_coroutine_threadsafe(
+            self._proxied(cmd, shell=shell), self._loop
+        ).result()
+
+
+_NETNS_DOC = (
+    ':param str netns: Network namespace of the node to run the commands\n'
+    '     in. If ``None``, use the namespace of the Engine Node.'
+)
+
+
+def _with_netns(wrapper, func):
+    """
+    Document the ``netns`` argument taken by a coroutine wrapping ``func``,
+    in its docstring and signature.
+    """
+    wrapper.__doc__ = '{}\n\n    {}\n    '.format(
+        (wrapper.__doc__ or '').rstrip(), _NETNS_DOC
+    )
+
+    signature = inspect_signature(func)
+    if 'netns' not in signature.parameters:
+        wrapper.__signature__ = signature.replace(parameters=list(
+            signature.parameters.values()
+        ) + [Parameter('netns', Parameter.KEYWORD_ONLY, default=None)])
+    return wrapper
+
+
+def _coroutine(func):
+    """
+    Use a native coroutine for async nodes and the library function of the
+    same name in an executor otherwise, or when the node is driven with
+    rtnetlink or pipelines its commands.
+    """
+    blocking = getattr(library, func.__name__)
+
+    @wraps(func)
+    async def wrapper(enode, *args, **kwargs):
+        enode = _in_netns(enode, kwargs.pop('netns', None))
+        if _is_async(enode):
+            if netlink_socket(enode) is None and enode not in _PIPELINES:
+                return await func(enode, *args, **kwargs)
+            enode = _BlockingNode(enode, get_event_loop())
+        return await _in_executor(blocking, enode, *args, **kwargs)
+
+    return _with_netns(wrapper, func)
+
+
+class _AsyncNetnsNode(_NetnsNode):
+    """
+    Proxy of an async engine node in a network namespace.
+    """
+
+    async def __call__(self, cmd, shell=None):
+        enode = self._enode()
+        # Keep the order of the commands queued in the default namespace
+        if _PIPELINES and enode in _PIPELINES:
+            await _in_executor(
+                library.flush_pipeline, _BlockingNode(enode, get_event_loop())
+            )
+        return await enode(_netns_command(cmd, self.netns), shell=shell)
+
+
+def _in_netns(enode, netns):
+    """
+    Coroutine aware version of
+    :func:`topology_lib_ip.library._in_netns`.
+    """
+    return library._in_netns(
+        enode, netns,
+        node_class=_AsyncNetnsNode if _is_async(enode) else _NetnsNode
+    )
+
+
+def _wrap(name):
+    """
+    Build the coroutine version of a library function from the blocking one.
+    """
+    blocking = getattr(library, name)
+
+    @wraps(blocking)
+    async def wrapper(enode, *args, **kwargs):
+        enode = _in_netns(enode, kwargs.pop('netns', None))
+        if _is_async(enode):
+            enode = _BlockingNode(enode, get_event_loop())
+        return await _in_executor(blocking, enode, *args, **kwargs)
+
+    wrapper.__doc__ = '\n    Coroutine version of :func:`{}.{}`.'.format(
+        library.__name__, name
+    )
+    return _with_netns(wrapper, blocking)
+
+
+@_coroutine
+async def interface(enode, portlbl, addr=None, up=None, shell=None):
+    """
+    Coroutine version of :func:`topology_lib_ip.library.interface`.
+    """
+    assert portlbl
+    port = enode.ports[portlbl]
+    invalidate(enode, port)
+
+    for cmd in _interface_cmds(port, addr=addr, up=up):
+        response = await enode('ip {cmd}'.format(cmd=cmd), shell=shell)
+        assert not response
+
+
+@_coroutine
+async def sub_interface(
+        enode, portlbl, subint, addr=None, up=None, shell=None):
+    """
+    Coroutine version of :func:`topology_lib_ip.library.sub_interface`.
+    """
+    assert portlbl
+    assert subint
+    port = enode.ports[portlbl]
+    invalidate(enode, port, '{port}.{subint}'.format(port=port, subint=subint))
+
+    for cmd in _sub_interface_cmds(port, subint, addr=addr, up=up):
+        response = await enode('ip {cmd}'.format(cmd=cmd), shell=shell)
+        assert not response
+
+
+@_coroutine
+async def remove_ip(enode, portlbl, addr, shell=None):
+    """
+    Coroutine version of :func:`topology_lib_ip.library.remove_ip`.
+    """
+    assert portlbl
+    port = enode.ports[portlbl]
+    invalidate(enode, port)
+
+    cmd = _remove_ip_cmd(port, addr)
+    response = await enode('ip {cmd}'.format(cmd=cmd), shell=shell)
+    assert not response
+
+
+@_coroutine
+async def add_route(enode, route, via, shell=None):
+    """
+    Coroutine version of :func:`topology_lib_ip.library.add_route`.
+    """
+    version, cmd = _add_route_cmd(route, via)
+
+    response = await enode(
+        'ip {version} {cmd}'.format(version=version, cmd=cmd), shell=shell
+    )
+    assert not response
+
+
+@_coroutine
+async def add_link_type_vlan(enode, portlbl, name, vlan_id, shell=None):
+    """
+    Coroutine version of :func:`topology_lib_ip.library.add_link_type_vlan`.
+    """
+    assert name
+    if name in enode.ports:
+        raise ValueError('Port {name} already exists'.format(name=name))
+
+    assert portlbl
+    assert vlan_id
+    port = enode.ports[portlbl]
+
+    cmd = _add_link_type_vlan_cmd(port, name, vlan_id)
+    invalidate(enode, name)
+
+    response = await enode('ip {cmd}'.format(cmd=cmd), shell=shell)
+    assert not response, 'Cannot add virtual link {name}'.format(name=name)
+
+    enode.ports[name] = name
+
+
+@_coroutine
+async def remove_link_type_vlan(enode, name, shell=None):
+    """
+    Coroutine version of
+    :func:`topology_lib_ip.library.remove_link_type_vlan`.
+    """
+    assert name
+    if name not in enode.ports:
+        raise ValueError('Port {name} doesn\'t exists'.format(name=name))
+
+    cmd = _remove_link_type_vlan_cmd(name)
+    invalidate(enode, name)
+
+    response = await enode('ip {cmd}'.format(cmd=cmd), shell=shell)
+    assert not response, 'Cannot remove virtual link {name}'.format(name=name)
+
+    del enode.ports[name]
+
+
+async def _show_json(enode, options, dev=None, shell=None, use_json=None):
+    """
+    Coroutine version of :func:`topology_lib_ip.library._show_json`.
+    """
+    auto = use_json is None
+    if auto:
+        use_json = get_capabilities(enode).json is not False
+
+    if not use_json:
+        return None
+
+    response = await enode(_json_cmd(options, dev=dev), shell=shell)
+    interfaces = _decode_json(enode, response, auto)
+
+    # Older versions don't include the statistics in 'ip addr'
+    if interfaces and any('rx_bytes' not in d for d in interfaces):
+        _merge_json_stats(interfaces, await _show_json(
+            enode, '-s link show', dev=dev, shell=shell, use_json=True
+        ))
+
+    return interfaces
+
+
+@_coroutine
+async def show_interface(enode, dev, shell=None, use_json=None):
+    """
+    Coroutine version of :func:`topology_lib_ip.library.show_interface`.
+    """
+    assert dev
+
+    cache = get_cache(enode)
+    if cache is not None:
+        d = cache.get(dev)
+        if d is not None:
+            return d
+
+    d = await _read_interface(enode, dev, shell=shell, use_json=use_json)
+
+    if cache is not None and d is not None:
+        cache.put(dev, d)
+    return d
+
+
+async def _read_interface(enode, dev, shell=None, use_json=None):
+    """
+    Coroutine version of :func:`topology_lib_ip.library._read_interface`.
+    """
+    interfaces = await _show_json(
+        enode, '-s -d addr show', dev=dev, shell=shell, use_json=use_json
+    )
+    if interfaces is not None:
+        return interfaces[0] if interfaces else None
+
+    cmd = 'ip addr list dev {ldev}'.format(ldev=dev)
+    response = await enode(cmd, shell=shell)
+
+    first_half_dict = _parse_ip_addr_show(response)
+
+    d = None
+    if (first_half_dict):
+        cmd = 'ip -s link list dev {ldev}'.format(ldev=dev)
+        response = await enode(cmd, shell=shell)
+        second_half_dict = _parse_ip_stats_link_show(response)
+
+        d = first_half_dict
+        d.stats = second_half_dict
+    return d
+
+
+@_coroutine
+async def show_interfaces(enode, devs=None, shell=None, use_json=None):
+    """
+    Coroutine version of :func:`topology_lib_ip.library.show_interfaces`.
+    """
+    cache = get_cache(enode)
+    if cache is not None and devs is not None:
+        devs = list(devs)
+        result = cache.get_many(devs)
+        if result is not None:
+            return result
+
+    result = await _read_interfaces(
+        enode, devs=devs, shell=shell, use_json=use_json
+    )
+
+    if cache is not None:
+        for dev, d in result.items():
+            cache.put(dev, d)
+    return result
+
+
+async def _read_interfaces(enode, devs=None, shell=None, use_json=None):
+    """
+    Coroutine version of :func:`topology_lib_ip.library._read_interfaces`.
+    """
+    if devs is not None:
+        devs = set(devs)
+
+    result = OrderedDict()
+
+    interfaces = await _show_json(
+        enode, '-s -d addr show', shell=shell, use_json=use_json
+    )
+    if interfaces is not None:
+        for d in interfaces:
+            if devs is None or d['dev'] in devs:
+                result[d['dev']] = d
+        return result
+
+    response = await enode('ip addr show', shell=shell)
+    for raw_result in _split_ip_show(response):
+        d = _parse_ip_addr_show(raw_result)
+        if d and (devs is None or _ifname(d['dev']) in devs):
+            result[_ifname(d['dev'])] = d
+
+    stats = await _show_link_stats(enode, shell=shell, use_json=False)
+    for dev, d in result.items():
+        if dev in stats:
+            d.stats = stats[dev]
+
+    return result
+
+
+@_coroutine
+async def _show_link_stats(enode, dev=None, shell=None, use_json=None):
+    """
+    Coroutine version of :func:`topology_lib_ip.library._show_link_stats`.
+    """
+    interfaces = await _show_json(
+        enode, '-s link show', dev=dev, shell=shell, use_json=use_json
+    )
+    if interfaces is not None:
+        return _json_link_stats(interfaces)
+
+    cmd = 'ip -s link show'
+    if dev is not None:
+        cmd = '{cmd} dev {ldev}'.format(cmd=cmd, ldev=dev)
+    response = await enode(cmd, shell=shell)
+
+    return _parse_link_stats(response)
+
+
+async def sample_stats(
+        enode, devs=None, interval=1.0, count=None, buffer=None,
+        shell=None, use_json=None, netns=None):
+    """
+    Asynchronous generator version of
+    :func:`topology_lib_ip.library.sample_stats`.
+
+    ::
+
+        async for sample in aio.sample_stats(enode, ['eth0'], count=10):
+            print(sample['rates'])
+    """
+    enode = _in_netns(enode, netns)
+    dev = None
+    if devs is not None:
+        devs = set(devs)
+        if len(devs) == 1:
+            dev = next(iter(devs))
+
+    previous = None
+    deadline = monotonic()
+    taken = 0
+
+    while count is None or taken < count:
+        stats = await _show_link_stats(
+            enode, dev=dev, shell=shell, use_json=use_json
+        )
+        timestamp = monotonic()
+
+        counters = OrderedDict(
+            (name, values) for name, values in stats.items()
+            if devs is None or name in devs
+        )
+        sample = _stats_sample(previous, timestamp, counters)
+
+        if buffer is not None:
+            buffer.append(timestamp, counters)
+
+        taken += 1
+        previous = sample
+        yield sample
+
+        if count is None or taken < count:
+            deadline += interval
+            await sleep(max(0.0, deadline - monotonic()))
+
+
+async def monitor(
+        enode, events=('link', 'address', 'route'), timeout=None,
+        window=1.0, shell=None, netns=None):
+    """
+    Asynchronous generator version of :func:`topology_lib_ip.library.monitor`.
+
+    The blocking generator is driven from the executor, one event at a time.
+
+    ::
+
+        async for event in aio.monitor(enode, timeout=30):
+            print(event.kind, event.dev)
+    """
+    enode = _in_netns(enode, netns)
+    if _is_async(enode):
+        enode = _BlockingNode(enode, get_event_loop())
+
+    stream = library.monitor(
+        enode, events=events, timeout=timeout, window=window, shell=shell
+    )
+    try:
+        while True:
+            event = await _in_executor(next, stream, None)
+            if event is None:
+                return
+            yield event
+    finally:
+        await _in_executor(stream.close)
+
+
+async def _run_batch(enode, cmds, shell=None, force=True):
+    """
+    Coroutine version of :func:`topology_lib_ip.library._run_batch`.
+    """
+    if not cmds:
+        return OrderedDict()
+
+    # Nodes known not to support batches get the commands one by one
+    if get_capabilities(enode).batch is False:
+        errors = OrderedDict()
+        for index, cmd in enumerate(cmds):
+            if errors and not force:
+                errors[index] = 'Not executed'
+                continue
+            response = await _send(
+                enode, 'ip {cmd}'.format(cmd=cmd), shell=shell
+            )
+            if response:
+                errors[index] = response.strip()
+        return errors
+
+    response = await _send(
+        enode, _batch_command(cmds, force=force), shell=shell
+    )
+    return _parse_ip_batch(response, cmds, force=force)
+
+
+class AsyncIpBatch(IpBatch):
+    """
+    :class:`topology_lib_ip.library.IpBatch` executed from the event loop.
+
+    Use it as an asynchronous context manager:
+
+    ::
+
+        async with aio.ip_batch(enode) as batch:
+            batch.interface('1', addr='192.168.20.20/24', up=True)
+    """
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, exc_type, exc_value, traceback):
+        if exc_type is None:
+            await self.commit()
+        else:
+            self.discard()
+        return False
+
+    async def commit(self):
+        """
+        Coroutine version of :meth:`topology_lib_ip.library.IpBatch.commit`.
+        """
+        cmds, calls, port_updates = self._take()
+
+        errors = await _run_batch(
+            self._enode, cmds, shell=self._shell, force=self._force
+        )
+        self._finish(cmds, calls, port_updates, errors)
+
+
+def ip_batch(enode, shell=None, force=True, netns=None):
+    """
+    Asynchronous version of :func:`topology_lib_ip.library.ip_batch`.
+
+    :rtype: AsyncIpBatch
+    """
+    return AsyncIpBatch(_in_netns(enode, netns), shell=shell, force=force)
+
+
+# Wrap the library functions without a native version
+for _name in library.__all__:
+    if _name not in globals():
+        globals()[_name] = _wrap(_name)
+
+
+__all__ = list(library.__all__) + ['AsyncIpBatch']
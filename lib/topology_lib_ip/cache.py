@@ -0,0 +1,207 @@
+# -*- coding: utf-8 -*-
+#
+# Copyright (C) 2015-2016 Hewlett Packard Enterprise Development LP
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#   http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing,
+# software distributed under the License is distributed on an
+# "AS IS" BASIS, WITHOUT WARRANTIES OR CONDITIONS OF ANY
+# KIND, either express or implied.  See the License for the
+# specific language governing permissions and limitations
+# under the License.
+
+"""
+topology_lib_ip per node cache of interface state.
+
+The cache is opt-in. Once enabled on a node with :func:`enable_cache`,
+:func:`topology_lib_ip.library.show_interface` and
+:func:`topology_lib_ip.library.show_interfaces` serve fresh entries without
+sending any command, and the library functions that modify an interface drop
+its entry:
+
+::
+
+    enable_cache(hs1, ttl=10)
+    interface(hs1, '1', addr='10.0.0.1/24', up=True)
+    assert show_interface(hs1, 'eth1')['inet'] == '10.0.0.1'  # reads
+    assert show_interface(hs1, 'eth1')['state'] == 'UP'  # cached
+
+Changes made to the node without this library are not noticed until the
+entries expire.
+"""
+
+from __future__ import unicode_literals, absolute_import
+from __future__ import print_function, division
+
+from collections import OrderedDict
+from copy import deepcopy
+from weakref import WeakKeyDictionary
+
+try:
+    from time import monotonic
+except ImportError:
+    from time import time as monotonic
+
+
+_CACHES = WeakKeyDictionary()
+
+
+class InterfaceCache(object):
+    """
+    Interface state cache of a node, with expiration and LRU eviction.
+
+    Entries are copied when stored and when returned, so callers can modify
+    the results freely.
+
+    :param float ttl: Seconds an entry is served after being stored. If
+     ``None``, entries never expire.
+    :param int maxsize: Maximum number of entries. The least recently used
+     entry is evicted when it is exceeded.
+    """
+
+    def __init__(self, ttl=5.0, maxsize=256):
+        assert maxsize > 0
+        self.ttl = ttl
+        self.maxsize = maxsize
+        self._entries = OrderedDict()
+
+    def __len__(self):
+        return len(self._entries)
+
+    def __contains__(self, dev):
+        return self._lookup(dev) is not None
+
+    def _lookup(self, dev):
+        entry = self._entries.pop(dev, None)
+        if entry is None:
+            return None
+
+        stored, value = entry
+        if self.ttl is not None and monotonic() - stored >= self.ttl:
+            return None
+
+        # Reinsert as the most recently used
+        self._entries[dev] = entry
+        return value
+
+    def get(self, dev):
+        """
+        Get the state of an interface.
+
+        :param str dev: Unix network device name.
+        :rtype: dict
+        :return: A copy of the stored state, or ``None`` if the device is not
+         cached or its entry expired.
+        """
+        value = self._lookup(dev)
+        if value is None:
+            return None
+        return deepcopy(value)
+
+    def get_many(self, devs):
+        """
+        Get the state of several interfaces, only if all of them are cached.
+
+        :param list devs: Unix network device names.
+        :rtype: OrderedDict
+        :return: A dictionary mapping each device to a copy of its state, in
+         the given order, or ``None`` if any of them is missing.
+        """
+        result = OrderedDict()
+        for dev in devs:
+            value = self.get(dev)
+            if value is None:
+                return None
+            result[dev] = value
+        return result
+
+    def put(self, dev, value):
+        """
+        Store the state of an interface.
+
+        :param str dev: Unix network device name.
+        :param dict value: State of the interface.
+        """
+        self._entries.pop(dev, None)
+        self._entries[dev] = (monotonic(), deepcopy(value))
+
+        while len(self._entries) > self.maxsize:
+            self._entries.popitem(last=False)
+
+    def invalidate(self, *devs):
+        """
+        Drop the entries of some interfaces, or all of them.
+
+        :param devs: Unix network device names. If none is given, the whole
+         cache is cleared.
+        """
+        if not devs:
+            self._entries.clear()
+            return
+
+        for dev in devs:
+            self._entries.pop(dev, None)
+
+
+def enable_cache(enode, ttl=5.0, maxsize=256):
+    """
+    Enable the interface state cache of a node.
+
+    :param enode: Engine node to cache the interfaces of.
+    :type enode: topology.platforms.base.BaseNode
+    :param float ttl: Seconds an entry is served after being read. If
+     ``None``, entries never expire.
+    :param int maxsize: Maximum number of interfaces cached.
+    :rtype: InterfaceCache
+    :return: The cache of the node, replacing any previous one.
+    """
+    cache = InterfaceCache(ttl=ttl, maxsize=maxsize)
+    _CACHES[enode] = cache
+    return cache
+
+
+def disable_cache(enode):
+    """
+    Disable the interface state cache of a node and drop its entries.
+
+    :param enode: Engine node to stop caching the interfaces of.
+    :type enode: topology.platforms.base.BaseNode
+    """
+    _CACHES.pop(enode, None)
+
+
+def get_cache(enode):
+    """
+    Get the interface state cache of a node.
+
+    :param enode: Engine node.
+    :type enode: topology.platforms.base.BaseNode
+    :rtype: InterfaceCache
+    :return: The cache, or ``None`` if it's not enabled for the node.
+    """
+    return _CACHES.get(enode)
+
+
+def invalidate(enode, *devs):
+    """
+    Drop cached interfaces of a node, if its cache is enabled.
+
+    :param enode: Engine node.
+    :type enode: topology.platforms.base.BaseNode
+    :param devs: Unix network device names. If none is given, all the
+     interfaces of the node are dropped.
+    """
+    cache = _CACHES.get(enode)
+    if cache is not None:
+        cache.invalidate(*devs)
+
+
+__all__ = [
+    'InterfaceCache', 'enable_cache', 'disable_cache', 'get_cache',
+    'invalidate'
+]
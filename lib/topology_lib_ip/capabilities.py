@@ -0,0 +1,216 @@
+# -*- coding: utf-8 -*-
+#
+# Copyright (C) 2015-2016 Hewlett Packard Enterprise Development LP
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#   http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing,
+# software distributed under the License is distributed on an
+# "AS IS" BASIS, WITHOUT WARRANTIES OR CONDITIONS OF ANY
+# KIND, either express or implied.  See the License for the
+# specific language governing permissions and limitations
+# under the License.
+
+"""
+topology_lib_ip per node record of the iproute2 features.
+
+The library picks the cheapest way to run each operation from the
+:class:`Capabilities` of the node. They are probed all at once by
+:func:`topology_lib_ip.library.capabilities`, or learned one at a time as
+the library tries the features. Records of earlier runs can be saved and
+loaded back, so nodes don't need to be probed again:
+
+::
+
+    load_capabilities('capabilities.json')
+    ...
+    save_capabilities('capabilities.json', [hs1, hs2])
+
+Loaded records are matched to the nodes by their ``identifier``.
+"""
+
+from __future__ import unicode_literals, absolute_import
+from __future__ import print_function, division
+
+from json import dumps, loads
+from weakref import WeakKeyDictionary
+
+
+_CAPABILITIES = WeakKeyDictionary()
+
+# Records loaded from files, by node name
+_LOADED = {}
+
+# Features, by the option of the ip command that enables them
+FEATURES = (
+    ('-j', 'json'),
+    ('-br', 'brief'),
+    ('-batch', 'batch'),
+    ('-d', 'details')
+)
+
+
+class Capabilities(object):
+    """
+    iproute2 features supported by a node.
+
+    Each feature is ``True`` or ``False`` once known, ``None`` until then.
+
+    :var str version: Version of iproute2, like ``'6.1.0'`` or
+     ``'ss130716'``, or ``None`` if unknown.
+    :var bool json: Support of the JSON output (``ip -j``).
+    :var bool brief: Support of the brief output (``ip -br``).
+    :var bool batch: Support of batches of commands (``ip -batch``).
+    :var bool details: Support of the detailed output (``ip -d``).
+    """
+
+    __slots__ = ('version', 'json', 'brief', 'batch', 'details')
+
+    def __init__(
+            self, version=None, json=None, brief=None, batch=None,
+            details=None):
+        self.version = version
+        self.json = json
+        self.brief = brief
+        self.batch = batch
+        self.details = details
+
+    @property
+    def probed(self):
+        """
+        ``True`` if all the features are known.
+        """
+        return all(
+            getattr(self, feature) is not None for _, feature in FEATURES
+        )
+
+    def to_dict(self):
+        """
+        Export the record as a dictionary.
+
+        :rtype: dict
+        """
+        return {key: getattr(self, key) for key in self.__slots__}
+
+    @classmethod
+    def from_dict(cls, values):
+        """
+        Build a record from a dictionary returned by :meth:`to_dict`.
+
+        :rtype: Capabilities
+        """
+        return cls(**{
+            str(key): value for key, value in values.items()
+            if key in cls.__slots__
+        })
+
+    def __eq__(self, other):
+        if not isinstance(other, Capabilities):
+            return NotImplemented
+        return self.to_dict() == other.to_dict()
+
+    def __ne__(self, other):
+        return not self == other
+
+    def __repr__(self):
+        return 'Capabilities({})'.format(', '.join(
+            '{}={!r}'.format(key, getattr(self, key)) for key in self.__slots__
+        ))
+
+
+def _node_name(enode):
+    """
+    Name of a node, for the records saved to files and other reports.
+    """
+    return getattr(enode, 'identifier', None) or str(enode)
+
+
+def _node_key(enode):
+    """
+    Key of the per node state of the library.
+
+    Short lived proxies of a node, like the blocking proxies of
+    :mod:`topology_lib_ip.aio`, set their ``_proxied`` attribute to the node
+    they stand for, so the state recorded through them outlives them.
+    """
+    return getattr(enode, '__dict__', {}).get('_proxied', enode)
+
+
+def get_capabilities(enode):
+    """
+    Get the record of the features of a node, without probing it.
+
+    :param enode: Engine node.
+    :type enode: topology.platforms.base.BaseNode
+    :rtype: Capabilities
+    :return: The record of the node, created on first use from the loaded
+     records or with all the features unknown.
+    """
+    record = _CAPABILITIES.get(enode)
+    if record is None:
+        loaded = _LOADED.get(_node_name(enode))
+        record = Capabilities.from_dict(loaded.to_dict()) \
+            if loaded is not None else Capabilities()
+        _CAPABILITIES[_node_key(enode)] = record
+    return record
+
+
+def set_capabilities(enode, record):
+    """
+    Set the record of the features of a node.
+
+    :param enode: Engine node.
+    :type enode: topology.platforms.base.BaseNode
+    :param Capabilities record: The features of the node.
+    """
+    _CAPABILITIES[_node_key(enode)] = record
+
+
+def load_capabilities(path):
+    """
+    Load records saved with :func:`save_capabilities`.
+
+    Nodes get the loaded record of their name the first time their features
+    are needed.
+
+    :param str path: Path of the file.
+    :rtype: dict
+    :return: The loaded records, by node name.
+    """
+    with open(path, 'rb') as fd:
+        records = {
+            name: Capabilities.from_dict(values)
+            for name, values in loads(fd.read().decode('utf-8')).items()
+        }
+    _LOADED.update(records)
+    return records
+
+
+def save_capabilities(path, enodes):
+    """
+    Save the records of the features of several nodes to a JSON file.
+
+    :param str path: Path of the file.
+    :param enodes: Engine nodes, saved under their name, or a mapping of
+     names to engine nodes.
+    """
+    if hasattr(enodes, 'items'):
+        enodes = enodes.items()
+    else:
+        enodes = ((_node_name(enode), enode) for enode in enodes)
+
+    records = {
+        name: get_capabilities(enode).to_dict() for name, enode in enodes
+    }
+    with open(path, 'wb') as fd:
+        fd.write(dumps(records, indent=2, sort_keys=True).encode('utf-8'))
+
+
+__all__ = [
+    'FEATURES', 'Capabilities', 'get_capabilities', 'set_capabilities',
+    'load_capabilities', 'save_capabilities'
+]
@@ -0,0 +1,408 @@
+# -*- coding: utf-8 -*-
+#
+# Copyright (C) 2015-2016 Hewlett Packard Enterprise Development LP
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#   http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing,
+# software distributed under the License is distributed on an
+# "AS IS" BASIS, WITHOUT WARRANTIES OR CONDITIONS OF ANY
+# KIND, either express or implied.  See the License for the
+# specific language governing permissions and limitations
+# under the License.
+
+"""
+topology_lib_ip timing of commands, parsers and address validation.
+
+When enabled, the functions of :mod:`topology_lib_ip.library` that send
+commands, parse their outputs and validate addresses are replaced with
+timed versions that feed a :class:`Recorder`:
+
+::
+
+    from topology_lib_ip.instrument import (
+        enable_instrumentation, disable_instrumentation
+    )
+
+    recorder = enable_instrumentation()
+    try:
+        run_test()
+    finally:
+        disable_instrumentation()
+    print(recorder.summary())
+
+When disabled, the original functions are restored, so instrumentation
+costs nothing. Commands are recorded under their type, the command without
+its arguments, like ``ip -s link list``. Parsers and validations have no
+node of their own and are recorded under the node of the last command sent
+by the same thread.
+
+Commands sent by the native coroutines of :mod:`topology_lib_ip.aio` and
+requests sent over rtnetlink are not timed.
+"""
+
+from __future__ import unicode_literals, absolute_import
+from __future__ import print_function, division
+
+from bisect import bisect_left
+from collections import namedtuple
+from functools import wraps
+from threading import local, Lock
+from timeit import default_timer
+
+from . import library
+from .capabilities import _node_name
+
+
+# Upper bounds of the histogram buckets, in seconds: powers of two from 1us
+# to about 67s. Slower calls go to an extra overflow bucket.
+BUCKETS = tuple(2 ** exponent / 1000000 for exponent in range(27))
+
+# Functions of the library that are timed, with the kind of call they make
+_TIMED = (
+    ('_send', 'command'),
+    ('_decode_json', 'parse'),
+    ('_parse_ip_addr_show', 'parse'),
+    ('_parse_ip_stats_link_show', 'parse'),
+    ('_parse_ip_json_addr_show', 'parse'),
+    ('_parse_link_stats', 'parse'),
+    ('_parse_ip_route_show', 'parse'),
+    ('_parse_ip_json_route_show', 'parse'),
+    ('_parse_ip_batch', 'parse'),
+    ('_parse_ip_monitor', 'parse'),
+    ('_split_pipeline', 'parse'),
+    ('ip_address', 'validate'),
+    ('ip_network', 'validate'),
+    ('ip_interface', 'validate')
+)
+
+_RECORDER = None
+_ORIGINALS = {}
+_LOCK = Lock()
+_CONTEXT = local()
+
+
+class Measurement(namedtuple('Measurement', [
+        'node', 'kind', 'name', 'elapsed'])):
+    """
+    Timing of a call, as passed to the callbacks of a :class:`Recorder`.
+
+    :var str node: Name of the node.
+    :var str kind: ``'command'``, ``'parse'`` or ``'validate'``.
+    :var str name: Command type or function name.
+    :var float elapsed: Duration of the call, in seconds.
+    """
+    __slots__ = ()
+
+
+class LatencyHistogram(object):
+    """
+    Distribution of the durations of a type of call.
+
+    Durations are counted in the buckets bounded by :data:`BUCKETS`.
+    """
+
+    __slots__ = ('count', 'total', 'min', 'max', 'buckets')
+
+    def __init__(self):
+        self.count = 0
+        self.total = 0.0
+        self.min = None
+        self.max = None
+        self.buckets = [0] * (len(BUCKETS) + 1)
+
+    def add(self, elapsed):
+        """
+        Count a call.
+
+        :param float elapsed: Duration of the call, in seconds.
+        """
+        self.count += 1
+        self.total += elapsed
+        if self.min is None or elapsed < self.min:
+            self.min = elapsed
+        if self.max is None or elapsed > self.max:
+            self.max = elapsed
+        self.buckets[bisect_left(BUCKETS, elapsed)] += 1
+
+    @property
+    def mean(self):
+        """
+        Mean duration, in seconds.
+        """
+        return self.total / self.count if self.count else 0.0
+
+    def percentile(self, percent):
+        """
+        Estimate a percentile of the durations.
+
+        :param float percent: Percentile, between 0 and 100.
+        :rtype: float
+        :return: The upper bound of the bucket holding the percentile,
+         capped by the longest duration.
+        """
+        rank = percent / 100 * self.count
+        seen = 0
+        for bound, count in zip(BUCKETS, self.buckets):
+            seen += count
+            if count and seen >= rank:
+                return min(bound, self.max)
+        return self.max or 0.0
+
+    def to_dict(self):
+        """
+        Export the histogram as a dictionary.
+
+        :rtype: dict
+        """
+        return {
+            'count': self.count,
+            'total': self.total,
+            'min': self.min,
+            'max': self.max,
+            'mean': self.mean,
+            'p50': self.percentile(50),
+            'p99': self.percentile(99),
+            'buckets': list(self.buckets)
+        }
+
+
+class Recorder(object):
+    """
+    Latency histograms and counts of the calls of each node.
+
+    Callbacks receive each :class:`Measurement` as it is recorded, from the
+    thread that made the call.
+    """
+
+    def __init__(self):
+        self._histograms = {}
+        self._callbacks = []
+        self._lock = Lock()
+
+    def add_callback(self, callback):
+        """
+        Call a function with each new measurement.
+
+        :param callback: Callable receiving a :class:`Measurement`.
+        """
+        self._callbacks.append(callback)
+
+    def remove_callback(self, callback):
+        """
+        Stop calling a function added with :meth:`add_callback`.
+        """
+        self._callbacks.remove(callback)
+
+    def record(self, node, kind, name, elapsed):
+        """
+        Record the duration of a call.
+
+        :param str node: Name of the node.
+        :param str kind: ``'command'``, ``'parse'`` or ``'validate'``.
+        :param str name: Command type or function name.
+        :param float elapsed: Duration of the call, in seconds.
+        """
+        key = (node, kind, name)
+        with self._lock:
+            histogram = self._histograms.get(key)
+            if histogram is None:
+                histogram = self._histograms[key] = LatencyHistogram()
+            histogram.add(elapsed)
+
+        if self._callbacks:
+            measurement = Measurement(node, kind, name, elapsed)
+            for callback in list(self._callbacks):
+                callback(measurement)
+
+    def histograms(self):
+        """
+        Histograms recorded so far.
+
+        :rtype: dict
+        :return: A dictionary mapping ``(node, kind, name)`` tuples to their
+         :class:`LatencyHistogram`.
+        """
+        with self._lock:
+            return dict(self._histograms)
+
+    def reset(self):
+        """
+        Forget the histograms recorded so far.
+        """
+        with self._lock:
+            self._histograms.clear()
+
+    def export(self):
+        """
+        Export the histograms as a list of rows.
+
+        :rtype: list
+        :return: A list of dictionaries as returned by
+         :meth:`LatencyHistogram.to_dict`, with the ``node``, ``kind`` and
+         ``name`` of each histogram, sorted by them.
+        """
+        rows = []
+        for (node, kind, name), histogram in sorted(
+                self.histograms().items(),
+                key=lambda item: (str(item[0][0]), item[0][1:])):
+            row = histogram.to_dict()
+            row.update(node=node, kind=kind, name=name)
+            rows.append(row)
+        return rows
+
+    def summary(self):
+        """
+        Format the histograms as a text table, slowest calls first.
+
+        :rtype: str
+        """
+        header = (
+            'node', 'kind', 'name', 'count', 'total ms', 'mean ms', 'p50 ms',
+            'p99 ms', 'max ms'
+        )
+        lines = [header]
+        for row in sorted(self.export(), key=lambda row: -row['total']):
+            lines.append((
+                str(row['node']), row['kind'], row['name'], str(row['count'])
+            ) + tuple(
+                '{:.3f}'.format(row[key] * 1000)
+                for key in ('total', 'mean', 'p50', 'p99', 'max')
+            ))
+
+        widths = [max(len(line[column]) for line in lines)
+                  for column in range(len(header))]
+        return '\n'.join(
+            '  '.join(
+                value.ljust(width) if column < 3 else value.rjust(width)
+                for column, (value, width) in enumerate(zip(line, widths))
+            ).rstrip() for line in lines
+        )
+
+
+def _command_type(cmd):
+    """
+    Strip the arguments of a command, keeping the program, its options, and
+    the object and action of ``ip`` commands.
+    """
+    tokens = cmd.split('\n', 1)[0].split()
+    if 'ip' not in tokens:
+        return tokens[0] if tokens else ''
+
+    result = []
+    words = 0
+    for token in tokens[tokens.index('ip'):]:
+        if token.startswith(('<', '|', ';', '&')):
+            break
+        result.append(token)
+        if token != 'ip' and not token.startswith('-'):
+            words += 1
+            if words == 2:
+                break
+    return ' '.join(result)
+
+
+def _node():
+    return getattr(_CONTEXT, 'node', None)
+
+
+def _timed(func, kind):
+    """
+    Build the timed version of a library function.
+    """
+    name = func.__name__.lstrip('_')
+
+    if kind == 'command':
+        @wraps(func)
+        def wrapper(enode, cmd, shell=None):
+            node = _node_name(enode)
+            _CONTEXT.node = node
+            start = default_timer()
+            try:
+                return func(enode, cmd, shell=shell)
+            finally:
+                recorder = _RECORDER
+                if recorder is not None:
+                    recorder.record(
+                        node, kind, _command_type(cmd),
+                        default_timer() - start
+                    )
+    else:
+        @wraps(func)
+        def wrapper(*args, **kwargs):
+            start = default_timer()
+            try:
+                return func(*args, **kwargs)
+            finally:
+                recorder = _RECORDER
+                if recorder is not None:
+                    recorder.record(
+                        _node(), kind, name, default_timer() - start
+                    )
+
+    return wrapper
+
+
+def enable_instrumentation(recorder=None):
+    """
+    Start timing the calls of the library.
+
+    :param Recorder recorder: Recorder to feed. If ``None``, keep the current
+     recorder if instrumentation is enabled, or create a new one.
+    :rtype: Recorder
+    :return: The recorder fed.
+    """
+    global _RECORDER
+
+    with _LOCK:
+        if recorder is None:
+            recorder = _RECORDER or Recorder()
+        _RECORDER = recorder
+
+        if not _ORIGINALS:
+            for name, kind in _TIMED:
+                func = getattr(library, name)
+                _ORIGINALS[name] = func
+                setattr(library, name, _timed(func, kind))
+
+    return recorder
+
+
+def disable_instrumentation():
+    """
+    Stop timing the calls of the library, restoring its functions.
+
+    :rtype: Recorder
+    :return: The recorder that was fed, or ``None`` if instrumentation was
+     not enabled.
+    """
+    global _RECORDER
+
+    with _LOCK:
+        recorder = _RECORDER
+        _RECORDER = None
+        for name, func in _ORIGINALS.items():
+            setattr(library, name, func)
+        _ORIGINALS.clear()
+
+    return recorder
+
+
+def get_recorder():
+    """
+    Get the recorder fed by the library.
+
+    :rtype: Recorder
+    :return: The recorder, or ``None`` if instrumentation is not enabled.
+    """
+    return _RECORDER
+
+
+__all__ = [
+    'BUCKETS', 'Measurement', 'LatencyHistogram', 'Recorder',
+    'enable_instrumentation', 'disable_instrumentation', 'get_recorder'
+]
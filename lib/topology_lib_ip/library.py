@@ -22,20 +22,113 @@ topology_lib_ip communication library implementation.
 from __future__ import unicode_literals, absolute_import
 from __future__ import print_function, division
 
+from collections import namedtuple, OrderedDict
 from ipaddress import ip_address, ip_network, ip_interface
-from re import search
+from functools import partial
+from json import loads
+from os import read as os_read
+from re import compile as re_compile
 from re import match
 from re import DOTALL
+from select import select
+from subprocess import Popen, PIPE
+from time import sleep
+from uuid import uuid4
+from weakref import ref, WeakKeyDictionary
+
+from .cache import get_cache, invalidate
+from .capabilities import (
+    FEATURES, Capabilities, get_capabilities, set_capabilities, _node_key
+)
+from .netlink import enter_netns, netlink_socket
+from .results import InterfaceInfo, LinkStats
+from .routes import RouteTable
+from .stats import COUNTERS, counter_delta
+
+try:
+    from time import monotonic
+except ImportError:
+    from time import time as monotonic
+
+try:
+    from shlex import quote
+except ImportError:
+    from pipes import quote
+
+
+_IP_SHOW_DOES_NOT_EXIST_RE = re_compile(r'"(?P<dev>[^"\s]+)"\s+does not exist')
+
+_IP_ADDR_SHOW_LINK_RE = re_compile(
+    r'\s*(?P<os_index>\d+):\s+(?P<dev>\S+):\s+<(?P<falgs_str>[^>]*)>'
+    r'.*?\smtu\s+(?P<mtu>\d+)(?:.*?\sstate\s+(?P<state>\w+))?'
+)
+
+_IP_ADDR_SHOW_LINK_TYPE_RE = re_compile(
+    r'\s*link/(?P<link_type>\w+)(?:\s+(?P<mac_address>[^\s]+))?'
+)
+
+_IP_ADDR_SHOW_INET_RE = re_compile(
+    r'\s*(?P<family>inet6?)\s+(?P<address>[^/\s]+)(?:/(?P<prefix>\d+))?'
+    r'(?P<attrs>.*)'
+)
+
+# Address flags as printed by the ip command
+_IP_ADDR_SHOW_INET_FLAGS = frozenset((
+    'secondary', 'temporary', 'dynamic', 'permanent', 'noprefixroute',
+    'tentative', 'deprecated', 'dadfailed', 'optimistic', 'nodad',
+    'mngtmpaddr', 'home', 'autojoin', 'stable-privacy'
+))
+
+
+def _parse_ip_addr_show_inet(re_result):
+    """
+    Build the address dictionary of an 'inet' or 'inet6' line.
+
+    :param re_result: Match of ``_IP_ADDR_SHOW_INET_RE``.
+    :rtype: dict
+    """
+    family = re_result.group('family')
+    prefix = re_result.group('prefix')
+    tokens = re_result.group('attrs').split()
+    scope = None
+
+    if 'scope' in tokens:
+        index = tokens.index('scope') + 1
+        if index < len(tokens):
+            scope = tokens[index]
+
+    # Point to point addresses carry the prefix in the peer
+    if prefix is None and 'peer' in tokens:
+        index = tokens.index('peer') + 1
+        if index < len(tokens) and '/' in tokens[index]:
+            prefix = tokens[index].split('/', 1)[1]
+
+    # Addresses without a prefix are host addresses
+    if prefix is None:
+        prefix = 32 if family == 'inet' else 128
+
+    return {
+        'family': family,
+        'address': re_result.group('address'),
+        'prefix': int(prefix),
+        'scope': scope,
+        'flags': [
+            token for token in tokens if token in _IP_ADDR_SHOW_INET_FLAGS
+        ]
+    }
 
 
 def _parse_ip_addr_show(raw_result):
     """
     Parse the 'ip addr list dev' command raw output.
 
+    The output is parsed in a single pass over its lines using precompiled
+    regular expressions.
+
     :param str raw_result: os raw result string.
-    :rtype: dict
+    :rtype: topology_lib_ip.results.InterfaceInfo
     :return: The parsed result of the show interface command in a \
-        dictionary of the form:
+        dictionary like object of the form:
 
      ::
 
@@ -50,48 +143,65 @@ def _parse_ip_addr_show(raw_result):
             'inet': '20.1.1.2',
             'inet_mask': '24',
             'inet6': 'fe80::42:acff:fe11:2',
-            'inte6_mask': '64'
+            'inte6_mask': '64',
+            'addresses': [
+                {
+                    'family': 'inet',
+                    'address': '20.1.1.2',
+                    'prefix': 24,
+                    'scope': 'global',
+                    'flags': ['secondary']
+                },
+                {
+                    'family': 'inet6',
+                    'address': 'fe80::42:acff:fe11:2',
+                    'prefix': 64,
+                    'scope': 'link',
+                    'flags': []
+                }
+            ]
         }
+
+     The ``inet`` and ``inet6`` keys hold the first address of each family
+     and are only present if the interface has an address of that family.
     """
     # does link exist?
-    show_re = (
-        r'"(?P<dev>\S+)"\s+does not exist'
-    )
-    re_result = search(show_re, raw_result)
-    result = None
-
-    if not (re_result):
-        # match top two lines for serveral 'always there' variables
-        show_re = (
-            r'\s*(?P<os_index>\d+):\s+(?P<dev>\S+):\s+<(?P<falgs_str>.*)?>.*?'
-            r'mtu\s+(?P<mtu>\d+).+?state\s+(?P<state>\w+).*'
-            r'\s*link/(?P<link_type>\w+)\s+(?P<mac_address>\S+)'
-        )
-
-        re_result = search(show_re, raw_result, DOTALL)
-        result = re_result.groupdict()
-
-        # seek inet if its there
-        show_re = (
-                r'((inet )\s*(?P<inet>[^/]+)/(?P<inet_mask>\d{1,2}))'
-            )
-        re_result = search(show_re, raw_result)
-        if (re_result):
-            result.update(re_result.groupdict())
-
-        # seek inet6 if its there
-        show_re = (
-                r'((?<=inet6 )(?P<inet6>[^/]+)/(?P<inet6_mask>\d{1,2}))'
-            )
-        re_result = search(show_re, raw_result)
-        if (re_result):
-            result.update(re_result.groupdict())
+    if _IP_SHOW_DOES_NOT_EXIST_RE.search(raw_result):
+        return None
 
-        # cleanup dictionary before returning
-        for key, value in result.items():
-            if value is not None:
-                if value.isdigit():
-                    result[key] = int(value)
+    result = None
+    addresses = []
+
+    for line in raw_result.splitlines():
+        if result is None:
+            # seek the first line for several 'always there' variables
+            re_result = _IP_ADDR_SHOW_LINK_RE.match(line)
+            if re_result:
+                result = InterfaceInfo(
+                    link_type=None, mac_address=None, **re_result.groupdict()
+                )
+            continue
+
+        # lifetimes and statistics are skipped without running a regex
+        if not line.lstrip().startswith(('inet', 'link/')):
+            continue
+
+        re_result = _IP_ADDR_SHOW_INET_RE.match(line)
+        if re_result:
+            addr = _parse_ip_addr_show_inet(re_result)
+            if addr['family'] not in result:
+                result[addr['family']] = addr['address']
+                result[addr['family'] + '_mask'] = addr['prefix']
+            addresses.append(addr)
+            continue
+
+        if result.link_type is None:
+            re_result = _IP_ADDR_SHOW_LINK_TYPE_RE.match(line)
+            if re_result:
+                result.link_type, result.mac_address = re_result.groups()
+
+    if result is not None:
+        result.addresses = addresses
 
     return result
 
@@ -100,10 +210,12 @@ def _parse_ip_stats_link_show(raw_result):
     """
     Parse the 'ip -s link show dev <dev>' command raw output.
 
+    The counters are converted to integers on first access.
+
     :param str raw_result: vtysh raw result string.
-    :rtype: dict
+    :rtype: topology_lib_ip.results.LinkStats
     :return: The parsed result of the show interface command in a \
-        dictionary of the form:
+        dictionary like object of the form:
 
      ::
 
@@ -137,243 +249,3589 @@ def _parse_ip_stats_link_show(raw_result):
     result = None
 
     if (re_result):
-        result = re_result.groupdict()
-        for key, value in result.items():
-            if value is not None:
-                if value.isdigit():
-                    result[key] = int(value)
+        result = LinkStats(re_result.groups())
 
     return result
 
 
-def interface(enode, portlbl, addr=None, up=None, shell=None):
+# Statistics in the JSON output of 'ip -s', as (direction, candidate json
+# keys, result key) tuples. Some iproute2 versions report the rx overrun
+# counter as 'missed'.
+_JSON_STATS_KEYS = (
+    ('rx', ('bytes',), 'rx_bytes'),
+    ('rx', ('packets',), 'rx_packets'),
+    ('rx', ('errors',), 'rx_errors'),
+    ('rx', ('dropped',), 'rx_dropped'),
+    ('rx', ('over_errors', 'missed'), 'rx_overrun'),
+    ('rx', ('multicast',), 'rx_mcast'),
+    ('tx', ('bytes',), 'tx_bytes'),
+    ('tx', ('packets',), 'tx_packets'),
+    ('tx', ('errors',), 'tx_errors'),
+    ('tx', ('dropped',), 'tx_dropped'),
+    ('tx', ('carrier_errors',), 'tx_carrier'),
+    ('tx', ('collisions',), 'tx_collisions'),
+)
+
+
+def _parse_ip_json_link(info):
     """
-    Configure a interface.
+    Convert an interface object of the 'ip -j' command output.
+
+    :param dict info: A decoded element of the 'ip -j -s -d addr show'
+     command output.
+    :rtype: topology_lib_ip.results.InterfaceInfo
+    :return: The interface in the same format of the combined result of
+     :func:`_parse_ip_addr_show` and :func:`_parse_ip_stats_link_show`.
+     Statistics are only present if the output included them.
+    """
+    result = InterfaceInfo(
+        os_index=info.get('ifindex'),
+        dev=info.get('ifname'),
+        falgs_str=','.join(info.get('flags', [])),
+        mtu=info.get('mtu'),
+        state=info.get('operstate'),
+        link_type=info.get('link_type'),
+        mac_address=info.get('address')
+    )
 
-    All parameters left as ``None`` are ignored and thus no configuration
-    action is taken for that parameter (left "as-is").
+    addresses = []
+    for addr_info in info.get('addr_info', []):
+        addr = {
+            'family': addr_info.get('family'),
+            'address': addr_info.get('local'),
+            'prefix': addr_info.get('prefixlen'),
+            'scope': addr_info.get('scope'),
+            'flags': [
+                key for key, value in addr_info.items() if value is True
+            ]
+        }
+        if addr['family'] not in result:
+            result[addr['family']] = addr['address']
+            result[addr['family'] + '_mask'] = addr['prefix']
+        addresses.append(addr)
+    result.addresses = addresses
+
+    stats = info.get('stats64', info.get('stats'))
+    if stats:
+        values = []
+        for direction, json_keys, key in _JSON_STATS_KEYS:
+            counters = stats.get(direction, {})
+            for json_key in json_keys:
+                if json_key in counters:
+                    values.append(counters[json_key])
+                    break
+            else:
+                values.append(0)
+        result.stats = LinkStats(values)
 
-    :param enode: Engine node to communicate with.
-    :type enode: topology.platforms.base.BaseNode
-    :param str portlbl: Port label to configure. Port label will be mapped to
-     real port automatically.
-    :param str addr: IPv4 or IPv6 address to add to the interface:
-     - IPv4 address and netmask to assign to the interface in the form
-     ``'192.168.20.20/24'``.
-     - IPv6 address and subnets to assign to the interface in the form
-     ``'2001::1/120'``.
-    :param bool up: Bring up or down the interface.
-    :param str shell: Shell name to execute commands.
-     If ``None``, use the Engine Node default shell.
+    return result
+
+
+def _parse_ip_json_addr_show(raw_result):
     """
-    assert portlbl
-    port = enode.ports[portlbl]
+    Parse the 'ip -j -s -d addr show' command raw output.
 
-    if addr is not None:
-        assert ip_interface(addr)
-        cmd = 'ip addr add {addr} dev {port}'.format(addr=addr, port=port)
-        response = enode(cmd, shell=shell)
-        assert not response
+    :param str raw_result: os raw result string.
+    :rtype: list
+    :return: A list with the parsed result of each interface in the output,
+     as returned by :func:`_parse_ip_json_link`. The list is empty if the
+     requested device doesn't exist.
+    :raises ValueError: If the output is not JSON, for example because the
+     ``ip`` command doesn't support the ``-j`` option.
+    """
+    if _IP_SHOW_DOES_NOT_EXIST_RE.search(raw_result):
+        return []
 
-    if up is not None:
-        cmd = 'ip link set dev {port} {state}'.format(
-            port=port, state='up' if up else 'down'
-        )
-        response = enode(cmd, shell=shell)
-        assert not response
+    return [_parse_ip_json_link(info) for info in loads(raw_result)]
+
+
+_IP_SHOW_HEADER_RE = re_compile(r'\d+:\s+(?P<dev>[^:\s]+):')
 
 
-def sub_interface(enode, portlbl, subint, addr=None, up=None, shell=None):
+def _split_ip_show(raw_result):
     """
-    Configure a subinterface.
+    Split the raw output of an 'ip addr show' or 'ip link show' command.
 
-    All parameters left as ``None`` are ignored and thus no configuration
-    action is taken for that parameter (left "as-is").
-    Sub interfaces can only be configured if the device exists.
-    If you want to enable the sub interface, it will enable the interface
-    as well.
+    The output is consumed in a single pass, starting a new interface on each
+    line that begins with the interface index.
 
-    :param enode: Engine node to communicate with.
-    :type enode: topology.platforms.base.BaseNode
-    :param str portlbl: Port label to configure. Port label will be mapped to
-     real port automatically.
-    :param str subint: The suffix of the interface.
-    :param str addr: IPv4 or IPv6 address to add to the interface:
-     - IPv4 address and netmask to assign to the interface in the form
-     ``'192.168.20.20/24'``.
-     - IPv6 address and subnets to assign to the interface in the form
-     ``'2001::1/120'``.
-    :param bool up: Bring up or down the interface.
-    :param str shell: Shell name to execute commands.
-     If ``None``, use the Engine Node default shell.
+    :param str raw_result: os raw result string.
+    :return: An iterator over the raw output of each interface.
     """
-    assert portlbl
-    assert subint
-    port = enode.ports[portlbl]
+    block = []
 
-    if addr is not None:
-        assert ip_interface(addr)
-        cmd = 'ip addr add {addr} dev {port}.{subint}'.format(addr=addr,
-                                                              port=port,
-                                                              subint=subint)
-        response = enode(cmd, shell=shell)
-        assert not response
+    for line in raw_result.splitlines(True):
+        if block and line[:1].isdigit():
+            yield ''.join(block)
+            block = []
+        block.append(line)
 
-    if up is not None:
-        if up:
-            interface(enode, portlbl, up=up)
+    if block:
+        yield ''.join(block)
+
+
+def _split_markers(raw_result, marker):
+    """
+    Split the raw output of several commands separated by ``echo`` of a
+    marker.
+
+    :param str raw_result: os raw result string.
+    :param str marker: The marker, matched against whole lines without
+     their line endings.
+    :rtype: list
+    :return: The output of each command, with ``\\n`` line endings.
+    """
+    sections = [[]]
+    for line in raw_result.splitlines():
+        if line.rstrip() == marker:
+            sections.append([])
+        else:
+            sections[-1].append(line)
+    return ['\n'.join(lines) for lines in sections]
+
+
+def _send(enode, cmd, shell=None):
+    """
+    Send a command to a node.
+
+    Every command of the library goes through this function, which
+    :mod:`topology_lib_ip.instrument` replaces to time them. Commands queued
+    by the pipeline of the node are sent first.
+
+    :rtype: str
+    :return: The output of the command.
+    """
+    if _PIPELINES:
+        pipeline = _PIPELINES.get(enode)
+        if pipeline is not None and pipeline.pending:
+            _flush(enode, pipeline)
+    return enode(cmd, shell=shell)
+
+
+_NETNS_NAME_RE = re_compile(r'^[\w.-]+$')
+
+# Names the kernel accepts for network devices
+_DEV_NAME_RE = re_compile(r'^(?!\.\.?$)[^\s/:]{1,15}$')
+
+# Characters of a command line that make it more than a single ip command
+_SHELL_CHARS = frozenset(';&|`$()')
+
+# Nodes in each network namespace of a node, see _in_netns
+_NETNS_NODES = WeakKeyDictionary()
 
-        cmd = 'ip link set dev {port}.{subint} {state}'.format(
-            port=port, subint=subint, state='up' if up else 'down'
+
+def _netns_command(cmd, netns):
+    """
+    Make a command line run in a network namespace.
+
+    Single ``ip`` commands, including ``ip -batch`` with a here document, get
+    the ``-n`` option. Any other command line is run by a shell started with
+    ``ip netns exec``.
+
+    :param str cmd: Command line.
+    :param str netns: Network namespace name.
+    :rtype: str
+    """
+    first = cmd.split('\n', 1)[0]
+    if first.startswith('ip ') and _SHELL_CHARS.isdisjoint(first):
+        return 'ip -n {netns} {cmd}'.format(netns=netns, cmd=cmd[3:])
+    return 'ip netns exec {netns} sh -c {cmd}'.format(
+        netns=netns, cmd=quote(cmd)
+    )
+
+
+class _NetnsPorts(dict):
+    """
+    Port mapping of a node in a network namespace.
+
+    Labels of the node map to the same devices as in the node, and any other
+    label that is a valid device name is taken as one. Devices added to the
+    namespace by the library are recorded here only.
+    """
+
+    def __init__(self, ports):
+        super(_NetnsPorts, self).__init__()
+        self._ports = ports
+
+    def __missing__(self, portlbl):
+        if portlbl in self._ports:
+            return self._ports[portlbl]
+        if not _DEV_NAME_RE.match(portlbl):
+            raise KeyError(portlbl)
+        return portlbl
+
+
+class _NetnsNode(object):
+    """
+    Engine node proxy that runs the commands of the library in a network
+    namespace of the node.
+
+    Proxies are created by :func:`_in_netns`. They have their own cache,
+    pipeline and port mapping, share the capabilities of the node and are
+    never driven with rtnetlink.
+
+    :param enode: Engine node.
+    :param str netns: Network namespace name.
+    """
+
+    netns_path = None
+
+    def __init__(self, enode, netns):
+        self._enode = ref(enode)
+        self.netns = netns
+        self.ports = _NetnsPorts(getattr(enode, 'ports', {}))
+
+    def __getattr__(self, name):
+        return getattr(self._enode(), name)
+
+    def __call__(self, cmd, shell=None):
+        enode = self._enode()
+        # Keep the order of the commands queued in the default namespace
+        if _PIPELINES and enode in _PIPELINES:
+            flush_pipeline(enode)
+        return enode(_netns_command(cmd, self.netns), shell=shell)
+
+    def __repr__(self):
+        return '<{!r} netns {}>'.format(self._enode(), self.netns)
+
+
+def _in_netns(enode, netns, node_class=_NetnsNode):
+    """
+    Get the node to send the commands of a library call to.
+
+    :param enode: Engine node.
+    :param str netns: Network namespace name, or ``None``.
+    :param node_class: Class of the proxy, a subclass of :class:`_NetnsNode`.
+    :return: The engine node if ``netns`` is ``None``, or the proxy of the
+     namespace, which is created once per node and namespace.
+    :raises ValueError: If the namespace name is not valid.
+    """
+    if netns is None:
+        return enode
+    if not _NETNS_NAME_RE.match(netns):
+        raise ValueError(
+            'Invalid network namespace name {!r}'.format(netns)
         )
-        response = enode(cmd, shell=shell)
-        assert not response
 
+    nodes = _NETNS_NODES.get(enode)
+    if nodes is None:
+        nodes = _NETNS_NODES[enode] = {}
+
+    node = nodes.get(netns)
+    if node is None:
+        node = nodes[netns] = node_class(enode, netns)
+        # Namespaces share the ip command of the node
+        set_capabilities(node, get_capabilities(enode))
+    return node
+
+
+# Pipelines of the nodes with pipelining enabled
+_PIPELINES = WeakKeyDictionary()
+
+_PIPELINE_MARKER = 'IP_PIPELINE'
 
-def remove_ip(enode, portlbl, addr, shell=None):
+
+class PipelineError(AssertionError):
     """
-    Remove an IP address from an interface.
+    Failure of a command sent through the pipeline of a node.
 
-    All parameters left as ``None`` are ignored and thus no configuration
-    action is taken for that parameter (left "as-is").
+    Commands queued after the failed one are not executed.
 
-    :param enode: Engine node to communicate with.
-    :type enode: topology.platforms.base.BaseNode
-    :param str portlbl: Port label to configure. Port label will be mapped to
-     real port automatically.
-    :param str addr: IPv4 or IPv6 address to remove from the interface:
-     - IPv4 address to remove from the interface in the form
-     ``'192.168.20.20'`` or ``'192.168.20.20/24'``.
-     - IPv6 address to remove from the interface in the form
-     ``'2001::1'`` or ``'2001::1/120'``.
-    :param str shell: Shell name to execute commands.
-     If ``None``, use the Engine Node default shell.
+    :var str command: The command that failed.
+    :var str response: Output of the failed command.
+    :var list skipped: Commands that were not executed.
     """
-    assert portlbl
-    assert ip_interface(addr)
-    port = enode.ports[portlbl]
 
-    cmd = 'ip addr del {addr} dev {port}'.format(addr=addr, port=port)
-    response = enode(cmd, shell=shell)
-    assert not response
+    def __init__(self, message, command, response, skipped):
+        self.command = command
+        self.response = response
+        self.skipped = skipped
+        super(PipelineError, self).__init__(
+            '{}: {}{}'.format(
+                message, command,
+                '\n{}'.format(response) if response else ''
+            )
+        )
 
 
-def add_route(enode, route, via, shell=None):
+class _Pipeline(object):
+    """
+    Commands of a node waiting to be sent.
     """
-    Add a new static route.
 
-    :param enode: Engine node to communicate with.
-    :type enode: topology.platforms.base.BaseNode
-    :param str route: Route to add, an IP in the form ``'192.168.20.20/24'``
-     or ``'2001::0/24'`` or ``'default'``.
-    :param str via: Via for the route as an IP in the form
-     ``'192.168.20.20/24'`` or ``'2001::0/24'``.
-    :param shell: Shell name to execute commands. If ``None``, use the Engine
-     Node default shell.
-    :type shell: str or None
+    __slots__ = ('max_commands', 'shell', 'pending')
+
+    def __init__(self, max_commands):
+        self.max_commands = max_commands
+        self.shell = None
+        # Tuples (cmd, message, undo)
+        self.pending = []
+
+
+def _pipeline_command(cmds, token):
     """
-    via = ip_address(via)
+    Chain commands in a single shell command line, each followed by a marker.
 
-    version = '-4'
-    if (via.version == 6) or \
-            (route != 'default' and ip_network(route).version == 6):
-        version = '-6'
+    Commands are chained with ``&&``, so none runs after a failed one. The
+    markers are printed with ``printf``, so they never appear literally in
+    the command line, even when echoed by the shell.
 
-    cmd = 'ip {version} route add {route} via {via}'.format(
-        version=version, route=route, via=via
+    :param list cmds: Commands to chain.
+    :param str token: Unique token of the markers.
+    :rtype: str
+    """
+    return ' && '.join(
+        "{cmd} && printf '%s_%d\\n' {token} {index}".format(
+            cmd=cmd, token=token, index=index
+        ) for index, cmd in enumerate(cmds)
     )
 
-    response = enode(cmd, shell=shell)
-    assert not response
 
+def _split_pipeline(raw_result, token):
+    """
+    Split the raw output of a command line built by
+    :func:`_pipeline_command`.
 
-def add_link_type_vlan(enode, portlbl, name, vlan_id, shell=None):
+    :param str raw_result: os raw result string.
+    :param str token: Token of the markers.
+    :rtype: tuple
+    :return: The outputs of the commands that completed, in order, and the
+     output that follows the last marker.
     """
-    Add a new virtual link with the type set to VLAN.
+    responses = []
+    lines = []
+    prefix = '{}_'.format(token)
 
-    Creates a new vlan device {name} on device {port}.
-    Will raise an exception if value is already assigned.
+    for line in raw_result.splitlines():
+        line = line.rstrip('\r')
+        if line.startswith(prefix) and \
+                line[len(prefix):] == str(len(responses)):
+            responses.append('\n'.join(lines))
+            lines = []
+        else:
+            lines.append(line)
 
-    :param enode: Engine node to communicate with.
-    :type enode: topology.platforms.base.BaseNode
-    :param str portlbl: Port label to configure. Port label will be mapped
-     automatically.
-    :param str name: specifies the name of the new virtual device.
-    :param str vlan_id: specifies the VLAN identifier.
-    :param str shell: Shell name to execute commands. If ``None``, use the
-     Engine Node default shell.
+    return responses, '\n'.join(lines).strip()
+
+
+def _flush(enode, pipeline):
     """
-    assert name
-    if name in enode.ports:
-        raise ValueError('Port {name} already exists'.format(name=name))
+    Send the pending commands of a pipeline in a single command line.
+
+    :raises PipelineError: If any command failed. Port mapping changes made
+     by the failed and skipped commands are undone before raising.
+    """
+    pending, pipeline.pending = pipeline.pending, []
+    token = '{}_{}'.format(_PIPELINE_MARKER, uuid4().hex[:12])
+
+    response = _send(
+        enode, _pipeline_command([cmd for cmd, _, _ in pending], token),
+        shell=pipeline.shell
+    )
+    responses, tail = _split_pipeline(response, token)
+
+    # Commands that printed something, and the one that stopped the chain
+    completed = len(responses)
+    failed = [index for index in range(completed) if responses[index]]
+    if completed < len(pending):
+        failed.append(completed)
+    if not failed:
+        return
+
+    skipped = list(range(completed + 1, len(pending)))
+    for index in reversed(failed + skipped):
+        undo = pending[index][2]
+        if undo is not None:
+            undo()
+
+    cmd, message, _ = pending[failed[0]]
+    raise PipelineError(
+        message or 'Command failed', cmd,
+        responses[failed[0]] if failed[0] < completed else tail,
+        [pending[index][0] for index in skipped]
+    )
 
-    assert portlbl
-    assert vlan_id
-    port = enode.ports[portlbl]
 
-    cmd = 'ip link add link {dev} name {name} type vlan id {vlan_id}'.format(
-        dev=port, name=name, vlan_id=vlan_id)
+def _write(enode, cmd, shell=None, message=None, undo=None):
+    """
+    Send a command that prints nothing unless it fails.
 
-    response = enode(cmd, shell=shell)
-    assert not response, 'Cannot add virtual link {name}'.format(name=name)
+    The command is queued instead if pipelining is enabled for the node, see
+    :func:`enable_pipelining`.
 
-    enode.ports[name] = name
+    :param str message: Message of the error raised if the command fails.
+    :param undo: Callable that reverts the changes made to the engine node
+     before the command is executed, called if a queued command fails or is
+     skipped.
+    """
+    pipeline = _PIPELINES.get(enode) if _PIPELINES else None
+
+    if pipeline is None:
+        response = _send(enode, cmd, shell=shell)
+        if message is None:
+            assert not response
+        else:
+            assert not response, message
+        return
 
+    if pipeline.pending and shell != pipeline.shell:
+        _flush(enode, pipeline)
+    pipeline.shell = shell
+    pipeline.pending.append((cmd, message, undo))
+    if len(pipeline.pending) >= pipeline.max_commands:
+        _flush(enode, pipeline)
 
-def remove_link_type_vlan(enode, name, shell=None):
+
+def _netlink_socket(enode):
     """
-    Delete a virtual link.
+    Get the rtnetlink socket of a node, as returned by
+    :func:`topology_lib_ip.netlink.netlink_socket`.
 
-    Deletes a vlan device with the name {name}.
-    Will raise an expection if the port is not already present.
+    Commands queued by the pipeline of the node are sent first, so requests
+    sent over the socket keep their order with them.
+    """
+    sock = netlink_socket(enode)
+    if sock is not None and _PIPELINES:
+        pipeline = _PIPELINES.get(enode)
+        if pipeline is not None and pipeline.pending:
+            _flush(enode, pipeline)
+    return sock
+
+
+def enable_pipelining(enode, max_commands=64, netns=None):
+    """
+    Enable the pipelining of the write operations of a node.
+
+    Once enabled, :func:`interface`, :func:`sub_interface`,
+    :func:`remove_ip`, :func:`add_route`, :func:`add_link_type_vlan` and
+    :func:`remove_link_type_vlan` queue their commands instead of waiting
+    for the output of each one. Queued commands are sent in a single command
+    line, separated by unique markers, and their outputs are checked one by
+    one as usual:
+
+    ::
+
+        enable_pipelining(hs1)
+        for port, addr in addresses:
+            interface(hs1, port, addr=addr, up=True)
+        disable_pipelining(hs1)  # sends the remaining commands
+
+    The queue is sent when it holds ``max_commands`` commands, when
+    :func:`flush_pipeline` or :func:`disable_pipelining` is called, and
+    before any other command is sent to the node, so reads always see the
+    queued changes. Failures are raised by the call that sends the queue,
+    as a :class:`PipelineError`, and the commands queued after the failed
+    one are not executed.
+
+    On nodes configured with rtnetlink, the reads and writes sent over the
+    socket are not queued, but the queue is sent before each of them, so
+    they keep their order with the queued commands.
 
     :param enode: Engine node to communicate with.
     :type enode: topology.platforms.base.BaseNode
-    :param str name: specifies the name of the new
-     virtual device.
-    :param str shell: Shell name to execute commands. If ``None``, use the
-     Engine Node default shell.
+    :param int max_commands: Maximum number of commands sent at once.
+    :param str netns: Network namespace of the node to run the commands
+     in. If ``None``, use the namespace of the Engine Node.
     """
-    assert name
-    if name not in enode.ports:
-        raise ValueError('Port {name} doesn\'t exists'.format(name=name))
+    enode = _in_netns(enode, netns)
+    assert max_commands > 0
+    pipeline = _PIPELINES.get(enode)
+    if pipeline is None:
+        _PIPELINES[_node_key(enode)] = _Pipeline(max_commands)
+    else:
+        pipeline.max_commands = max_commands
 
-    cmd = 'ip link del link dev {name}'.format(name=name)
 
-    response = enode(cmd, shell=shell)
-    assert not response, 'Cannot remove virtual link {name}'.format(name=name)
+def flush_pipeline(enode, netns=None):
+    """
+    Send the commands queued by the pipeline of a node.
 
-    del enode.ports[name]
+    :param enode: Engine node to communicate with.
+    :type enode: topology.platforms.base.BaseNode
+    :param str netns: Network namespace of the node to run the commands
+     in. If ``None``, use the namespace of the Engine Node.
+    :raises PipelineError: If any command failed.
+    """
+    enode = _in_netns(enode, netns)
+    pipeline = _PIPELINES.get(enode)
+    if pipeline is not None and pipeline.pending:
+        _flush(enode, pipeline)
 
 
-def show_interface(enode, dev, shell=None):
+def disable_pipelining(enode, netns=None):
     """
-    Show the configured parameters and stats of an interface.
+    Send the commands queued by the pipeline of a node and disable it.
 
     :param enode: Engine node to communicate with.
     :type enode: topology.platforms.base.BaseNode
-    :param str dev: Unix network device name. Ex 1, 2, 3..
-    :rtype: dict
-    :return: A combined dictionary as returned by both
-     :func:`topology_lib_ip.parser._parse_ip_addr_show`
-     :func:`topology_lib_ip.parser._parse_ip_stats_link_show`
+    :param str netns: Network namespace of the node to run the commands
+     in. If ``None``, use the namespace of the Engine Node.
+    :raises PipelineError: If any command failed. Pipelining is disabled
+     anyway.
     """
-    assert dev
+    enode = _in_netns(enode, netns)
+    pipeline = _PIPELINES.pop(enode, None)
+    if pipeline is not None and pipeline.pending:
+        _flush(enode, pipeline)
 
-    cmd = 'ip addr list dev {ldev}'.format(ldev=dev)
-    response = enode(cmd, shell=shell)
 
-    first_half_dict = _parse_ip_addr_show(response)
+def _ifname(dev):
+    """
+    Remove the peer suffix of a device name, as in ``'veth0@if5'``.
+    """
+    return dev.split('@', 1)[0]
 
-    d = None
-    if (first_half_dict):
-        cmd = 'ip -s link list dev {ldev}'.format(ldev=dev)
-        response = enode(cmd, shell=shell)
-        second_half_dict = _parse_ip_stats_link_show(response)
 
-        d = first_half_dict.copy()
-        d.update(second_half_dict)
-    return d
+def _json_cmd(options, dev=None):
+    """
+    Build an ``ip -j`` command.
+
+    :param str options: Options and object of the command.
+    :param str dev: Restrict the output to a single device.
+    :rtype: str
+    """
+    cmd = 'ip -j {options}'.format(options=options)
+    if dev is not None:
+        cmd = '{cmd} dev {ldev}'.format(cmd=cmd, ldev=dev)
+    return cmd
+
+
+def _decode_json(enode, response, auto):
+    """
+    Decode the output of an ``ip -j`` command and record JSON support.
+
+    :param enode: Engine node the command was sent to.
+    :param str response: os raw result string.
+    :param bool auto: If ``True``, a non-JSON output marks the node as not
+     supporting JSON output instead of raising.
+    :rtype: list
+    :return: The interfaces as returned by :func:`_parse_ip_json_addr_show`,
+     or ``None`` if the node doesn't support JSON output.
+    """
+    try:
+        interfaces = _parse_ip_json_addr_show(response)
+    except ValueError:
+        if not auto:
+            raise
+        get_capabilities(enode).json = False
+        return None
+
+    if interfaces:
+        get_capabilities(enode).json = True
+    return interfaces
+
+
+def _merge_json_stats(interfaces, stats):
+    """
+    Add the statistics of a 'ip -j -s link show' command to the interfaces
+    that miss them.
+
+    :param list interfaces: Interfaces as returned by
+     :func:`_parse_ip_json_addr_show`.
+    :param list stats: Interfaces with statistics, in the same format.
+    """
+    stats = {d['dev']: d for d in stats or []}
+    for d in interfaces:
+        if 'rx_bytes' not in d and d['dev'] in stats:
+            for _, _, key in _JSON_STATS_KEYS:
+                d[key] = stats[d['dev']][key]
+
+
+def _show_json(enode, options, dev=None, shell=None, use_json=None):
+    """
+    Show interfaces using the JSON output of the ip command.
+
+    JSON support of the node is detected on the first call and remembered in
+    its :class:`topology_lib_ip.capabilities.Capabilities`, unless already
+    known.
+
+    :param enode: Engine node to communicate with.
+    :type enode: topology.platforms.base.BaseNode
+    :param str options: Options and object of the ``ip -j`` command, for
+     example ``'-s -d addr show'``.
+    :param str dev: Restrict the output to a single device.
+    :param str shell: Shell name to execute commands. If ``None``, use the
+     Engine Node default shell.
+    :param bool use_json: Force (``True``) or disable (``False``) the use of
+     the JSON output. If ``None``, use it when the node supports it.
+    :rtype: list
+    :return: The interfaces as returned by :func:`_parse_ip_json_addr_show`,
+     or ``None`` if the JSON output is disabled or not supported by the node.
+    """
+    auto = use_json is None
+    if auto:
+        use_json = get_capabilities(enode).json is not False
+
+    if not use_json:
+        return None
+
+    response = _send(enode, _json_cmd(options, dev=dev), shell=shell)
+    interfaces = _decode_json(enode, response, auto)
+
+    # Older versions don't include the statistics in 'ip addr'
+    if interfaces and any('rx_bytes' not in d for d in interfaces):
+        _merge_json_stats(interfaces, _show_json(
+            enode, '-s link show', dev=dev, shell=shell, use_json=True
+        ))
+
+    return interfaces
+
+
+# Probe of the iproute2 version and of the support of each feature, one line
+# per supported option
+_CAPABILITIES_CMD = (
+    'ip -V; '
+    'for o in {options}; do '
+    'ip $o addr show dev lo >/dev/null 2>&1 && echo "capability $o"; '
+    'done; '
+    'echo "link show dev lo" | ip -batch - >/dev/null 2>&1 && '
+    'echo "capability -batch"'
+).format(options=' '.join(
+    option for option, _ in FEATURES if option != '-batch'
+))
+
+_IP_VERSION_RE = re_compile(r'ip utility, iproute2-(?P<version>[\w.]+)')
+
+
+def _parse_capabilities(raw_result):
+    """
+    Parse the output of the capabilities probe.
+
+    :param str raw_result: os raw result string.
+    :rtype: topology_lib_ip.capabilities.Capabilities
+    :return: The features of the node. They are all unknown if the output
+     doesn't come from the probe.
+    """
+    re_result = _IP_VERSION_RE.search(raw_result)
+    if not re_result:
+        return Capabilities()
+
+    supported = set(
+        line.split()[1] for line in raw_result.splitlines()
+        if line.startswith('capability ')
+    )
+    return Capabilities(
+        version=re_result.group('version'), **{
+            str(feature): option in supported for option, feature in FEATURES
+        }
+    )
+
+
+def capabilities(enode, shell=None, refresh=False, netns=None):
+    """
+    Probe the iproute2 version and features of a node.
+
+    All the features are probed with a single command, the first time only.
+    The result is kept in the record of the node described in
+    :mod:`topology_lib_ip.capabilities`, which the library uses to pick
+    the cheapest way to run each operation: JSON or brief outputs, and
+    batches of commands. Nodes whose record was loaded from a file are not
+    probed.
+
+    :param enode: Engine node to communicate with.
+    :type enode: topology.platforms.base.BaseNode
+    :param str shell: Shell name to execute commands. If ``None``, use the
+     Engine Node default shell.
+    :param bool refresh: Probe the node even if its features are known.
+    :param str netns: Network namespace of the node to run the commands
+     in. If ``None``, use the namespace of the Engine Node.
+    :rtype: topology_lib_ip.capabilities.Capabilities
+    :return: The features of the node.
+    """
+    enode = _in_netns(enode, netns)
+    record = get_capabilities(enode)
+    if record.probed and not refresh:
+        return record
+
+    probed = _parse_capabilities(_send(enode, _CAPABILITIES_CMD, shell=shell))
+    if probed.version is not None:
+        set_capabilities(enode, probed)
+        record = probed
+    return record
+
+
+def _interface_cmds(port, addr=None, up=None):
+    """
+    Build the ``ip`` commands required to configure an interface.
+
+    Commands are returned without the leading ``ip`` so they can be either
+    executed one by one or fed to ``ip -batch``.
+
+    :param str port: Real port name.
+    :param str addr: IPv4 or IPv6 address to add to the interface.
+    :param bool up: Bring up or down the interface.
+    :rtype: list
+    :return: A list of ``ip`` commands.
+    """
+    cmds = []
+
+    if addr is not None:
+        assert ip_interface(addr)
+        cmds.append('addr add {addr} dev {port}'.format(addr=addr, port=port))
+
+    if up is not None:
+        cmds.append('link set dev {port} {state}'.format(
+            port=port, state='up' if up else 'down'
+        ))
+
+    return cmds
+
+
+def _sub_interface_cmds(port, subint, addr=None, up=None):
+    """
+    Build the ``ip`` commands required to configure a subinterface.
+
+    See :func:`_interface_cmds` for the format of the commands.
+
+    :param str port: Real port name of the parent interface.
+    :param str subint: The suffix of the interface.
+    :param str addr: IPv4 or IPv6 address to add to the subinterface.
+    :param bool up: Bring up or down the subinterface.
+    :rtype: list
+    :return: A list of ``ip`` commands.
+    """
+    subport = '{port}.{subint}'.format(port=port, subint=subint)
+    cmds = []
+
+    if addr is not None:
+        assert ip_interface(addr)
+        cmds.append('addr add {addr} dev {subport}'.format(
+            addr=addr, subport=subport
+        ))
+
+    if up is not None:
+        if up:
+            cmds.extend(_interface_cmds(port, up=up))
+
+        cmds.append('link set dev {subport} {state}'.format(
+            subport=subport, state='up' if up else 'down'
+        ))
+
+    return cmds
+
+
+def _remove_ip_cmd(port, addr):
+    """
+    Build the ``ip`` command that removes an IP address from an interface.
+
+    :param str port: Real port name.
+    :param str addr: IPv4 or IPv6 address to remove.
+    :rtype: str
+    :return: The ``ip`` command, without the leading ``ip``.
+    """
+    assert ip_interface(addr)
+    return 'addr del {addr} dev {port}'.format(addr=addr, port=port)
+
+
+def _add_route_cmd(route, via, replace=False):
+    """
+    Build the ``ip`` command that adds a new static route.
+
+    :param str route: Route to add.
+    :param str via: Via for the route.
+    :param bool replace: Replace the route if it already exists.
+    :rtype: tuple
+    :return: A tuple ``(version, cmd)`` with the family option (``'-4'`` or
+     ``'-6'``) and the ``ip`` command without the leading ``ip``. The family
+     option is not needed in batch mode, as ``ip`` infers it from the via.
+    """
+    via = ip_address(via)
+
+    version = '-4'
+    if (via.version == 6) or \
+            (route != 'default' and ip_network(route).version == 6):
+        version = '-6'
+
+    cmd = 'route {action} {route} via {via}'.format(
+        action='replace' if replace else 'add', route=route, via=via
+    )
+    return version, cmd
+
+
+def _add_link_type_vlan_cmd(port, name, vlan_id):
+    """
+    Build the ``ip`` command that creates a vlan device.
+
+    :param str port: Real port name of the parent interface.
+    :param str name: Name of the new virtual device.
+    :param str vlan_id: The VLAN identifier.
+    :rtype: str
+    :return: The ``ip`` command, without the leading ``ip``.
+    """
+    return 'link add link {dev} name {name} type vlan id {vlan_id}'.format(
+        dev=port, name=name, vlan_id=vlan_id
+    )
+
+
+def _remove_link_type_vlan_cmd(name):
+    """
+    Build the ``ip`` command that deletes a vlan device.
+
+    :param str name: Name of the virtual device.
+    :rtype: str
+    :return: The ``ip`` command, without the leading ``ip``.
+    """
+    return 'link del link dev {name}'.format(name=name)
+
+
+def interface(enode, portlbl, addr=None, up=None, shell=None, netns=None):
+    """
+    Configure a interface.
+
+    All parameters left as ``None`` are ignored and thus no configuration
+    action is taken for that parameter (left "as-is"). Nodes that expose
+    their network namespace are configured with rtnetlink, as described in
+    :mod:`topology_lib_ip.netlink`.
+
+    :param enode: Engine node to communicate with.
+    :type enode: topology.platforms.base.BaseNode
+    :param str portlbl: Port label to configure. Port label will be mapped to
+     real port automatically.
+    :param str addr: IPv4 or IPv6 address to add to the interface:
+     - IPv4 address and netmask to assign to the interface in the form
+     ``'192.168.20.20/24'``.
+     - IPv6 address and subnets to assign to the interface in the form
+     ``'2001::1/120'``.
+    :param bool up: Bring up or down the interface.
+    :param str shell: Shell name to execute commands.
+     If ``None``, use the Engine Node default shell.
+    :param str netns: Network namespace of the node to run the commands
+     in. If ``None``, use the namespace of the Engine Node.
+    """
+    enode = _in_netns(enode, netns)
+    assert portlbl
+    port = enode.ports[portlbl]
+    invalidate(enode, port)
+
+    sock = _netlink_socket(enode)
+    if sock is not None:
+        sock.interface(port, addr=addr, up=up)
+        return
+
+    for cmd in _interface_cmds(port, addr=addr, up=up):
+        _write(enode, 'ip {cmd}'.format(cmd=cmd), shell=shell)
+
+
+def sub_interface(
+        enode, portlbl, subint, addr=None, up=None, shell=None, netns=None):
+    """
+    Configure a subinterface.
+
+    All parameters left as ``None`` are ignored and thus no configuration
+    action is taken for that parameter (left "as-is").
+    Sub interfaces can only be configured if the device exists.
+    If you want to enable the sub interface, it will enable the interface
+    as well.
+
+    :param enode: Engine node to communicate with.
+    :type enode: topology.platforms.base.BaseNode
+    :param str portlbl: Port label to configure. Port label will be mapped to
+     real port automatically.
+    :param str subint: The suffix of the interface.
+    :param str addr: IPv4 or IPv6 address to add to the interface:
+     - IPv4 address and netmask to assign to the interface in the form
+     ``'192.168.20.20/24'``.
+     - IPv6 address and subnets to assign to the interface in the form
+     ``'2001::1/120'``.
+    :param bool up: Bring up or down the interface.
+    :param str shell: Shell name to execute commands.
+     If ``None``, use the Engine Node default shell.
+    :param str netns: Network namespace of the node to run the commands
+     in. If ``None``, use the namespace of the Engine Node.
+    """
+    enode = _in_netns(enode, netns)
+    assert portlbl
+    assert subint
+    port = enode.ports[portlbl]
+    invalidate(enode, port, '{port}.{subint}'.format(port=port, subint=subint))
+
+    for cmd in _sub_interface_cmds(port, subint, addr=addr, up=up):
+        _write(enode, 'ip {cmd}'.format(cmd=cmd), shell=shell)
+
+
+def remove_ip(enode, portlbl, addr, shell=None, netns=None):
+    """
+    Remove an IP address from an interface.
+
+    All parameters left as ``None`` are ignored and thus no configuration
+    action is taken for that parameter (left "as-is").
+
+    :param enode: Engine node to communicate with.
+    :type enode: topology.platforms.base.BaseNode
+    :param str portlbl: Port label to configure. Port label will be mapped to
+     real port automatically.
+    :param str addr: IPv4 or IPv6 address to remove from the interface:
+     - IPv4 address to remove from the interface in the form
+     ``'192.168.20.20'`` or ``'192.168.20.20/24'``.
+     - IPv6 address to remove from the interface in the form
+     ``'2001::1'`` or ``'2001::1/120'``.
+    :param str shell: Shell name to execute commands.
+     If ``None``, use the Engine Node default shell.
+    :param str netns: Network namespace of the node to run the commands
+     in. If ``None``, use the namespace of the Engine Node.
+    """
+    enode = _in_netns(enode, netns)
+    assert portlbl
+    port = enode.ports[portlbl]
+    invalidate(enode, port)
+
+    sock = _netlink_socket(enode)
+    if sock is not None:
+        sock.remove_ip(port, addr)
+        return
+
+    cmd = _remove_ip_cmd(port, addr)
+    _write(enode, 'ip {cmd}'.format(cmd=cmd), shell=shell)
+
+
+def add_route(enode, route, via, shell=None, netns=None):
+    """
+    Add a new static route.
+
+    :param enode: Engine node to communicate with.
+    :type enode: topology.platforms.base.BaseNode
+    :param str route: Route to add, an IP in the form ``'192.168.20.20/24'``
+     or ``'2001::0/24'`` or ``'default'``.
+    :param str via: Via for the route as an IP in the form
+     ``'192.168.20.20/24'`` or ``'2001::0/24'``.
+    :param shell: Shell name to execute commands. If ``None``, use the Engine
+     Node default shell.
+    :type shell: str or None
+    :param str netns: Network namespace of the node to run the commands
+     in. If ``None``, use the namespace of the Engine Node.
+    """
+    enode = _in_netns(enode, netns)
+    version, cmd = _add_route_cmd(route, via)
+
+    _write(
+        enode, 'ip {version} {cmd}'.format(version=version, cmd=cmd),
+        shell=shell
+    )
+
+
+def add_link_type_vlan(enode, portlbl, name, vlan_id, shell=None, netns=None):
+    """
+    Add a new virtual link with the type set to VLAN.
+
+    Creates a new vlan device {name} on device {port}.
+    Will raise an exception if value is already assigned.
+
+    :param enode: Engine node to communicate with.
+    :type enode: topology.platforms.base.BaseNode
+    :param str portlbl: Port label to configure. Port label will be mapped
+     automatically.
+    :param str name: specifies the name of the new virtual device.
+    :param str vlan_id: specifies the VLAN identifier.
+    :param str shell: Shell name to execute commands. If ``None``, use the
+     Engine Node default shell.
+    :param str netns: Network namespace of the node to run the commands
+     in. If ``None``, use the namespace of the Engine Node.
+    """
+    enode = _in_netns(enode, netns)
+    assert name
+    if name in enode.ports:
+        raise ValueError('Port {name} already exists'.format(name=name))
+
+    assert portlbl
+    assert vlan_id
+    port = enode.ports[portlbl]
+
+    cmd = _add_link_type_vlan_cmd(port, name, vlan_id)
+    invalidate(enode, name)
+
+    _write(
+        enode, 'ip {cmd}'.format(cmd=cmd), shell=shell,
+        message='Cannot add virtual link {name}'.format(name=name),
+        undo=partial(enode.ports.pop, name, None)
+    )
+
+    enode.ports[name] = name
+
+
+def remove_link_type_vlan(enode, name, shell=None, netns=None):
+    """
+    Delete a virtual link.
+
+    Deletes a vlan device with the name {name}.
+    Will raise an expection if the port is not already present.
+
+    :param enode: Engine node to communicate with.
+    :type enode: topology.platforms.base.BaseNode
+    :param str name: specifies the name of the new
+     virtual device.
+    :param str shell: Shell name to execute commands. If ``None``, use the
+     Engine Node default shell.
+    :param str netns: Network namespace of the node to run the commands
+     in. If ``None``, use the namespace of the Engine Node.
+    """
+    enode = _in_netns(enode, netns)
+    assert name
+    if name not in enode.ports:
+        raise ValueError('Port {name} doesn\'t exists'.format(name=name))
+
+    cmd = _remove_link_type_vlan_cmd(name)
+    invalidate(enode, name)
+
+    _write(
+        enode, 'ip {cmd}'.format(cmd=cmd), shell=shell,
+        message='Cannot remove virtual link {name}'.format(name=name),
+        undo=partial(enode.ports.__setitem__, name, enode.ports[name])
+    )
+
+    del enode.ports[name]
+
+
+_BATCH_EOF = 'IP_BATCH_EOF'
+
+_BATCH_FAILED_RE = re_compile(r'^Command failed \S*?:(?P<lineno>\d+)$')
+
+
+class BatchFailure(namedtuple('BatchFailure', ['call', 'command', 'message'])):
+    """
+    Failure of a single command sent through :class:`IpBatch`.
+
+    :var str call: Library call that queued the command, for example
+     ``"interface('1', addr='10.0.0.1/24')"``, or ``None`` if the failure
+     could not be attributed to a command.
+    :var str command: The ``ip`` command that failed, without the leading
+     ``ip``.
+    :var str message: The error message reported by ``ip``.
+    """
+    __slots__ = ()
+
+
+class BatchError(AssertionError):
+    """
+    Raised when one or more commands of an ``ip -batch`` call failed.
+
+    It subclasses :class:`AssertionError` as the non-batched functions of
+    this library signal failed commands with an assertion.
+
+    :var list failures: A list of :class:`BatchFailure`, one for each failed
+     command, in the order the commands were queued.
+    """
+
+    def __init__(self, failures):
+        self.failures = failures
+        super(BatchError, self).__init__('\n'.join(
+            '{call}: {command}: {message}'.format(
+                call=failure.call, command=failure.command,
+                message=failure.message
+            ) for failure in failures
+        ))
+
+
+def _batch_command(cmds, force=True):
+    """
+    Build a single ``ip -batch`` shell command from a list of ``ip`` commands.
+
+    The commands are fed to ``ip`` through a heredoc.
+
+    :param list cmds: ``ip`` commands without the leading ``ip``.
+    :param bool force: Use ``-force`` so a failed command does not stop the
+     remaining ones.
+    :rtype: str
+    """
+    return 'ip {force}-batch - <<\'{eof}\'\n{cmds}\n{eof}'.format(
+        force='-force ' if force else '', eof=_BATCH_EOF,
+        cmds='\n'.join(cmds)
+    )
+
+
+def _parse_ip_batch(raw_result, cmds, force=True):
+    """
+    Parse the output of an ``ip -batch`` command.
+
+    ``ip`` reports each failed line of the batch with the error message
+    followed by a ``Command failed -:<lineno>`` line. The echo of the heredoc
+    is ignored.
+
+    :param str raw_result: os raw result string.
+    :param list cmds: The commands sent in the batch.
+    :param bool force: If the batch was sent with ``-force``. If not, every
+     command after the first failed one is reported as not executed.
+    :rtype: OrderedDict
+    :return: A dictionary mapping the index in ``cmds`` of each failed command
+     to its error message. Output that cannot be attributed to any command is
+     stored under the ``None`` key.
+    """
+    errors = OrderedDict()
+    ignore = set(cmds)
+    ignore.add(_BATCH_EOF)
+    pending = []
+
+    for line in raw_result.splitlines():
+        line = line.strip()
+
+        # Remove heredoc continuation prompts
+        while line.startswith('>'):
+            line = line[1:].lstrip()
+
+        if not line or line in ignore or '-batch - <<' in line:
+            continue
+
+        re_result = _BATCH_FAILED_RE.match(line)
+        if re_result:
+            index = int(re_result.group('lineno')) - 1
+            errors[index] = '\n'.join(pending) or 'Command failed'
+            pending = []
+            continue
+
+        pending.append(line)
+
+    if not force and errors:
+        first = next(iter(errors))
+        for index in range(first + 1, len(cmds)):
+            errors[index] = 'Not executed'
+
+    if pending:
+        errors[None] = '\n'.join(pending)
+
+    return errors
+
+
+def _run_batch(enode, cmds, shell=None, force=True):
+    """
+    Execute a list of ``ip`` commands in a single ``ip -batch`` call.
+
+    :param enode: Engine node to communicate with.
+    :type enode: topology.platforms.base.BaseNode
+    :param list cmds: ``ip`` commands without the leading ``ip``.
+    :param str shell: Shell name to execute commands. If ``None``, use the
+     Engine Node default shell.
+    :param bool force: Don't stop on the first failed command.
+    :rtype: OrderedDict
+    :return: The failed commands as returned by :func:`_parse_ip_batch`.
+     Nodes whose capabilities show no support of ``ip -batch`` are sent the
+     commands one by one instead.
+    """
+    if not cmds:
+        return OrderedDict()
+
+    # Nodes known not to support batches get the commands one by one
+    if get_capabilities(enode).batch is False:
+        errors = OrderedDict()
+        for index, cmd in enumerate(cmds):
+            if errors and not force:
+                errors[index] = 'Not executed'
+                continue
+            response = _send(enode, 'ip {cmd}'.format(cmd=cmd), shell=shell)
+            if response:
+                errors[index] = response.strip()
+        return errors
+
+    response = _send(enode, _batch_command(cmds, force=force), shell=shell)
+    return _parse_ip_batch(response, cmds, force=force)
+
+
+def _call_repr(name, *args, **kwargs):
+    """
+    Represent a library call for error reporting.
+    """
+    params = [repr(arg) for arg in args]
+    params.extend(
+        '{}={!r}'.format(key, value)
+        for key, value in sorted(kwargs.items()) if value is not None
+    )
+    return '{}({})'.format(name, ', '.join(params))
+
+
+class IpBatch(object):
+    """
+    Collect ``ip`` commands and execute them in a single ``ip -batch`` call.
+
+    Instances are created with :func:`ip_batch`. The queueing methods mirror
+    the functions of this library, validate their arguments immediately and
+    send nothing to the node until :meth:`commit` is called.
+
+    :param enode: Engine node to communicate with.
+    :type enode: topology.platforms.base.BaseNode
+    :param str shell: Shell name to execute commands. If ``None``, use the
+     Engine Node default shell.
+    :param bool force: Use ``ip -force -batch`` so a failed command does not
+     stop the remaining ones.
+    """
+
+    def __init__(self, enode, shell=None, force=True):
+        self._enode = enode
+        self._shell = shell
+        self._force = force
+        self._cmds = []
+        self._calls = []
+        self._ports = {}
+        self._port_updates = []
+
+    def __len__(self):
+        return len(self._cmds)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        if exc_type is None:
+            self.commit()
+        else:
+            self.discard()
+        return False
+
+    @property
+    def commands(self):
+        """
+        The queued ``ip`` commands, without the leading ``ip``.
+
+        :rtype: list
+        """
+        return list(self._cmds)
+
+    def has_port(self, name):
+        """
+        Check if a device will exist once the queued commands are executed.
+
+        :param str name: Port label or device name.
+        :rtype: bool
+        :return: ``True`` if the device is created by a queued command, or
+         is in the port mapping of the node and not removed by one.
+        """
+        return self._ports.get(name, name in self._enode.ports)
+
+    def _port(self, portlbl):
+        assert portlbl
+        if portlbl in self._ports:
+            if not self._ports[portlbl]:
+                raise KeyError(portlbl)
+            return portlbl
+        return self._enode.ports[portlbl]
+
+    def _queue(self, call, cmds):
+        for cmd in cmds:
+            self._cmds.append(cmd)
+            self._calls.append(call)
+
+    def interface(self, portlbl, addr=None, up=None):
+        """
+        Queue the configuration of an interface.
+
+        See :func:`interface` for the description of the parameters.
+        """
+        port = self._port(portlbl)
+        self._queue(
+            _call_repr('interface', portlbl, addr=addr, up=up),
+            _interface_cmds(port, addr=addr, up=up)
+        )
+
+    def sub_interface(self, portlbl, subint, addr=None, up=None):
+        """
+        Queue the configuration of a subinterface.
+
+        See :func:`sub_interface` for the description of the parameters.
+        """
+        assert subint
+        port = self._port(portlbl)
+        self._queue(
+            _call_repr('sub_interface', portlbl, subint, addr=addr, up=up),
+            _sub_interface_cmds(port, subint, addr=addr, up=up)
+        )
+
+    def remove_ip(self, portlbl, addr):
+        """
+        Queue the removal of an IP address from an interface.
+
+        See :func:`remove_ip` for the description of the parameters.
+        """
+        port = self._port(portlbl)
+        self._queue(
+            _call_repr('remove_ip', portlbl, addr),
+            [_remove_ip_cmd(port, addr)]
+        )
+
+    def add_route(self, route, via, replace=False):
+        """
+        Queue a new static route.
+
+        See :func:`add_route` for the description of the parameters. If
+        ``replace`` is set, an existing route to the same destination is
+        replaced instead of failing.
+        """
+        _, cmd = _add_route_cmd(route, via, replace=replace)
+        self._queue(
+            _call_repr('add_route', route, via, replace=replace or None),
+            [cmd]
+        )
+
+    def add_link_type_vlan(self, portlbl, name, vlan_id):
+        """
+        Queue the creation of a vlan device.
+
+        The port mapping of the node is updated on :meth:`commit` if the
+        device was created. See :func:`add_link_type_vlan` for the description
+        of the parameters.
+        """
+        assert name
+        if self.has_port(name):
+            raise ValueError('Port {name} already exists'.format(name=name))
+
+        assert vlan_id
+        port = self._port(portlbl)
+        self._queue(
+            _call_repr('add_link_type_vlan', portlbl, name, vlan_id),
+            [_add_link_type_vlan_cmd(port, name, vlan_id)]
+        )
+        self._ports[name] = True
+        self._port_updates.append((len(self._cmds) - 1, name, True))
+
+    def remove_link_type_vlan(self, name):
+        """
+        Queue the removal of a vlan device.
+
+        The port mapping of the node is updated on :meth:`commit` if the
+        device was removed. See :func:`remove_link_type_vlan` for the
+        description of the parameters.
+        """
+        assert name
+        if not self.has_port(name):
+            raise ValueError('Port {name} doesn\'t exists'.format(name=name))
+
+        self._queue(
+            _call_repr('remove_link_type_vlan', name),
+            [_remove_link_type_vlan_cmd(name)]
+        )
+        self._ports[name] = False
+        self._port_updates.append((len(self._cmds) - 1, name, False))
+
+    def discard(self):
+        """
+        Drop all the queued commands without executing them.
+        """
+        self._cmds = []
+        self._calls = []
+        self._ports = {}
+        self._port_updates = []
+
+    def commit(self):
+        """
+        Execute all the queued commands in a single ``ip -batch`` call.
+
+        :raises BatchError: If any of the commands failed. The port mapping of
+         the node is updated for the commands that succeeded before raising.
+        """
+        cmds, calls, port_updates = self._take()
+        errors = _run_batch(
+            self._enode, cmds, shell=self._shell, force=self._force
+        )
+        self._finish(cmds, calls, port_updates, errors)
+
+    def _take(self):
+        """
+        Empty the batch and return its commands, calls and port updates.
+        """
+        queued = self._cmds, self._calls, self._port_updates
+        self.discard()
+        return queued
+
+    def _finish(self, cmds, calls, port_updates, errors):
+        """
+        Update the port mapping and report the failures of an executed batch.
+        """
+        if cmds:
+            invalidate(self._enode)
+
+        # Output that cannot be attributed means that the state of the node is
+        # unknown, so leave the port mapping untouched.
+        if None not in errors:
+            for index, name, added in port_updates:
+                if index in errors:
+                    continue
+                if added:
+                    self._enode.ports[name] = name
+                else:
+                    self._enode.ports.pop(name, None)
+
+        if errors:
+            raise BatchError([
+                BatchFailure(
+                    call=calls[index] if index is not None else None,
+                    command=cmds[index] if index is not None else None,
+                    message=message
+                ) for index, message in errors.items()
+            ])
+
+
+def ip_batch(enode, shell=None, force=True, netns=None):
+    """
+    Create a batch to configure a node with a single ``ip -batch`` call.
+
+    The returned :class:`IpBatch` queues the same operations provided by
+    :func:`interface`, :func:`sub_interface`, :func:`remove_ip`,
+    :func:`add_route`, :func:`add_link_type_vlan` and
+    :func:`remove_link_type_vlan`, and sends them all at once when used as a
+    context manager:
+
+    ::
+
+        with ip_batch(enode) as batch:
+            batch.interface('1', addr='192.168.20.20/24', up=True)
+            batch.add_route('default', '192.168.20.1')
+
+    Nothing is sent if the block raises an exception.
+
+    :param enode: Engine node to communicate with.
+    :type enode: topology.platforms.base.BaseNode
+    :param str shell: Shell name to execute commands. If ``None``, use the
+     Engine Node default shell.
+    :param bool force: Use ``ip -force -batch`` so a failed command does not
+     stop the remaining ones. Failures are reported at the end of the batch
+     with a :class:`BatchError` that maps every failed command back to the
+     call that queued it.
+    :param str netns: Network namespace of the node to run the commands
+     in. If ``None``, use the namespace of the Engine Node.
+    :rtype: IpBatch
+    """
+    enode = _in_netns(enode, netns)
+    return IpBatch(enode, shell=shell, force=force)
+
+
+def _run_chunked(enode, cmds, chunk_size, shell=None):
+    """
+    Execute a list of commands in ``ip -force -batch`` calls of bounded size.
+
+    :rtype: OrderedDict
+    :return: The errors, as returned by :func:`_parse_ip_batch`, indexed in
+     the whole list of commands.
+    """
+    assert chunk_size > 0
+    errors = OrderedDict()
+
+    for start in range(0, len(cmds), chunk_size):
+        chunk_errors = _run_batch(
+            enode, cmds[start:start + chunk_size], shell=shell, force=True
+        )
+        for index, message in chunk_errors.items():
+            errors[start + index if index is not None else None] = message
+
+    return errors
+
+
+def add_link_type_vlans(
+        enode, portlbl, vlan_ids, name_fmt='{port}.{vlan_id}',
+        chunk_size=1000, shell=None, netns=None):
+    """
+    Add many virtual links with the type set to VLAN on the same port.
+
+    Every name is validated against the port mapping of the node before
+    sending anything. The devices are then created with ``ip -batch``
+    commands of at most ``chunk_size`` devices, and the port mapping is
+    updated at once when all of them succeeded:
+
+    ::
+
+        add_link_type_vlans(enode, '1', range(1, 4001))
+
+    If any device cannot be created, the ones that were created are deleted
+    again, so the node and its port mapping are left as they were.
+
+    :param enode: Engine node to communicate with.
+    :type enode: topology.platforms.base.BaseNode
+    :param str portlbl: Port label of the parent interface. Port label will be
+     mapped automatically.
+    :param vlan_ids: The VLAN identifiers.
+    :type vlan_ids: iterable
+    :param str name_fmt: Format of the names of the new virtual devices,
+     expanded with the ``port`` name, the ``portlbl`` and the ``vlan_id``.
+    :param int chunk_size: Maximum number of devices per ``ip -batch``
+     command.
+    :param str shell: Shell name to execute commands. If ``None``, use the
+     Engine Node default shell.
+    :param str netns: Network namespace of the node to run the commands
+     in. If ``None``, use the namespace of the Engine Node.
+    :rtype: list
+    :return: The names of the new devices, in the order of ``vlan_ids``.
+    :raises ValueError: If any of the names is already a port of the node or
+     is repeated.
+    :raises BatchError: If any of the devices could not be created.
+    """
+    enode = _in_netns(enode, netns)
+    assert portlbl
+    port = enode.ports[portlbl]
+
+    vlan_ids = list(vlan_ids)
+    assert all(vlan_ids)
+    names = [
+        name_fmt.format(port=port, portlbl=portlbl, vlan_id=vlan_id)
+        for vlan_id in vlan_ids
+    ]
+
+    seen = set()
+    existing = []
+    for name in names:
+        assert name
+        if name in seen or name in enode.ports:
+            existing.append(name)
+        seen.add(name)
+    if existing:
+        raise ValueError('Ports {names} already exist'.format(
+            names=', '.join(existing)
+        ))
+
+    cmds = [
+        _add_link_type_vlan_cmd(port, name, vlan_id)
+        for name, vlan_id in zip(names, vlan_ids)
+    ]
+    invalidate(enode, *names)
+    errors = _run_chunked(enode, cmds, chunk_size, shell=shell)
+
+    if errors:
+        # Output that cannot be attributed may hide created devices
+        created = [
+            name for index, name in enumerate(names)
+            if None in errors or index not in errors
+        ]
+        _run_chunked(
+            enode, [_remove_link_type_vlan_cmd(name) for name in created],
+            chunk_size, shell=shell
+        )
+        raise BatchError([
+            BatchFailure(
+                call=_call_repr(
+                    'add_link_type_vlan', portlbl, names[index],
+                    vlan_ids[index]
+                ) if index is not None else None,
+                command=cmds[index] if index is not None else None,
+                message=message
+            ) for index, message in errors.items()
+        ])
+
+    enode.ports.update((name, name) for name in names)
+    return names
+
+
+def remove_link_type_vlans(
+        enode, names, chunk_size=1000, shell=None, netns=None):
+    """
+    Delete many virtual links.
+
+    Every name is validated against the port mapping of the node before
+    sending anything. The devices are then deleted with ``ip -batch``
+    commands of at most ``chunk_size`` devices, and the port mapping is
+    updated at once.
+
+    Deleted devices cannot be restored without knowing how they were
+    created, so a partial failure is not rolled back: the port mapping keeps
+    only the devices that could not be deleted.
+
+    :param enode: Engine node to communicate with.
+    :type enode: topology.platforms.base.BaseNode
+    :param names: Names of the virtual devices.
+    :type names: iterable
+    :param int chunk_size: Maximum number of devices per ``ip -batch``
+     command.
+    :param str shell: Shell name to execute commands. If ``None``, use the
+     Engine Node default shell.
+    :param str netns: Network namespace of the node to run the commands
+     in. If ``None``, use the namespace of the Engine Node.
+    :raises ValueError: If any of the names is not a port of the node or is
+     repeated.
+    :raises BatchError: If any of the devices could not be deleted.
+    """
+    enode = _in_netns(enode, netns)
+    names = list(names)
+
+    seen = set()
+    missing = []
+    for name in names:
+        assert name
+        if name in seen or name not in enode.ports:
+            missing.append(name)
+        seen.add(name)
+    if missing:
+        raise ValueError('Ports {names} don\'t exist'.format(
+            names=', '.join(missing)
+        ))
+
+    cmds = [_remove_link_type_vlan_cmd(name) for name in names]
+    invalidate(enode, *names)
+    errors = _run_chunked(enode, cmds, chunk_size, shell=shell)
+
+    # Output that cannot be attributed means that the state of the node is
+    # unknown, so leave the port mapping untouched.
+    if None not in errors:
+        for index, name in enumerate(names):
+            if index not in errors:
+                del enode.ports[name]
+
+    if errors:
+        raise BatchError([
+            BatchFailure(
+                call=_call_repr('remove_link_type_vlan', names[index])
+                if index is not None else None,
+                command=cmds[index] if index is not None else None,
+                message=message
+            ) for index, message in errors.items()
+        ])
+
+
+def _stream_batches(
+        enode, name, items, build, chunk_size, shell=None, force=True):
+    """
+    Send the commands of a stream of items in ``ip -batch`` calls of bounded
+    size.
+
+    The items are consumed lazily, so memory is bounded by ``chunk_size``.
+
+    :param str name: Name of the library function, for error reporting.
+    :param items: Iterable of items.
+    :param build: Callable returning the ``ip`` command of an item, without
+     the leading ``ip``.
+    :param int chunk_size: Maximum number of commands per ``ip -batch``.
+    :param bool force: Keep sending chunks after a failure.
+    :rtype: tuple
+    :return: The number of items and of chunks sent.
+    :raises BatchError: If any command failed, once all the chunks are sent.
+    """
+    assert chunk_size > 0
+
+    failures = []
+    count = 0
+    chunks = 0
+    chunk = []
+    cmds = []
+
+    def flush():
+        errors = _run_batch(enode, cmds, shell=shell, force=force)
+        failures.extend(
+            BatchFailure(
+                call=_call_repr(name, chunk[index])
+                if index is not None else None,
+                command=cmds[index] if index is not None else None,
+                message=message
+            ) for index, message in errors.items()
+        )
+        return not errors
+
+    for item in items:
+        chunk.append(item)
+        cmds.append(build(item))
+
+        if len(cmds) == chunk_size:
+            chunks += 1
+            count += len(cmds)
+            if not flush() and not force:
+                break
+            chunk, cmds = [], []
+    else:
+        if cmds:
+            chunks += 1
+            count += len(cmds)
+            flush()
+
+    if failures:
+        raise BatchError(failures)
+
+    return count, chunks
+
+
+class AddRoutesResult(namedtuple(
+        'AddRoutesResult', ['routes', 'chunks', 'elapsed', 'rate'])):
+    """
+    Throughput achieved by :func:`add_routes`.
+
+    :var int routes: Number of routes sent to the node.
+    :var int chunks: Number of ``ip -batch`` commands used.
+    :var float elapsed: Seconds spent, including the generation of the
+     routes.
+    :var float rate: Routes per second.
+    """
+    __slots__ = ()
+
+
+def _route_cmd(route, replace=False):
+    """
+    Build the ``ip`` command that programs a route spec of :func:`add_routes`.
+
+    :param route: A tuple ``(dst, via)`` or a dictionary.
+    :param bool replace: Use ``route replace`` instead of ``route add``.
+    :rtype: str
+    :return: The ``ip`` command, without the leading ``ip``.
+    """
+    if not isinstance(route, dict):
+        dst, via = route
+        route = {'dst': dst, 'via': via}
+
+    cmd = ['route', 'replace' if replace else 'add', route['dst']]
+
+    for key in ('via', 'dev', 'metric', 'table'):
+        if route.get(key) is not None:
+            cmd.extend((key, str(route[key])))
+
+    for nexthop in route.get('nexthops') or ():
+        if not isinstance(nexthop, dict):
+            nexthop = {'via': nexthop}
+        cmd.append('nexthop')
+        for key in ('via', 'dev', 'weight'):
+            if nexthop.get(key) is not None:
+                cmd.extend((key, str(nexthop[key])))
+
+    return ' '.join(cmd)
+
+
+def add_routes(
+        enode, routes, replace=False, chunk_size=1000, shell=None,
+        force=True, netns=None):
+    """
+    Add many static routes, streamed through ``ip -batch``.
+
+    The routes are consumed lazily and sent in ``ip -batch`` commands of at
+    most ``chunk_size`` routes, so a generator of any length can be
+    programmed with bounded memory and ``len(routes) / chunk_size`` round
+    trips:
+
+    ::
+
+        result = add_routes(enode, (
+            ('10.{}.{}.0/24'.format(i // 256, i % 256), '192.168.20.1')
+            for i in range(100000)
+        ))
+        print('{:.0f} routes/s'.format(result.rate))
+
+    Unlike :func:`add_route`, the routes are not validated locally; errors
+    are reported by the node.
+
+    :param enode: Engine node to communicate with.
+    :type enode: topology.platforms.base.BaseNode
+    :param routes: An iterable of routes. Each route is either a tuple
+     ``(dst, via)`` or a dictionary with the keys:
+
+     - ``dst``: Destination, like ``'10.0.0.0/8'``, ``'2001::/16'`` or
+       ``'default'``.
+     - ``via``: Optional gateway.
+     - ``dev``: Optional output device.
+     - ``metric``: Optional metric.
+     - ``table``: Optional routing table.
+     - ``nexthops``: Optional list of gateways of a multipath route, either
+       addresses or dictionaries with the ``via``, ``dev`` and ``weight``
+       keys.
+    :param bool replace: Replace existing routes to the same destination
+     instead of failing.
+    :param int chunk_size: Maximum number of routes per ``ip -batch``
+     command.
+    :param str shell: Shell name to execute commands. If ``None``, use the
+     Engine Node default shell.
+    :param bool force: Keep adding routes after a failure. If ``False``, no
+     more chunks are sent after the first one with a failure.
+    :param str netns: Network namespace of the node to run the commands
+     in. If ``None``, use the namespace of the Engine Node.
+    :rtype: AddRoutesResult
+    :raises BatchError: If any route failed, once all the chunks are sent.
+    """
+    enode = _in_netns(enode, netns)
+    start = monotonic()
+    count, chunks = _stream_batches(
+        enode, 'add_routes', routes,
+        lambda route: _route_cmd(route, replace=replace), chunk_size,
+        shell=shell, force=force
+    )
+
+    elapsed = monotonic() - start
+    return AddRoutesResult(
+        routes=count, chunks=chunks, elapsed=elapsed,
+        rate=count / elapsed if elapsed > 0 else 0.0
+    )
+
+
+def show_interface(enode, dev, shell=None, use_json=None, netns=None):
+    """
+    Show the configured parameters and stats of an interface.
+
+    When the ``ip`` command of the node supports JSON output, a single
+    ``ip -j -s -d addr show dev <dev>`` command is used and decoded with
+    :func:`_parse_ip_json_addr_show`. Otherwise the text output of
+    ``ip addr list`` and ``ip -s link list`` is parsed. JSON support is
+    detected on the first call and remembered for the node. Nodes that
+    expose their network namespace are queried with rtnetlink instead, as
+    described in :mod:`topology_lib_ip.netlink`.
+
+    :param enode: Engine node to communicate with.
+    :type enode: topology.platforms.base.BaseNode
+    :param str dev: Unix network device name. Ex 1, 2, 3..
+    :param str shell: Shell name to execute commands. If ``None``, use the
+     Engine Node default shell.
+    :param bool use_json: Force (``True``) or disable (``False``) the use of
+     the JSON output. If ``None``, use it when the node supports it.
+    :param str netns: Network namespace of the node to run the commands
+     in. If ``None``, use the namespace of the Engine Node.
+    :rtype: topology_lib_ip.results.InterfaceInfo
+    :return: A combined dictionary like object as returned by both
+     :func:`topology_lib_ip.parser._parse_ip_addr_show`
+     :func:`topology_lib_ip.parser._parse_ip_stats_link_show`
+     Use its ``to_dict()`` method to get a plain dictionary.
+    """
+    enode = _in_netns(enode, netns)
+    assert dev
+
+    cache = get_cache(enode)
+    if cache is not None:
+        d = cache.get(dev)
+        if d is not None:
+            return d
+
+    d = _read_interface(enode, dev, shell=shell, use_json=use_json)
+
+    if cache is not None and d is not None:
+        cache.put(dev, d)
+    return d
+
+
+def _read_interface(enode, dev, shell=None, use_json=None):
+    """
+    Fetch the state of an interface from the node.
+
+    See :func:`show_interface` for the description of the parameters.
+    """
+    if use_json is None:
+        sock = _netlink_socket(enode)
+        if sock is not None:
+            return sock.show_interface(dev)
+
+    interfaces = _show_json(
+        enode, '-s -d addr show', dev=dev, shell=shell, use_json=use_json
+    )
+    if interfaces is not None:
+        return interfaces[0] if interfaces else None
+
+    cmd = 'ip addr list dev {ldev}'.format(ldev=dev)
+    response = _send(enode, cmd, shell=shell)
+
+    first_half_dict = _parse_ip_addr_show(response)
+
+    d = None
+    if (first_half_dict):
+        cmd = 'ip -s link list dev {ldev}'.format(ldev=dev)
+        response = _send(enode, cmd, shell=shell)
+        second_half_dict = _parse_ip_stats_link_show(response)
+
+        d = first_half_dict
+        d.stats = second_half_dict
+    return d
+
+
+def show_interfaces(enode, devs=None, shell=None, use_json=None, netns=None):
+    """
+    Show the configured parameters and stats of all the interfaces of a node.
+
+    All the interfaces are fetched at once, with a single
+    ``ip -j -s -d addr show`` command if the node supports JSON output, or
+    with one ``ip addr show`` and one ``ip -s link show`` command otherwise.
+    Nodes that expose their network namespace are queried with rtnetlink
+    instead, as described in :mod:`topology_lib_ip.netlink`.
+
+    :param enode: Engine node to communicate with.
+    :type enode: topology.platforms.base.BaseNode
+    :param devs: Unix network device names to include in the result. If
+     ``None``, include all the interfaces of the node.
+    :type devs: list or None
+    :param str shell: Shell name to execute commands. If ``None``, use the
+     Engine Node default shell.
+    :param bool use_json: Force (``True``) or disable (``False``) the use of
+     the JSON output. If ``None``, use it when the node supports it.
+    :param str netns: Network namespace of the node to run the commands
+     in. If ``None``, use the namespace of the Engine Node.
+    :rtype: OrderedDict
+    :return: A dictionary mapping each device name to a dictionary as
+     returned by :func:`show_interface`, in the order listed by the node.
+     Requested devices that don't exist are not included.
+    """
+    enode = _in_netns(enode, netns)
+    cache = get_cache(enode)
+    if cache is not None and devs is not None:
+        devs = list(devs)
+        result = cache.get_many(devs)
+        if result is not None:
+            return result
+
+    result = _read_interfaces(enode, devs=devs, shell=shell, use_json=use_json)
+
+    if cache is not None:
+        for dev, d in result.items():
+            cache.put(dev, d)
+    return result
+
+
+def _read_interfaces(enode, devs=None, shell=None, use_json=None):
+    """
+    Fetch the state of the interfaces of a node.
+
+    See :func:`show_interfaces` for the description of the parameters.
+    """
+    if devs is not None:
+        devs = set(devs)
+
+    if use_json is None:
+        sock = _netlink_socket(enode)
+        if sock is not None:
+            return sock.show_interfaces(devs)
+
+    result = OrderedDict()
+
+    interfaces = _show_json(
+        enode, '-s -d addr show', shell=shell, use_json=use_json
+    )
+    if interfaces is not None:
+        for d in interfaces:
+            if devs is None or d['dev'] in devs:
+                result[d['dev']] = d
+        return result
+
+    response = _send(enode, 'ip addr show', shell=shell)
+    for raw_result in _split_ip_show(response):
+        d = _parse_ip_addr_show(raw_result)
+        if d and (devs is None or _ifname(d['dev']) in devs):
+            result[_ifname(d['dev'])] = d
+
+    stats = _show_link_stats(enode, shell=shell, use_json=False)
+    for dev, d in result.items():
+        if dev in stats:
+            d.stats = stats[dev]
+
+    return result
+
+
+# Separators of the outputs of show_interfaces_all_netns
+_ALL_NETNS_MARKER = 'IP_ALL_NETNS'
+
+_NETNS_STATS_MARKER = 'IP_NETNS_STATS'
+
+_NETNS_HEADER_RE = re_compile(r'^netns: (?P<netns>\S+)$')
+
+_ALL_NETNS_JSON_CMD = (
+    'ip -j -s -d addr show; echo {marker}; '
+    'ip -all netns exec ip -j -s -d addr show'
+).format(marker=_ALL_NETNS_MARKER)
+
+_NETNS_TEXT_CMD = 'ip addr show; echo {marker}; ip -s link show'.format(
+    marker=_NETNS_STATS_MARKER
+)
+
+_ALL_NETNS_TEXT_CMD = (
+    '{cmd}; echo {marker}; ip -all netns exec sh -c {quoted}'
+).format(
+    cmd=_NETNS_TEXT_CMD, marker=_ALL_NETNS_MARKER,
+    quoted=quote(_NETNS_TEXT_CMD)
+)
+
+
+def _split_all_netns(raw_result):
+    """
+    Split the raw output of a command built like :data:`_ALL_NETNS_JSON_CMD`
+    by network namespace, in a single pass.
+
+    :param str raw_result: os raw result string.
+    :return: An iterator over tuples ``(netns, raw_result)``. The output of
+     the default namespace comes first, with ``netns`` set to ``None``,
+     followed by the output of ``ip -all netns exec`` before the first
+     namespace, with ``netns`` set to ``''``.
+    """
+    netns = None
+    block = []
+
+    for line in raw_result.splitlines(True):
+        stripped = line.rstrip()
+        if netns is None and stripped == _ALL_NETNS_MARKER:
+            yield netns, ''.join(block)
+            netns, block = '', []
+            continue
+
+        re_result = _NETNS_HEADER_RE.match(stripped) \
+            if netns is not None else None
+        if re_result:
+            yield netns, ''.join(block)
+            netns, block = re_result.group('netns'), []
+            continue
+
+        block.append(line)
+
+    yield netns, ''.join(block)
+
+
+def _parse_netns_text(raw_result):
+    """
+    Parse the raw output of :data:`_NETNS_TEXT_CMD`.
+
+    :param str raw_result: os raw result string.
+    :rtype: OrderedDict
+    :return: The interfaces, as returned by :func:`show_interfaces`.
+    """
+    addr, link = (
+        _split_markers(raw_result, _NETNS_STATS_MARKER) + ['']
+    )[:2]
+
+    result = OrderedDict()
+    for raw in _split_ip_show(addr):
+        d = _parse_ip_addr_show(raw)
+        if d:
+            result[_ifname(d['dev'])] = d
+
+    stats = _parse_link_stats(link)
+    for dev, d in result.items():
+        if dev in stats:
+            d.stats = stats[dev]
+
+    return result
+
+
+def _netns_failed(netns, raw_result):
+    """
+    Report the output of a network namespace that isn't a list of
+    interfaces.
+    """
+    raise AssertionError(
+        'Cannot read the interfaces of network namespace {}:\n{}'.format(
+            netns, raw_result.strip()
+        )
+    )
+
+
+def show_interfaces_all_netns(enode, shell=None, use_json=None):
+    """
+    Show the interfaces of every network namespace of a node.
+
+    The interfaces of the default namespace and of every named namespace
+    are read at once, with a single shell command line relying on
+    ``ip -all netns exec``:
+
+    ::
+
+        for netns, interfaces in show_interfaces_all_netns(hs1).items():
+            print(netns or 'default', list(interfaces))
+
+    The JSON output is used if the node supports it, or one
+    ``ip addr show`` and one ``ip -s link show`` command per namespace
+    otherwise. The output is split by namespace in a single pass.
+
+    :param enode: Engine node to communicate with.
+    :type enode: topology.platforms.base.BaseNode
+    :param str shell: Shell name to execute commands. If ``None``, use the
+     Engine Node default shell.
+    :param bool use_json: Force (``True``) or disable (``False``) the use of
+     the JSON output. If ``None``, use it when the node supports it.
+    :rtype: OrderedDict
+    :return: A dictionary mapping each namespace name to the interfaces of
+     the namespace, as returned by :func:`show_interfaces`. The default
+     namespace comes first, as ``None``. Namespaces without output have no
+     interfaces.
+    :raises AssertionError: If the output of a namespace isn't a list of
+     interfaces, for example because the command failed in it.
+    """
+    auto = use_json is None
+    if auto:
+        use_json = get_capabilities(enode).json is not False
+
+    result = OrderedDict()
+
+    if use_json:
+        sections = _split_all_netns(
+            _send(enode, _ALL_NETNS_JSON_CMD, shell=shell)
+        )
+        netns, raw_result = next(sections)
+        interfaces = _decode_json(enode, raw_result, auto)
+        if interfaces is not None:
+            result[None] = OrderedDict((d['dev'], d) for d in interfaces)
+            for netns, raw_result in sections:
+                if not netns:
+                    assert not raw_result.strip(), raw_result
+                    continue
+                interfaces = []
+                if raw_result.strip():
+                    try:
+                        interfaces = _parse_ip_json_addr_show(raw_result)
+                    except ValueError:
+                        _netns_failed(netns, raw_result)
+                result[netns] = OrderedDict(
+                    (d['dev'], d) for d in interfaces
+                )
+            return result
+
+    for netns, raw_result in _split_all_netns(
+            _send(enode, _ALL_NETNS_TEXT_CMD, shell=shell)):
+        if netns == '':
+            assert not raw_result.strip(), raw_result
+            continue
+        interfaces = _parse_netns_text(raw_result)
+        if not interfaces and \
+                raw_result.replace(_NETNS_STATS_MARKER, '').strip():
+            _netns_failed(netns, raw_result)
+        result[netns] = interfaces
+
+    return result
+
+
+class BriefInterface(namedtuple('BriefInterface', [
+        'dev', 'state', 'mac_address', 'flags', 'addresses'])):
+    """
+    Interface listed by :func:`list_interfaces_brief`.
+
+    :var str dev: Unix network device name.
+    :var str state: Operational state, like ``'UP'``.
+    :var str mac_address: Link layer address, or ``None``.
+    :var list flags: Interface flags, like ``['BROADCAST', 'UP']``.
+    :var list addresses: Addresses with their prefix, like
+     ``['192.0.2.1/24']``.
+    """
+    __slots__ = ()
+
+
+_BRIEF_MARKER = 'IP_BRIEF_ADDR'
+
+_BRIEF_CMD = 'ip -br link show; echo {marker}; ip -br addr show'.format(
+    marker=_BRIEF_MARKER
+)
+
+_IP_BRIEF_UNKNOWN_RE = re_compile(r'Option "-br\w*" is unknown')
+
+
+def _parse_ip_brief(raw_result):
+    """
+    Parse the output of 'ip -br link show' and 'ip -br addr show', separated
+    by a marker line.
+
+    Lines are split on whitespace, without regular expressions.
+
+    :param str raw_result: os raw result string.
+    :rtype: OrderedDict
+    :return: A dictionary mapping each device name to its
+     :class:`BriefInterface`, in the order listed by the node.
+    """
+    links = OrderedDict()
+    addresses = {}
+    in_addr = False
+
+    for line in raw_result.splitlines():
+        tokens = line.split()
+        if not tokens:
+            continue
+        if tokens[0] == _BRIEF_MARKER:
+            in_addr = True
+            continue
+        if len(tokens) < 2:
+            continue
+
+        dev = _ifname(tokens[0])
+        if in_addr:
+            addresses[dev] = tokens[2:]
+            continue
+
+        mac_address = None
+        flags = []
+        for token in tokens[2:]:
+            if token.startswith('<'):
+                flags = token.strip('<>').split(',') if token != '<>' else []
+            else:
+                mac_address = token
+        links[dev] = (tokens[1], mac_address, flags)
+
+    return OrderedDict(
+        (dev, BriefInterface(
+            dev, state, mac_address, flags, addresses.get(dev, [])
+        )) for dev, (state, mac_address, flags) in links.items()
+    )
+
+
+def _brief_from_full(interfaces):
+    """
+    Convert interfaces as returned by :func:`show_interfaces` to
+    :class:`BriefInterface`.
+    """
+    return OrderedDict(
+        (dev, BriefInterface(
+            dev, d['state'], d['mac_address'],
+            d['falgs_str'].split(',') if d['falgs_str'] else [],
+            [
+                '{}/{}'.format(address['address'], address['prefix'])
+                for address in d['addresses']
+            ]
+        )) for dev, d in interfaces.items()
+    )
+
+
+def list_interfaces_brief(
+        enode, state=None, labels=None, shell=None, netns=None):
+    """
+    List the name, state and addresses of the interfaces of a node.
+
+    A single shell command runs both ``ip -br link show`` and
+    ``ip -br addr show``, whose output is much shorter and cheaper to parse
+    than the one of :func:`show_interfaces`. Nodes without support of the
+    brief output, as recorded in their
+    :class:`topology_lib_ip.capabilities.Capabilities`, are listed with
+    :func:`show_interfaces` instead.
+
+    ::
+
+        down = list_interfaces_brief(hs1, state='down', labels=['1', '2'])
+
+    :param enode: Engine node to communicate with.
+    :type enode: topology.platforms.base.BaseNode
+    :param str state: Only list the interfaces in this operational state,
+     compared without case.
+    :param labels: Only list the interfaces of these port labels, as mapped
+     by ``enode.ports``.
+    :type labels: list or None
+    :param str shell: Shell name to execute commands. If ``None``, use the
+     Engine Node default shell.
+    :param str netns: Network namespace of the node to run the commands
+     in. If ``None``, use the namespace of the Engine Node.
+    :rtype: OrderedDict
+    :return: A dictionary mapping each device name to its
+     :class:`BriefInterface`, in the order listed by the node.
+    """
+    enode = _in_netns(enode, netns)
+    devs = None
+    if labels is not None:
+        devs = set(enode.ports[label] for label in labels)
+
+    record = get_capabilities(enode)
+    result = None
+
+    if record.brief is not False and netlink_socket(enode) is None:
+        response = _send(enode, _BRIEF_CMD, shell=shell)
+        if _IP_BRIEF_UNKNOWN_RE.search(response):
+            record.brief = False
+        else:
+            record.brief = True
+            result = _parse_ip_brief(response)
+
+    if result is None:
+        result = _brief_from_full(_read_interfaces(enode, shell=shell))
+
+    if state is not None:
+        state = state.upper()
+    return OrderedDict(
+        (dev, brief) for dev, brief in result.items()
+        if (devs is None or dev in devs) and
+        (state is None or brief.state.upper() == state)
+    )
+
+
+def _show_link_stats(enode, dev=None, shell=None, use_json=None):
+    """
+    Fetch the counters of the interfaces of a node with one command.
+
+    :param enode: Engine node to communicate with.
+    :type enode: topology.platforms.base.BaseNode
+    :param str dev: Restrict the output to a single device.
+    :param str shell: Shell name to execute commands. If ``None``, use the
+     Engine Node default shell.
+    :param bool use_json: Force (``True``) or disable (``False``) the use of
+     the JSON output. If ``None``, use it when the node supports it.
+    :rtype: OrderedDict
+    :return: A dictionary mapping each device name to its counters, as
+     returned by :func:`_parse_ip_stats_link_show`.
+    """
+    interfaces = _show_json(
+        enode, '-s link show', dev=dev, shell=shell, use_json=use_json
+    )
+    if interfaces is not None:
+        return _json_link_stats(interfaces)
+
+    cmd = 'ip -s link show'
+    if dev is not None:
+        cmd = '{cmd} dev {ldev}'.format(cmd=cmd, ldev=dev)
+    response = _send(enode, cmd, shell=shell)
+
+    return _parse_link_stats(response)
+
+
+def _json_link_stats(interfaces):
+    """
+    Extract the counters of the interfaces decoded from an ``ip -j`` command.
+
+    :param list interfaces: Interfaces as returned by
+     :func:`_parse_ip_json_addr_show`.
+    :rtype: OrderedDict
+    :return: A dictionary mapping each device name to its counters.
+    """
+    return OrderedDict(
+        (d['dev'], {key: d[key] for key in COUNTERS if key in d})
+        for d in interfaces
+    )
+
+
+def _parse_link_stats(raw_result):
+    """
+    Parse the 'ip -s link show' command raw output of several interfaces.
+
+    :param str raw_result: os raw result string.
+    :rtype: OrderedDict
+    :return: A dictionary mapping each device name to its counters, as
+     returned by :func:`_parse_ip_stats_link_show`.
+    """
+    result = OrderedDict()
+
+    for raw_result in _split_ip_show(raw_result):
+        re_result = _IP_SHOW_HEADER_RE.match(raw_result)
+        if re_result:
+            stats = _parse_ip_stats_link_show(raw_result)
+            if stats:
+                result[_ifname(re_result.group('dev'))] = stats
+
+    return result
+
+
+def _stats_sample(previous, timestamp, counters):
+    """
+    Build a sample of :func:`sample_stats`.
+
+    :param dict previous: The previous sample, or ``None``.
+    :param float timestamp: Time of the sample, in seconds.
+    :param OrderedDict counters: Map of device names to their counters.
+    :rtype: dict
+    """
+    sample = {
+        'timestamp': timestamp,
+        'elapsed': None,
+        'counters': counters,
+        'deltas': None,
+        'rates': None
+    }
+
+    if previous is None:
+        return sample
+
+    elapsed = timestamp - previous['timestamp']
+    sample['elapsed'] = elapsed
+    sample['deltas'] = OrderedDict()
+    sample['rates'] = OrderedDict()
+
+    for name, values in counters.items():
+        if name not in previous['counters']:
+            continue
+        deltas = {
+            key: counter_delta(previous['counters'][name][key], value)
+            for key, value in values.items()
+        }
+        sample['deltas'][name] = deltas
+        sample['rates'][name] = {
+            key: delta / elapsed if elapsed > 0 else 0.0
+            for key, delta in deltas.items()
+        }
+
+    return sample
+
+
+def sample_stats(
+        enode, devs=None, interval=1.0, count=None, buffer=None,
+        shell=None, use_json=None, netns=None):
+    """
+    Sample the counters of several interfaces periodically.
+
+    Each tick fetches the counters of all the requested interfaces with a
+    single ``ip -s link show`` command (``ip -j -s link show`` if the node
+    supports JSON output). Counters that wrap around at 32 or 64 bits are
+    handled as described in :func:`topology_lib_ip.stats.counter_delta`.
+
+    ::
+
+        for sample in sample_stats(enode, ['eth0', 'eth1'], count=10):
+            print(sample['rates']['eth0']['rx_bytes'])
+
+    :param enode: Engine node to communicate with.
+    :type enode: topology.platforms.base.BaseNode
+    :param devs: Unix network device names to sample. If ``None``, sample
+     all the interfaces of the node.
+    :type devs: list or None
+    :param float interval: Seconds between the start of two ticks.
+    :param int count: Number of samples to take. If ``None``, sample until the
+     generator is closed.
+    :param buffer: Record every sample in this buffer.
+    :type buffer: topology_lib_ip.stats.StatsBuffer
+    :param str shell: Shell name to execute commands. If ``None``, use the
+     Engine Node default shell.
+    :param bool use_json: Force (``True``) or disable (``False``) the use of
+     the JSON output. If ``None``, use it when the node supports it.
+    :param str netns: Network namespace of the node to run the commands
+     in. If ``None``, use the namespace of the Engine Node.
+    :return: A generator of dictionaries of the form:
+
+     ::
+
+        {
+            'timestamp': 1234.5,
+            'elapsed': 1.0,
+            'counters': {'eth0': {'rx_bytes': 1500, ...}},
+            'deltas': {'eth0': {'rx_bytes': 500, ...}},
+            'rates': {'eth0': {'rx_bytes': 500.0, ...}}
+        }
+
+     ``elapsed``, ``deltas`` and ``rates`` are computed against the previous
+     sample and are ``None`` in the first one. Requested devices that don't
+     exist are not included.
+    """
+    enode = _in_netns(enode, netns)
+    dev = None
+    if devs is not None:
+        devs = set(devs)
+        if len(devs) == 1:
+            dev = next(iter(devs))
+
+    previous = None
+    deadline = monotonic()
+    taken = 0
+
+    while count is None or taken < count:
+        stats = _show_link_stats(
+            enode, dev=dev, shell=shell, use_json=use_json
+        )
+        timestamp = monotonic()
+
+        counters = OrderedDict(
+            (name, values) for name, values in stats.items()
+            if devs is None or name in devs
+        )
+        sample = _stats_sample(previous, timestamp, counters)
+
+        if buffer is not None:
+            buffer.append(timestamp, counters)
+
+        taken += 1
+        previous = sample
+        yield sample
+
+        if count is None or taken < count:
+            deadline += interval
+            sleep(max(0.0, deadline - monotonic()))
+
+
+# Route types that precede the destination in 'ip route show'
+_IP_ROUTE_TYPES = frozenset((
+    'unicast', 'local', 'broadcast', 'multicast', 'throw', 'unreachable',
+    'prohibit', 'blackhole', 'nat', 'anycast'
+))
+
+
+def _route_key(route):
+    """
+    Normalize a route destination as listed by 'ip route show'.
+
+    :param str route: ``'default'`` or a network, like ``'10.0.0.0/8'``.
+    :rtype: str
+    """
+    if route == 'default':
+        return route
+    network = ip_network(route, strict=False)
+    if network.prefixlen == 0:
+        return 'default'
+    return str(network)
+
+
+_IP_ROUTE_NO_TABLE_RE = re_compile(r'table does not exist')
+
+# Attributes of 'ip route show' followed by a value, and their result keys
+_IP_ROUTE_ATTRS = {
+    'via': 'via', 'dev': 'dev', 'proto': 'proto', 'scope': 'scope',
+    'src': 'src', 'metric': 'metric', 'table': 'table', 'weight': 'weight'
+}
+
+_IP_ROUTE_JSON_ATTRS = (
+    ('gateway', 'via'), ('dev', 'dev'), ('protocol', 'proto'),
+    ('scope', 'scope'), ('prefsrc', 'src'), ('metric', 'metric'),
+    ('table', 'table')
+)
+
+_FAMILY_VERSIONS = OrderedDict((('inet', '-4'), ('inet6', '-6')))
+
+
+def _route_dst(dst, family):
+    """
+    Normalize the destination of a route to a network.
+    """
+    if dst == 'default':
+        return '0.0.0.0/0' if family == 'inet' else '::/0'
+    if '/' not in dst:
+        return '{}/{}'.format(dst, 32 if family == 'inet' else 128)
+    return dst
+
+
+def _route(family, dst, route_type='unicast'):
+    return {
+        'family': family,
+        'type': route_type,
+        'dst': _route_dst(dst, family),
+        'via': None,
+        'dev': None,
+        'proto': None,
+        'scope': None,
+        'src': None,
+        'metric': None,
+        'table': None,
+        'nexthops': []
+    }
+
+
+def _parse_ip_route_attrs(tokens, result):
+    """
+    Store the attributes of a route or nexthop in a dictionary.
+    """
+    for index in range(len(tokens) - 1):
+        key = _IP_ROUTE_ATTRS.get(tokens[index])
+        if key is not None and key in result:
+            value = tokens[index + 1]
+            # Gateways of another family are prefixed with it
+            if key == 'via' and value in _FAMILY_VERSIONS and \
+                    index + 2 < len(tokens):
+                value = tokens[index + 2]
+            if key in ('metric', 'weight'):
+                value = int(value)
+            result[key] = value
+
+
+def _parse_ip_route_show(raw_result, family='inet'):
+    """
+    Parse the 'ip route show' command raw output.
+
+    :param str raw_result: os raw result string.
+    :param str family: Address family of the routes, ``'inet'`` or
+     ``'inet6'``.
+    :rtype: list
+    :return: A list of dictionaries of the form:
+
+     ::
+
+        {
+            'family': 'inet',
+            'type': 'unicast',
+            'dst': '10.0.0.0/24',
+            'via': '192.0.2.1',
+            'dev': 'eth0',
+            'proto': 'static',
+            'scope': None,
+            'src': None,
+            'metric': 100,
+            'table': None,
+            'nexthops': [
+                {'via': '192.0.2.1', 'dev': 'eth0', 'weight': 1}
+            ]
+        }
+
+     Destinations are networks, with ``default`` translated to
+     ``0.0.0.0/0`` or ``::/0``. ``nexthops`` is only filled for multipath
+     routes, whose ``via`` and ``dev`` are ``None``.
+    """
+    routes = []
+    if _IP_ROUTE_NO_TABLE_RE.search(raw_result):
+        return routes
+
+    route = None
+    for line in raw_result.splitlines():
+        tokens = line.split()
+        if not tokens:
+            continue
+
+        # nexthops of multipath routes are indented
+        if line[0].isspace():
+            if route is not None and tokens[0] == 'nexthop':
+                nexthop = {'via': None, 'dev': None, 'weight': None}
+                _parse_ip_route_attrs(tokens, nexthop)
+                route['nexthops'].append(nexthop)
+            continue
+
+        route_type = 'unicast'
+        if tokens[0] in _IP_ROUTE_TYPES:
+            route_type = tokens.pop(0)
+        if not tokens:
+            continue
+
+        route = _route(family, tokens[0], route_type)
+        _parse_ip_route_attrs(tokens, route)
+        routes.append(route)
+
+    return routes
+
+
+def _parse_ip_json_route_show(raw_result, family='inet'):
+    """
+    Parse the 'ip -j route show' command raw output.
+
+    :param str raw_result: os raw result string.
+    :param str family: Address family of the routes, ``'inet'`` or
+     ``'inet6'``.
+    :rtype: list
+    :return: A list of dictionaries as returned by
+     :func:`_parse_ip_route_show`.
+    :raises ValueError: If the output is not JSON.
+    """
+    routes = []
+    if _IP_ROUTE_NO_TABLE_RE.search(raw_result):
+        return routes
+
+    for info in loads(raw_result):
+        route = _route(family, info['dst'], info.get('type', 'unicast'))
+        for json_key, key in _IP_ROUTE_JSON_ATTRS:
+            route[key] = info.get(json_key)
+        # Gateways of another family
+        if route['via'] is None and 'via' in info:
+            route['via'] = info['via'].get('host')
+
+        for hop in info.get('nexthops', ()):
+            route['nexthops'].append({
+                'via': hop.get('gateway'),
+                'dev': hop.get('dev'),
+                'weight': hop.get('weight')
+            })
+        routes.append(route)
+
+    return routes
+
+
+def show_routes(
+        enode, family=None, table=None, shell=None, use_json=None,
+        netns=None):
+    """
+    Show the routes of a node.
+
+    Routes are read with one ``ip -j route show`` command per address family
+    if the node supports JSON output, or one ``ip route show`` command
+    otherwise, and indexed for longest prefix match lookups:
+
+    ::
+
+        routes = show_routes(enode, family='inet')
+        assert routes.lookup('10.1.2.3')['via'] == '192.168.20.1'
+
+    :param enode: Engine node to communicate with.
+    :type enode: topology.platforms.base.BaseNode
+    :param str family: Address family to show, ``'inet'`` or ``'inet6'``. If
+     ``None``, show both.
+    :param str table: Routing table to show, like ``'main'``, ``'local'``,
+     ``'all'`` or a table number. If ``None``, show the main table.
+    :param str shell: Shell name to execute commands. If ``None``, use the
+     Engine Node default shell.
+    :param bool use_json: Force (``True``) or disable (``False``) the use of
+     the JSON output. If ``None``, use it when the node supports it.
+    :param str netns: Network namespace of the node to run the commands
+     in. If ``None``, use the namespace of the Engine Node.
+    :rtype: topology_lib_ip.routes.RouteTable
+    :return: The routes, as returned by :func:`_parse_ip_route_show`. A
+     table that doesn't exist has no routes.
+    """
+    enode = _in_netns(enode, netns)
+    if family is None:
+        families = list(_FAMILY_VERSIONS)
+    elif family in _FAMILY_VERSIONS:
+        families = [family]
+    else:
+        raise ValueError('Unknown address family {}'.format(family))
+
+    auto = use_json is None
+    if auto:
+        use_json = get_capabilities(enode).json is not False
+
+    result = RouteTable()
+
+    for family in families:
+        options = '{version} route show'.format(
+            version=_FAMILY_VERSIONS[family]
+        )
+        if table is not None:
+            options = '{options} table {table}'.format(
+                options=options, table=table
+            )
+
+        routes = None
+        if use_json:
+            response = _send(enode, _json_cmd(options), shell=shell)
+            try:
+                routes = _parse_ip_json_route_show(response, family)
+            except ValueError:
+                if not auto:
+                    raise
+                get_capabilities(enode).json = use_json = False
+
+        if routes is None:
+            response = _send(
+                enode, 'ip {options}'.format(options=options), shell=shell
+            )
+            routes = _parse_ip_route_show(response, family)
+
+        for route in routes:
+            result.add(route)
+
+    return result
+
+
+# Flags of the neighbors printed by 'ip neigh show', and keywords followed
+# by a value
+_IP_NEIGH_FLAGS = frozenset(('router', 'proxy', 'extern_learn', 'offload'))
+_IP_NEIGH_ATTRS = frozenset(('dev', 'lladdr', 'proto', 'vrf'))
+
+
+def _neighbor(dst, dev):
+    """
+    Build an empty neighbor dictionary.
+    """
+    return {
+        'family': 'inet6' if ':' in dst else 'inet',
+        'dst': dst,
+        'dev': dev,
+        'lladdr': None,
+        'router': False,
+        'state': []
+    }
+
+
+def _parse_ip_neigh_show(raw_result, dev=None):
+    """
+    Parse the 'ip neigh show' command raw output.
+
+    :param str raw_result: os raw result string.
+    :param str dev: Device the output was restricted to, as the ``ip``
+     command omits it then.
+    :rtype: OrderedDict
+    :return: A dictionary mapping ``(dev, dst)`` tuples to dictionaries of
+     the form:
+
+     ::
+
+        {
+            'family': 'inet',
+            'dst': '192.0.2.1',
+            'dev': 'eth0',
+            'lladdr': '02:00:00:00:00:01',
+            'router': False,
+            'state': ['REACHABLE']
+        }
+
+     ``lladdr`` is ``None`` for unresolved neighbors.
+    """
+    result = OrderedDict()
+    if _IP_SHOW_DOES_NOT_EXIST_RE.search(raw_result):
+        return result
+
+    for line in raw_result.splitlines():
+        tokens = line.split()
+        if not tokens:
+            continue
+
+        neighbor = _neighbor(tokens[0], dev)
+        index = 1
+        while index < len(tokens):
+            token = tokens[index]
+            if token in _IP_NEIGH_ATTRS and index + 1 < len(tokens):
+                if token in neighbor:
+                    neighbor[token] = tokens[index + 1]
+                index += 2
+                continue
+            if token == 'router':
+                neighbor['router'] = True
+            elif token.isupper():
+                neighbor['state'].append(token)
+            index += 1
+
+        result[(neighbor['dev'], neighbor['dst'])] = neighbor
+
+    return result
+
+
+def _parse_ip_json_neigh_show(raw_result, dev=None):
+    """
+    Parse the 'ip -j neigh show' command raw output.
+
+    :param str raw_result: os raw result string.
+    :param str dev: Device the output was restricted to.
+    :rtype: OrderedDict
+    :return: The neighbors as returned by :func:`_parse_ip_neigh_show`.
+    :raises ValueError: If the output is not JSON.
+    """
+    result = OrderedDict()
+    if _IP_SHOW_DOES_NOT_EXIST_RE.search(raw_result):
+        return result
+
+    for info in loads(raw_result or '[]'):
+        neighbor = _neighbor(info['dst'], info.get('dev', dev))
+        neighbor['lladdr'] = info.get('lladdr')
+        neighbor['router'] = 'router' in info
+        neighbor['state'] = list(info.get('state', []))
+        result[(neighbor['dev'], neighbor['dst'])] = neighbor
+
+    return result
+
+
+def show_neighbors(enode, dev=None, shell=None, use_json=None, netns=None):
+    """
+    Show the neighbor (ARP and NDP) table of a node.
+
+    The table is read with a single ``ip -j neigh show`` command if the node
+    supports JSON output, or ``ip neigh show`` otherwise, and indexed by
+    device and address:
+
+    ::
+
+        neighbors = show_neighbors(enode)
+        assert neighbors[('eth0', '192.0.2.1')]['state'] == ['REACHABLE']
+
+    :param enode: Engine node to communicate with.
+    :type enode: topology.platforms.base.BaseNode
+    :param str dev: Only show the neighbors of this device.
+    :param str shell: Shell name to execute commands. If ``None``, use the
+     Engine Node default shell.
+    :param bool use_json: Force (``True``) or disable (``False``) the use of
+     the JSON output. If ``None``, use it when the node supports it.
+    :param str netns: Network namespace of the node to run the commands
+     in. If ``None``, use the namespace of the Engine Node.
+    :rtype: OrderedDict
+    :return: A dictionary mapping ``(dev, dst)`` tuples to the neighbors, as
+     returned by :func:`_parse_ip_neigh_show`.
+    """
+    enode = _in_netns(enode, netns)
+    options = 'neigh show'
+    if dev is not None:
+        options = '{options} dev {dev}'.format(options=options, dev=dev)
+
+    auto = use_json is None
+    if auto:
+        use_json = get_capabilities(enode).json is not False
+
+    if use_json:
+        response = _send(enode, _json_cmd(options), shell=shell)
+        try:
+            return _parse_ip_json_neigh_show(response, dev=dev)
+        except ValueError:
+            if not auto:
+                raise
+            get_capabilities(enode).json = False
+
+    response = _send(
+        enode, 'ip {options}'.format(options=options), shell=shell
+    )
+    return _parse_ip_neigh_show(response, dev=dev)
+
+
+class AddNeighborsResult(namedtuple(
+        'AddNeighborsResult', ['neighbors', 'chunks', 'elapsed', 'rate'])):
+    """
+    Throughput achieved by :func:`add_neighbors`.
+
+    :var int neighbors: Number of neighbors sent to the node.
+    :var int chunks: Number of ``ip -batch`` commands used.
+    :var float elapsed: Seconds spent, including the generation of the
+     neighbors.
+    :var float rate: Neighbors per second.
+    """
+    __slots__ = ()
+
+
+def _neigh_cmd(neighbor, replace=False):
+    """
+    Build the ``ip`` command that programs a neighbor of
+    :func:`add_neighbors`.
+
+    :param neighbor: A tuple ``(dst, lladdr, dev)`` or a dictionary.
+    :param bool replace: Use ``neigh replace`` instead of ``neigh add``.
+    :rtype: str
+    :return: The ``ip`` command, without the leading ``ip``.
+    """
+    if not isinstance(neighbor, dict):
+        dst, lladdr, dev = neighbor
+        neighbor = {'dst': dst, 'lladdr': lladdr, 'dev': dev}
+
+    cmd = [
+        'neigh', 'replace' if replace else 'add', neighbor['dst'],
+        'lladdr', neighbor['lladdr'], 'dev', neighbor['dev'],
+        'nud', neighbor.get('state') or 'permanent'
+    ]
+    if neighbor.get('router'):
+        cmd.append('router')
+
+    return ' '.join(cmd)
+
+
+def add_neighbors(
+        enode, neighbors, replace=False, chunk_size=1000, shell=None,
+        force=True, netns=None):
+    """
+    Add many static neighbors, streamed through ``ip -batch``.
+
+    Like :func:`add_routes`, the neighbors are consumed lazily and sent in
+    ``ip -batch`` commands of at most ``chunk_size`` neighbors:
+
+    ::
+
+        add_neighbors(enode, (
+            ('10.0.{}.{}'.format(i // 256, i % 256),
+             '02:00:00:00:{:02x}:{:02x}'.format(i // 256, i % 256), 'eth0')
+            for i in range(10000)
+        ), replace=True)
+
+    :param enode: Engine node to communicate with.
+    :type enode: topology.platforms.base.BaseNode
+    :param neighbors: An iterable of neighbors. Each neighbor is either a
+     tuple ``(dst, lladdr, dev)`` or a dictionary with the keys:
+
+     - ``dst``: IPv4 or IPv6 address.
+     - ``lladdr``: Link layer address.
+     - ``dev``: Device.
+     - ``state``: Optional neighbor state, ``'permanent'`` by default.
+     - ``router``: Optional, mark an IPv6 neighbor as a router.
+    :param bool replace: Replace existing neighbors, like the ones learned
+     by the node, instead of failing.
+    :param int chunk_size: Maximum number of neighbors per ``ip -batch``
+     command.
+    :param str shell: Shell name to execute commands. If ``None``, use the
+     Engine Node default shell.
+    :param bool force: Keep adding neighbors after a failure. If ``False``,
+     no more chunks are sent after the first one with a failure.
+    :param str netns: Network namespace of the node to run the commands
+     in. If ``None``, use the namespace of the Engine Node.
+    :rtype: AddNeighborsResult
+    :raises BatchError: If any neighbor failed, once all the chunks are
+     sent.
+    """
+    enode = _in_netns(enode, netns)
+    start = monotonic()
+    count, chunks = _stream_batches(
+        enode, 'add_neighbors', neighbors,
+        lambda neighbor: _neigh_cmd(neighbor, replace=replace), chunk_size,
+        shell=shell, force=force
+    )
+
+    elapsed = monotonic() - start
+    return AddNeighborsResult(
+        neighbors=count, chunks=chunks, elapsed=elapsed,
+        rate=count / elapsed if elapsed > 0 else 0.0
+    )
+
+
+_STATE_MARKER = 'IP_STATE_ROUTES'
+
+
+def _state_cmd(families, use_json):
+    """
+    Build the command line read by :func:`_read_state`.
+    """
+    json = '-j ' if use_json else ''
+    return '; echo {marker}; '.format(marker=_STATE_MARKER).join(
+        ['ip {json}addr show'.format(json=json)] + [
+            'ip {json}{version} route show'.format(
+                json=json, version=_FAMILY_VERSIONS[family]
+            ) for family in families
+        ]
+    )
+
+
+def _read_state(enode, families, shell=None):
+    """
+    Read the interfaces and routes of a node with a single command line.
+
+    The JSON output is used when the node supports it, detected as in
+    :func:`show_interfaces`.
+
+    :param enode: Engine node to communicate with.
+    :type enode: topology.platforms.base.BaseNode
+    :param list families: Address families of the routes to read.
+    :param str shell: Shell name to execute commands. If ``None``, use the
+     Engine Node default shell.
+    :rtype: tuple
+    :return: A dictionary mapping device names to interfaces, as returned by
+     :func:`show_interfaces`, and a dictionary mapping ``(version, route)``
+     tuples, like ``('-4', 'default')``, to the via of the route.
+    """
+    use_json = get_capabilities(enode).json is not False
+    sections = None
+
+    if use_json:
+        sections = _split_markers(
+            _send(enode, _state_cmd(families, True), shell=shell),
+            _STATE_MARKER
+        )
+        interfaces = _decode_json(enode, sections[0], True)
+        if interfaces is None:
+            sections = None
+        else:
+            routes = [
+                _parse_ip_json_route_show(raw_result, family)
+                for family, raw_result in zip(families, sections[1:])
+            ]
+
+    if sections is None:
+        sections = _split_markers(
+            _send(enode, _state_cmd(families, False), shell=shell),
+            _STATE_MARKER
+        )
+        interfaces = [
+            _parse_ip_addr_show(raw_result)
+            for raw_result in _split_ip_show(sections[0])
+        ]
+        routes = [
+            _parse_ip_route_show(raw_result, family)
+            for family, raw_result in zip(families, sections[1:])
+        ]
+
+    current = OrderedDict(
+        (_ifname(d['dev']), d) for d in interfaces if d
+    )
+    present = {}
+    for family, family_routes in zip(families, routes):
+        for route in family_routes:
+            present[(_FAMILY_VERSIONS[family], _route_key(route['dst']))] = \
+                route['via']
+
+    return current, present
+
+
+def apply_state(enode, spec, shell=None, force=True, netns=None):
+    """
+    Reconcile the configuration of a node with a desired state.
+
+    The interfaces of the node, and its routes of the address families of
+    the routes in the spec, are read at once with a single command line, as
+    described in :func:`_read_state`. Only the commands needed to reach the
+    desired state are then sent, all in a single ``ip -batch`` call, so
+    applying a spec that already matches the node sends no configuration
+    command at all.
+
+    ::
+
+        apply_state(enode, {
+            'interfaces': {
+                '1': {'addresses': ['10.0.0.1/24'], 'up': True}
+            },
+            'vlans': {
+                'eth1.10': {
+                    'port': '1', 'vlan_id': '10',
+                    'addresses': ['10.1.0.1/24'], 'up': True
+                }
+            },
+            'routes': {
+                'default': '10.0.0.254'
+            }
+        })
+
+    :param enode: Engine node to communicate with.
+    :type enode: topology.platforms.base.BaseNode
+    :param dict spec: Desired state, with the optional keys:
+
+     - ``interfaces``: map of port labels to interface states.
+     - ``vlans``: map of vlan device names to interface states that also hold
+       the ``port`` label of the parent interface and the ``vlan_id``. Missing
+       vlan devices are created as with :func:`add_link_type_vlan`; existing
+       ones are registered in the port mapping if needed, but not modified.
+     - ``routes``: map of routes to their via, as given to
+       :func:`add_route`. Missing routes are added and routes to the same
+       destination with another via are replaced.
+
+     An interface state is a dictionary with the optional keys
+     ``addresses``, the list of all the addresses of the interface, and
+     ``up``, its administrative state. Addresses of the interface that are
+     not in the list are removed, except link scope addresses. Keys left out
+     of the spec, and interfaces and routes not in it, are left as-is.
+    :param str shell: Shell name to execute commands. If ``None``, use the
+     Engine Node default shell.
+    :param bool force: Use ``ip -force -batch`` so a failed command does not
+     stop the remaining ones.
+    :param str netns: Network namespace of the node to run the commands
+     in. If ``None``, use the namespace of the Engine Node.
+    :rtype: list
+    :return: The ``ip`` commands sent to the node, without the leading
+     ``ip``.
+    :raises BatchError: If any of the commands failed.
+    """
+    enode = _in_netns(enode, netns)
+
+    routes = []
+    families = []
+    for route, via in spec.get('routes', {}).items():
+        version, _ = _add_route_cmd(route, via)
+        routes.append((version, route, str(ip_address(via))))
+        for family, family_version in _FAMILY_VERSIONS.items():
+            if family_version == version and family not in families:
+                families.append(family)
+
+    current, via_routes = _read_state(enode, families, shell=shell)
+
+    batch = IpBatch(enode, shell=shell, force=force)
+    states = []
+
+    for name, state in spec.get('vlans', {}).items():
+        if name not in current:
+            batch.add_link_type_vlan(state['port'], name, state['vlan_id'])
+        elif name not in enode.ports:
+            enode.ports[name] = name
+        states.append((name, name, state))
+
+    for portlbl, state in spec.get('interfaces', {}).items():
+        states.append((portlbl, enode.ports[portlbl], state))
+
+    removals = []
+    additions = []
+    links = []
+
+    for portlbl, port, state in states:
+        d = current.get(port)
+        if d is None and not batch.has_port(port):
+            raise ValueError('Device {port} does not exist'.format(port=port))
+
+        if state.get('addresses') is not None:
+            present = OrderedDict(
+                (ip_interface('{address}/{prefix}'.format(**addr)), addr)
+                for addr in (d['addresses'] if d else [])
+            )
+            wanted = OrderedDict(
+                (ip_interface(addr), addr) for addr in state['addresses']
+            )
+            removals.extend(
+                (portlbl, str(addr)) for addr, info in present.items()
+                if addr not in wanted and info['scope'] != 'link'
+            )
+            additions.extend(
+                (portlbl, addr) for key, addr in wanted.items()
+                if key not in present
+            )
+
+        up = d is not None and 'UP' in d['falgs_str'].split(',')
+        if state.get('up') is not None and bool(state['up']) != up:
+            links.append((portlbl, bool(state['up'])))
+
+    for portlbl, addr in removals:
+        batch.remove_ip(portlbl, addr)
+    for portlbl, addr in additions:
+        batch.interface(portlbl, addr=addr)
+    for portlbl, up in links:
+        batch.interface(portlbl, up=up)
+
+    for version, route, via in routes:
+        key = (version, _route_key(route))
+        if key not in via_routes:
+            batch.add_route(route, via)
+        elif via_routes[key] != via:
+            batch.add_route(route, via, replace=True)
+
+    cmds = batch.commands
+    if cmds:
+        batch.commit()
+    return cmds
+
+
+class MonitorEvent(namedtuple('MonitorEvent', [
+        'kind', 'deleted', 'dev', 'data'])):
+    """
+    Change reported by :func:`monitor`.
+
+    :var str kind: ``'link'``, ``'address'`` or ``'route'``.
+    :var bool deleted: ``True`` if the object was removed.
+    :var str dev: Device the change applies to, or ``None``.
+    :var dict data: The changed object, as returned by
+     :func:`_parse_ip_addr_show` for links, :func:`_parse_ip_addr_show_inet`
+     for addresses and :func:`_parse_ip_route_show` for routes.
+    """
+    __slots__ = ()
+
+
+class WaitTimeout(AssertionError):
+    """
+    Raised by :func:`wait_for` when the interface doesn't reach the expected
+    state in time.
+
+    :var dict interface: Last state read of the interface, or ``None`` if it
+     doesn't exist.
+    """
+
+    def __init__(self, message, interface):
+        super(WaitTimeout, self).__init__(message)
+        self.interface = interface
+
+
+# Objects reported by 'ip -o monitor label', keyed by label
+_IP_MONITOR_LABELS = {
+    '[LINK]': 'link',
+    '[ADDR]': 'address',
+    '[ROUTE]': 'route'
+}
+
+_MONITOR_EVENTS = ('link', 'address', 'route')
+
+_IP_MONITOR_DELETED = 'Deleted '
+
+
+def _ip_monitor_route_family(rest):
+    """
+    Find the address family of a route reported by 'ip monitor'.
+
+    The family isn't printed, so it is taken from the destination, or from
+    the gateway and the ``pref`` attribute, only printed for IPv6 routes,
+    for default routes. Gateways of the other family are prefixed with it.
+
+    :param str rest: The route, without the label.
+    :rtype: str
+    :return: ``'inet'`` or ``'inet6'``.
+    """
+    tokens = rest.split()
+    if tokens and tokens[0] in _IP_ROUTE_TYPES:
+        tokens.pop(0)
+    if not tokens:
+        return 'inet'
+
+    if tokens[0] != 'default':
+        return 'inet6' if ':' in tokens[0] else 'inet'
+
+    if 'via' in tokens[:-1]:
+        gateway = tokens[tokens.index('via') + 1]
+        if gateway == 'inet6':
+            return 'inet'
+        if gateway == 'inet':
+            return 'inet6'
+        return 'inet6' if ':' in gateway else 'inet'
+    return 'inet6' if 'pref' in tokens else 'inet'
+
+
+def _parse_ip_monitor(line):
+    """
+    Parse a line of the 'ip -o monitor label' command output.
+
+    With ``-o`` every change is printed in a single line, with the line
+    breaks of the regular output replaced by backslashes.
+
+    :param str line: A line of output.
+    :rtype: MonitorEvent
+    :return: The parsed event, or ``None`` if the line isn't understood.
+    """
+    label, _, rest = line.partition(']')
+    kind = _IP_MONITOR_LABELS.get(label + ']')
+    if kind is None:
+        return None
+
+    deleted = rest.startswith(_IP_MONITOR_DELETED)
+    if deleted:
+        rest = rest[len(_IP_MONITOR_DELETED):]
+
+    if kind == 'link':
+        data = _parse_ip_addr_show(rest.replace('\\', '\n'))
+        if data is None:
+            return None
+        return MonitorEvent(kind, deleted, _ifname(data['dev']), data)
+
+    if kind == 'address':
+        tokens = rest.split('\\', 1)[0].split(None, 2)
+        if len(tokens) < 3:
+            return None
+        re_result = _IP_ADDR_SHOW_INET_RE.match(tokens[2])
+        if not re_result:
+            return None
+        return MonitorEvent(
+            kind, deleted, _ifname(tokens[1]),
+            _parse_ip_addr_show_inet(re_result)
+        )
+
+    routes = _parse_ip_route_show(rest, _ip_monitor_route_family(rest))
+    if not routes:
+        return None
+    return MonitorEvent(kind, deleted, routes[0]['dev'], routes[0])
+
+
+def _monitor_process(netns_path, objects, window):
+    """
+    Stream the output of a local 'ip monitor' process in a namespace.
+
+    :return: A generator of lines, with a ``None`` item once the process is
+     started and every ``window`` seconds without output.
+    """
+    process = Popen(
+        ['ip', '-o', 'monitor', 'label'] + list(objects),
+        stdout=PIPE, preexec_fn=partial(enter_netns, netns_path)
+    )
+    try:
+        yield None
+
+        pending = b''
+        fd = process.stdout.fileno()
+        while True:
+            if not select([fd], [], [], window)[0]:
+                yield None
+                continue
+
+            data = os_read(fd, 65536)
+            if not data:
+                raise AssertionError('ip monitor exited')
+
+            lines = (pending + data).split(b'\n')
+            pending = lines.pop()
+            for line in lines:
+                yield line.decode('utf-8', 'replace')
+    finally:
+        process.terminate()
+        process.wait()
+
+
+_MONITOR_MARKER = 'IP_MONITOR'
+
+_MONITOR_START_CMD = (
+    '(path=$(mktemp) && {{ ip -o monitor label {objects} '
+    '</dev/null >"$path" 2>&1 & echo "{marker} $path $!"; }})'
+)
+
+_MONITOR_STARTED_RE = re_compile(
+    r'^{} (?P<path>\S+) (?P<pid>\d+)\s*$'.format(_MONITOR_MARKER)
+)
+
+_MONITOR_EXITED = '{}_EXITED'.format(_MONITOR_MARKER)
+
+
+def _monitor_background(enode, objects, window, shell=None):
+    """
+    Stream the output of an 'ip monitor' process left running on the node.
+
+    The process writes to a temporary file of the node, and the lines added
+    to the file are read every ``window`` seconds, so no change is lost
+    between two reads. The process and the file are removed when the
+    generator is closed.
+
+    :return: A generator of lines, with a ``None`` item once the process is
+     started and after each read, or ``None`` if the process couldn't be
+     started.
+    """
+    response = _send(enode, _MONITOR_START_CMD.format(
+        objects=' '.join(objects), marker=_MONITOR_MARKER
+    ), shell=shell)
+    for line in response.splitlines():
+        re_result = _MONITOR_STARTED_RE.match(line.strip())
+        if re_result:
+            break
+    else:
+        return None
+
+    path = quote(re_result.group('path'))
+    pid = re_result.group('pid')
+    return _monitor_background_lines(enode, path, pid, window, shell=shell)
+
+
+def _monitor_background_lines(enode, path, pid, window, shell=None):
+    """
+    Read the lines of the file of :func:`_monitor_background`.
+    """
+    try:
+        yield None
+
+        offset = 1
+        while True:
+            response = _send(
+                enode,
+                'sleep {window:g}; tail -n +{offset} {path}; '
+                'kill -0 {pid} 2>/dev/null || echo {exited}'.format(
+                    window=window, offset=offset, path=path, pid=pid,
+                    exited=_MONITOR_EXITED
+                ), shell=shell
+            )
+
+            # 'ip monitor' writes each change at once, so only whole lines
+            # are read
+            lines = response.splitlines()
+            if lines and lines[-1].strip() == _MONITOR_EXITED:
+                raise AssertionError('ip monitor exited')
+
+            offset += len(lines)
+            for line in lines:
+                yield line
+            yield None
+    finally:
+        _send(
+            enode, 'kill {pid} 2>/dev/null; rm -f {path}'.format(
+                pid=pid, path=path
+            ), shell=shell
+        )
+
+
+def _monitor_windows(enode, objects, window, shell=None):
+    """
+    Poll the output of 'ip monitor' through the node in fixed windows.
+
+    :return: A generator of lines, with a ``None`` item before the first
+     window and after each window.
+    """
+    cmd = 'timeout {:g} ip -o monitor label {}'.format(
+        window, ' '.join(objects)
+    )
+    yield None
+    while True:
+        for line in _send(enode, cmd, shell=shell).splitlines():
+            yield line
+        yield None
+
+
+def _monitor_stream(enode, events, window, shell=None):
+    """
+    Stream the events of a node.
+
+    Nodes that expose their network namespace, as described in
+    :mod:`topology_lib_ip.netlink`, are monitored with a local process
+    entering the namespace. Other nodes are monitored with a process left
+    running on the node, as described in :func:`_monitor_background`, or
+    polled in windows of ``window`` seconds if it can't be started.
+
+    Link and address events invalidate the cached state of their device.
+
+    :return: A generator of :class:`MonitorEvent`, with a ``None`` item once
+     the node is being monitored and at least every ``window`` seconds.
+    """
+    netns_path = getattr(enode, 'netns_path', None)
+    if netns_path is not None and netlink_socket(enode) is not None:
+        lines = _monitor_process(netns_path, events, window)
+    else:
+        lines = _monitor_background(enode, events, window, shell=shell)
+        if lines is None:
+            lines = _monitor_windows(enode, events, window, shell=shell)
+
+    try:
+        for line in lines:
+            if line is None:
+                yield None
+                continue
+
+            event = _parse_ip_monitor(line)
+            if event is None or event.kind not in events:
+                continue
+            if event.kind != 'route' and event.dev is not None:
+                invalidate(enode, event.dev)
+            yield event
+    finally:
+        lines.close()
+
+
+def monitor(
+        enode, events=_MONITOR_EVENTS, timeout=None, window=1.0,
+        shell=None, netns=None):
+    """
+    Stream the link, address and route changes of a node.
+
+    Changes are read from ``ip -o monitor`` as they happen:
+
+    ::
+
+        for event in monitor(enode, events=('link',), timeout=30):
+            print(event.dev, event.data['state'])
+
+    An ``ip monitor`` process runs for the lifetime of the generator. When
+    the node exposes its network namespace, as described in
+    :mod:`topology_lib_ip.netlink`, the process runs locally in it.
+    Otherwise the node only returns the output of a command once it
+    finishes, so the process is left running in the background of the node,
+    writing to a temporary file read every ``window`` seconds.
+
+    Nodes whose shell can't run background processes are polled with
+    ``timeout <window> ip -o monitor`` commands instead. Changes that happen
+    between two of those windows are not reported.
+
+    :param enode: Engine node to communicate with.
+    :type enode: topology.platforms.base.BaseNode
+    :param events: Kinds of changes to report, among ``'link'``,
+     ``'address'`` and ``'route'``.
+    :param float timeout: Seconds after which the generator stops. If
+     ``None``, monitor until the generator is closed. The timeout is checked
+     at least every ``window`` seconds.
+    :param float window: Seconds of each poll of the node.
+    :param str shell: Shell name to execute commands. If ``None``, use the
+     Engine Node default shell.
+    :param str netns: Network namespace of the node to run the commands
+     in. If ``None``, use the namespace of the Engine Node.
+    :return: A generator of :class:`MonitorEvent`.
+    """
+    enode = _in_netns(enode, netns)
+    events = tuple(events)
+    unknown = set(events) - set(_MONITOR_EVENTS)
+    if not events or unknown:
+        raise ValueError('Unknown events {}'.format(sorted(unknown)))
+    assert window > 0
+
+    deadline = None if timeout is None else monotonic() + timeout
+    stream = _monitor_stream(enode, events, window, shell=shell)
+    try:
+        for event in stream:
+            if event is not None:
+                yield event
+            if deadline is not None and monotonic() >= deadline:
+                return
+    finally:
+        stream.close()
+
+
+def _wait_for_ready(d, state, addr):
+    """
+    Check if an interface reached the state expected by :func:`wait_for`.
+    """
+    if d is None:
+        return False
+    if state is not None and (d['state'] or '').lower() != state.lower():
+        return False
+    if addr is None:
+        return True
+
+    target = ip_interface(addr)
+    for address in d.get('addresses', []):
+        if ip_address(address['address']) != target.ip:
+            continue
+        if '/' in addr and address['prefix'] != target.network.prefixlen:
+            continue
+        return 'tentative' not in address['flags']
+    return False
+
+
+def wait_for(
+        enode, dev, state='up', addr=None, timeout=10.0, window=1.0,
+        shell=None, netns=None):
+    """
+    Wait until an interface reaches a state.
+
+    The node is monitored as described in :func:`monitor` and the interface
+    is read again on each of its link and address changes, and at least
+    every ``window`` seconds, instead of polling it in a loop. Reading the
+    interface after each window also catches changes lost between the
+    windows of nodes polled with ``timeout <window> ip -o monitor``.
+
+    ::
+
+        interface(enode, '1', up=True)
+        wait_for(enode, enode.ports['1'], addr='fe80::1/64')
+
+    :param enode: Engine node to communicate with.
+    :type enode: topology.platforms.base.BaseNode
+    :param str dev: Unix network device name.
+    :param str state: Expected operational state, like ``'up'`` or
+     ``'down'``, compared without case. If ``None``, don't check the state.
+    :param str addr: Wait as well for this address to be configured and out
+     of duplicate address detection. With a prefix, it must match too.
+    :param float timeout: Seconds to wait.
+    :param float window: Seconds between reads of the interface without
+     changes.
+    :param str shell: Shell name to execute commands. If ``None``, use the
+     Engine Node default shell.
+    :param str netns: Network namespace of the node to run the commands
+     in. If ``None``, use the namespace of the Engine Node.
+    :rtype: dict
+    :return: The interface, as returned by :func:`show_interface`.
+    :raises WaitTimeout: If the interface doesn't reach the state in time.
+    """
+    enode = _in_netns(enode, netns)
+    assert dev
+
+    deadline = monotonic() + timeout
+    events = ('link', 'address') if addr is not None else ('link',)
+    stream = _monitor_stream(
+        enode, events, min(window, timeout) or window, shell=shell
+    )
+    d = None
+    try:
+        # The first item arrives once the node is monitored, so the
+        # interface is read after that and no change can be missed
+        for event in stream:
+            if event is None or event.dev == dev:
+                d = _read_interface(enode, dev, shell=shell)
+                if _wait_for_ready(d, state, addr):
+                    return d
+            if monotonic() >= deadline:
+                break
+    finally:
+        stream.close()
+
+    raise WaitTimeout(
+        'Interface {} did not reach state {} with address {} in {}s'.format(
+            dev, state, addr, timeout
+        ), d
+    )
 
 
 __all__ = [
@@ -383,5 +3841,23 @@ __all__ = [
     'add_link_type_vlan',
     'remove_link_type_vlan',
     'sub_interface',
-    'show_interface'
+    'show_interface',
+    'show_interfaces',
+    'ip_batch',
+    'sample_stats',
+    'apply_state',
+    'show_routes',
+    'add_routes',
+    'add_link_type_vlans',
+    'remove_link_type_vlans',
+    'monitor',
+    'wait_for',
+    'capabilities',
+    'list_interfaces_brief',
+    'show_neighbors',
+    'add_neighbors',
+    'enable_pipelining',
+    'flush_pipeline',
+    'disable_pipelining',
+    'show_interfaces_all_netns'
 ]
@@ -0,0 +1,628 @@
+# -*- coding: utf-8 -*-
+#
+# Copyright (C) 2015-2016 Hewlett Packard Enterprise Development LP
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#   http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing,
+# software distributed under the License is distributed on an
+# "AS IS" BASIS, WITHOUT WARRANTIES OR CONDITIONS OF ANY
+# KIND, either express or implied.  See the License for the
+# specific language governing permissions and limitations
+# under the License.
+
+"""
+topology_lib_ip rtnetlink backend for local nodes.
+
+Nodes that run in a network namespace of the local host can expose it with a
+``netns_path`` attribute, the path of the namespace file, like
+``/proc/<pid>/ns/net`` or ``/run/netns/<name>``. For those nodes
+:func:`topology_lib_ip.library.interface`,
+:func:`topology_lib_ip.library.remove_ip`,
+:func:`topology_lib_ip.library.show_interface` and
+:func:`topology_lib_ip.library.show_interfaces` talk rtnetlink directly
+over an ``AF_NETLINK`` socket opened inside the namespace, instead of
+starting an ``ip`` process and parsing its output. The results are the same
+as the ones of the JSON output of the ``ip`` command.
+
+Entering a namespace requires the ``CAP_SYS_ADMIN`` capability. If the socket
+cannot be opened, the node is driven with the ``ip`` command as usual.
+"""
+
+from __future__ import unicode_literals, absolute_import
+from __future__ import print_function, division
+
+import socket
+from collections import OrderedDict
+from ctypes import CDLL, get_errno
+from errno import ENODEV
+from ipaddress import ip_address, ip_interface
+from os import O_RDONLY, close, open as os_open, strerror
+from struct import Struct
+from threading import Lock
+
+from .results import InterfaceInfo, LinkStats
+
+
+# Netlink and rtnetlink constants, from linux/netlink.h and
+# linux/rtnetlink.h
+_NETLINK_ROUTE = 0
+_NLMSG_ERROR = 2
+_NLMSG_DONE = 3
+_RTM_NEWLINK = 16
+_RTM_GETLINK = 18
+_RTM_NEWADDR = 20
+_RTM_DELADDR = 21
+_RTM_GETADDR = 22
+
+_NLM_F_REQUEST = 0x1
+_NLM_F_ACK = 0x4
+_NLM_F_DUMP = 0x300
+_NLM_F_EXCL = 0x200
+_NLM_F_CREATE = 0x400
+
+_IFLA_ADDRESS = 1
+_IFLA_IFNAME = 3
+_IFLA_MTU = 4
+_IFLA_LINK = 5
+_IFLA_OPERSTATE = 16
+_IFLA_STATS64 = 23
+_IFLA_LINK_NETNSID = 37
+
+_IFA_ADDRESS = 1
+_IFA_LOCAL = 2
+_IFA_FLAGS = 8
+
+_CLONE_NEWNET = 0x40000000
+
+_IFF_UP = 0x1
+_IFF_RUNNING = 0x40
+
+_NLMSGHDR = Struct(str('=IHHII'))
+_NLMSGERR = Struct(str('=i'))
+_IFINFOMSG = Struct(str('=BxHiII'))
+_IFADDRMSG = Struct(str('=BBBBI'))
+_RTATTR = Struct(str('=HH'))
+_U32 = Struct(str('=I'))
+_STATS64 = Struct(str('=24Q'))
+
+# Interface flags in the order printed by the ip command
+_IFF_NAMES = (
+    ('LOOPBACK', 0x8), ('BROADCAST', 0x2), ('POINTOPOINT', 0x10),
+    ('MULTICAST', 0x1000), ('NOARP', 0x80), ('ALLMULTI', 0x200),
+    ('PROMISC', 0x100), ('NOTRAILERS', 0x20), ('DEBUG', 0x4),
+    ('DYNAMIC', 0x8000), ('AUTOMEDIA', 0x4000), ('PORTSEL', 0x2000),
+    ('MASTER', 0x400), ('SLAVE', 0x800), ('UP', 0x1),
+    ('LOWER_UP', 0x10000), ('DORMANT', 0x20000), ('ECHO', 0x40000)
+)
+
+# Address flags in the order printed by the ip command. The 'permanent'
+# flag is printed as 'dynamic' when it is missing, and the 'secondary' flag
+# as 'temporary' for IPv6 addresses.
+_IFA_F_NAMES = (
+    ('secondary', 0x01), ('nodad', 0x02), ('optimistic', 0x04),
+    ('dadfailed', 0x08), ('home', 0x10), ('deprecated', 0x20),
+    ('tentative', 0x40), ('permanent', 0x80), ('mngtmpaddr', 0x100),
+    ('noprefixroute', 0x200), ('autojoin', 0x400),
+    ('stable-privacy', 0x800)
+)
+
+_OPERSTATES = (
+    'UNKNOWN', 'NOTPRESENT', 'DOWN', 'LOWERLAYERDOWN', 'TESTING', 'DORMANT',
+    'UP'
+)
+
+_SCOPES = {0: 'global', 200: 'site', 253: 'link', 254: 'host', 255: 'nowhere'}
+
+_LINK_TYPES = {
+    1: 'ether', 6: 'ieee802', 32: 'infiniband', 256: 'slip', 280: 'can',
+    512: 'ppp', 768: 'ipip', 769: 'tunnel6', 772: 'loopback', 776: 'sit',
+    778: 'gre', 823: 'ip6gre', 824: 'netlink', 65534: 'none', 65535: 'void'
+}
+
+# Positions in struct rtnl_link_stats64 of the counters of the ip command
+_STATS64_KEYS = (
+    ('rx_bytes', 2), ('rx_packets', 0), ('rx_errors', 4), ('rx_dropped', 6),
+    ('rx_overrun', 15), ('rx_mcast', 8), ('tx_bytes', 3), ('tx_packets', 1),
+    ('tx_errors', 5), ('tx_dropped', 7), ('tx_carrier', 17),
+    ('tx_collisions', 9)
+)
+
+_FAMILIES = {socket.AF_INET: 'inet', socket.AF_INET6: 'inet6'}
+
+_SOCKETS = {}
+_SOCKETS_LOCK = Lock()
+
+
+def _align(length):
+    return (length + 3) & ~3
+
+
+def _attr(attr_type, value):
+    """
+    Encode a rtnetlink attribute.
+    """
+    length = _RTATTR.size + len(value)
+    return _RTATTR.pack(length, attr_type) + value + \
+        b'\0' * (_align(length) - length)
+
+
+def _parse_attrs(data, offset):
+    """
+    Decode the rtnetlink attributes of a message.
+
+    :rtype: dict
+    :return: Map of attribute types to their raw values.
+    """
+    attrs = {}
+    while offset + _RTATTR.size <= len(data):
+        length, attr_type = _RTATTR.unpack_from(data, offset)
+        if length < _RTATTR.size:
+            break
+        attrs[attr_type & 0x3fff] = data[offset + _RTATTR.size:offset + length]
+        offset += _align(length)
+    return attrs
+
+
+def _string(value):
+    return value.split(b'\0', 1)[0].decode('utf-8')
+
+
+def _format_lladdr(value):
+    """
+    Format a link layer address as the ip command does.
+    """
+    if len(value) == 4:
+        return socket.inet_ntop(socket.AF_INET, value)
+    if len(value) == 16:
+        return socket.inet_ntop(socket.AF_INET6, value)
+    return ':'.join('{:02x}'.format(byte) for byte in bytearray(value))
+
+
+def _operstate(value):
+    """
+    Name the operational state of an interface.
+    """
+    if value is None:
+        return None
+    state = bytearray(value)[0]
+    if state < len(_OPERSTATES):
+        return _OPERSTATES[state]
+    return str(state)
+
+
+def _link_flags(flags, mdown):
+    """
+    Format the flags of an interface as the ip command does.
+    """
+    names = []
+    if flags & _IFF_UP and not flags & _IFF_RUNNING:
+        names.append('NO-CARRIER')
+    flags &= ~_IFF_RUNNING
+
+    for name, mask in _IFF_NAMES:
+        if flags & mask:
+            names.append(name)
+            flags &= ~mask
+    if flags:
+        names.append('{:x}'.format(flags))
+    if mdown:
+        names.append('M-DOWN')
+    return ','.join(names)
+
+
+def _address_flags(family, flags):
+    """
+    Format the flags of an address as the ip command does.
+    """
+    names = []
+    for name, mask in _IFA_F_NAMES:
+        if name == 'permanent':
+            if not flags & mask:
+                names.append('dynamic')
+        elif flags & mask:
+            if name == 'secondary' and family == socket.AF_INET6:
+                name = 'temporary'
+            names.append(name)
+    return names
+
+
+def _setns(libc, fd):
+    if libc.setns(fd, _CLONE_NEWNET) != 0:
+        errno = get_errno()
+        raise OSError(errno, strerror(errno))
+
+
+def enter_netns(netns_path):
+    """
+    Move the calling thread to a network namespace.
+
+    Meant to be used as the ``preexec_fn`` of :class:`subprocess.Popen` to
+    run local commands inside the namespace of a node.
+
+    :param str netns_path: Path of the network namespace file.
+    :raises OSError: If the namespace cannot be entered.
+    """
+    libc = CDLL(None, use_errno=True)
+    fd = os_open(netns_path, O_RDONLY)
+    try:
+        _setns(libc, fd)
+    finally:
+        close(fd)
+
+
+class NetlinkSocket(object):
+    """
+    rtnetlink socket bound to a network namespace.
+
+    The socket is opened from inside the namespace, so it keeps operating on
+    it regardless of the namespace of the calling thread. Requests are
+    serialized, so a socket can be shared by several threads.
+
+    :param str netns_path: Path of the network namespace file. If ``None``,
+     use the namespace of the calling thread.
+    :raises OSError: If the namespace cannot be entered or the socket cannot
+     be opened.
+    """
+
+    def __init__(self, netns_path=None):
+        self._lock = Lock()
+        self._seq = 0
+        self._indexes = {}
+
+        if netns_path is None:
+            self._sock = self._open()
+            return
+
+        libc = CDLL(None, use_errno=True)
+        current = os_open('/proc/thread-self/ns/net', O_RDONLY)
+        try:
+            target = os_open(netns_path, O_RDONLY)
+            try:
+                _setns(libc, target)
+                try:
+                    self._sock = self._open()
+                finally:
+                    _setns(libc, current)
+            finally:
+                close(target)
+        finally:
+            close(current)
+
+    @staticmethod
+    def _open():
+        sock = socket.socket(
+            socket.AF_NETLINK, socket.SOCK_RAW, _NETLINK_ROUTE
+        )
+        sock.setsockopt(socket.SOL_SOCKET, socket.SO_RCVBUF, 1 << 20)
+        sock.bind((0, 0))
+        return sock
+
+    def close(self):
+        """
+        Close the socket.
+        """
+        self._sock.close()
+
+    def request(self, msg_type, flags, payload):
+        """
+        Send a rtnetlink request and collect its replies.
+
+        :param int msg_type: Message type, like ``RTM_GETLINK``.
+        :param int flags: Message flags, besides ``NLM_F_REQUEST``.
+        :param bytes payload: Message body.
+        :rtype: list
+        :return: A list of ``(msg_type, data, offset)`` tuples, one per reply,
+         where the reply body starts at ``offset`` of ``data``.
+        :raises AssertionError: If the kernel answered with an error.
+        """
+        with self._lock:
+            self._seq += 1
+            seq = self._seq
+            self._sock.send(_NLMSGHDR.pack(
+                _NLMSGHDR.size + len(payload), msg_type,
+                flags | _NLM_F_REQUEST, seq, 0
+            ) + payload)
+
+            replies = []
+            while True:
+                data = self._sock.recv(1 << 16)
+                offset = 0
+                while offset + _NLMSGHDR.size <= len(data):
+                    length, reply_type, _, reply_seq, _ = \
+                        _NLMSGHDR.unpack_from(data, offset)
+                    body = offset + _NLMSGHDR.size
+                    end = offset + length
+                    offset += _align(length)
+
+                    if reply_seq != seq:
+                        continue
+                    if reply_type == _NLMSG_DONE:
+                        return replies
+                    if reply_type == _NLMSG_ERROR:
+                        error, = _NLMSGERR.unpack_from(data, body)
+                        if error:
+                            raise NetlinkError(-error)
+                        return replies
+                    replies.append((reply_type, data[:end], body))
+
+                if not flags & _NLM_F_DUMP and not flags & _NLM_F_ACK:
+                    return replies
+
+    def _links(self, dev=None):
+        """
+        Fetch the links of the namespace, or a single one.
+
+        :rtype: list
+        :return: A list of ``(index, link_type, flags, attrs)`` tuples.
+        """
+        if dev is None:
+            replies = self.request(
+                _RTM_GETLINK, _NLM_F_DUMP,
+                _IFINFOMSG.pack(socket.AF_UNSPEC, 0, 0, 0, 0)
+            )
+        else:
+            replies = self.request(
+                _RTM_GETLINK, 0,
+                _IFINFOMSG.pack(socket.AF_UNSPEC, 0, 0, 0, 0) +
+                _attr(_IFLA_IFNAME, dev.encode('utf-8') + b'\0')
+            )
+
+        links = []
+        for _, data, offset in replies:
+            _, link_type, index, flags, _ = \
+                _IFINFOMSG.unpack_from(data, offset)
+            attrs = _parse_attrs(data, offset + _IFINFOMSG.size)
+            links.append((index, link_type, flags, attrs))
+            self._indexes[_string(attrs[_IFLA_IFNAME])] = index
+        return links
+
+    def _addresses(self):
+        """
+        Fetch the addresses of the namespace.
+
+        :rtype: list
+        :return: A list of ``(index, address)`` tuples, where ``address`` is
+         a dictionary as described in
+         :func:`topology_lib_ip.library._parse_ip_addr_show`.
+        """
+        replies = self.request(
+            _RTM_GETADDR, _NLM_F_DUMP,
+            _IFADDRMSG.pack(socket.AF_UNSPEC, 0, 0, 0, 0)
+        )
+
+        addresses = []
+        for _, data, offset in replies:
+            family, prefixlen, flags, scope, index = \
+                _IFADDRMSG.unpack_from(data, offset)
+            if family not in _FAMILIES:
+                continue
+            attrs = _parse_attrs(data, offset + _IFADDRMSG.size)
+
+            if _IFA_FLAGS in attrs:
+                flags, = _U32.unpack(attrs[_IFA_FLAGS][:4])
+            local = attrs.get(_IFA_LOCAL, attrs.get(_IFA_ADDRESS))
+
+            addresses.append((index, {
+                'family': _FAMILIES[family],
+                'address': socket.inet_ntop(family, local),
+                'prefix': prefixlen,
+                'scope': _SCOPES.get(scope, str(scope)),
+                'flags': _address_flags(family, flags)
+            }))
+        return addresses
+
+    def _index(self, dev):
+        """
+        Get the index of a device, from the names seen before if possible.
+        """
+        if dev not in self._indexes:
+            self._links(dev)
+        return self._indexes[dev]
+
+    def _retry(self, dev, func):
+        """
+        Call ``func(index)`` with the index of a device, looking the index up
+        again if the device was recreated since it was cached.
+        """
+        try:
+            return func(self._index(dev))
+        except NetlinkError as e:
+            if e.errno != ENODEV:
+                raise
+            self._indexes.pop(dev, None)
+            return func(self._index(dev))
+
+    def show_interfaces(self, devs=None):
+        """
+        Show the configured parameters and stats of the interfaces.
+
+        :param devs: Device names to include. If ``None``, include all.
+        :rtype: OrderedDict
+        :return: A dictionary as returned by
+         :func:`topology_lib_ip.library.show_interfaces`.
+        """
+        if devs is not None and len(devs) == 1:
+            try:
+                links = self._links(next(iter(devs)))
+            except NetlinkError as e:
+                if e.errno != ENODEV:
+                    raise
+                return OrderedDict()
+        else:
+            links = self._links()
+
+        flags_by_index = {index: flags for index, _, flags, _ in links}
+        result = OrderedDict()
+        by_index = {}
+
+        for index, link_type, flags, attrs in links:
+            name = _string(attrs[_IFLA_IFNAME])
+            if devs is not None and name not in devs:
+                continue
+
+            # The ip command marks links whose lower link is down
+            mdown = False
+            if _IFLA_LINK in attrs and _IFLA_LINK_NETNSID not in attrs:
+                link, = _U32.unpack(attrs[_IFLA_LINK][:4])
+                if link and link != index:
+                    if link not in flags_by_index:
+                        lower = self.request(
+                            _RTM_GETLINK, 0,
+                            _IFINFOMSG.pack(socket.AF_UNSPEC, 0, link, 0, 0)
+                        )
+                        flags_by_index[link] = _IFINFOMSG.unpack_from(
+                            lower[0][1], lower[0][2]
+                        )[3] if lower else 0
+                    mdown = not flags_by_index[link] & _IFF_UP
+
+            d = InterfaceInfo(
+                os_index=index,
+                dev=name,
+                falgs_str=_link_flags(flags, mdown),
+                mtu=_U32.unpack(attrs[_IFLA_MTU][:4])[0]
+                if _IFLA_MTU in attrs else None,
+                state=_operstate(attrs.get(_IFLA_OPERSTATE)),
+                link_type=_LINK_TYPES.get(
+                    link_type, '[{}]'.format(link_type)
+                ),
+                mac_address=_format_lladdr(attrs[_IFLA_ADDRESS])
+                if _IFLA_ADDRESS in attrs else None,
+                addresses=[]
+            )
+
+            if _IFLA_STATS64 in attrs:
+                stats = _STATS64.unpack(
+                    attrs[_IFLA_STATS64][:_STATS64.size].ljust(
+                        _STATS64.size, b'\0'
+                    )
+                )
+                d.stats = LinkStats(
+                    stats[position] for _, position in _STATS64_KEYS
+                )
+
+            result[name] = d
+            by_index[index] = d
+
+        if result:
+            for index, addr in self._addresses():
+                d = by_index.get(index)
+                if d is None:
+                    continue
+                if addr['family'] not in d:
+                    d[addr['family']] = addr['address']
+                    d[addr['family'] + '_mask'] = addr['prefix']
+                d['addresses'].append(addr)
+
+        return result
+
+    def show_interface(self, dev):
+        """
+        Show the configured parameters and stats of an interface.
+
+        :param str dev: Device name.
+        :rtype: dict
+        :return: A dictionary as returned by
+         :func:`topology_lib_ip.library.show_interface`, or ``None`` if the
+         device doesn't exist.
+        """
+        return self.show_interfaces([dev]).get(dev)
+
+    def _modify_addr(self, msg_type, flags, dev, addr):
+        iface = ip_interface(addr)
+        family = socket.AF_INET if iface.version == 4 else socket.AF_INET6
+        packed = iface.ip.packed
+        scope = 254 if iface.version == 4 and iface.ip.is_loopback else 0
+
+        # Like the ip command, deleting an IPv4 address without a prefix
+        # deletes it whatever its prefix is
+        attrs = _attr(_IFA_LOCAL, packed)
+        if msg_type != _RTM_DELADDR or iface.version == 6 or '/' in addr:
+            attrs += _attr(_IFA_ADDRESS, packed)
+
+        def send(index):
+            self.request(msg_type, flags | _NLM_F_ACK, _IFADDRMSG.pack(
+                family, iface.network.prefixlen, 0, scope, index
+            ) + attrs)
+
+        self._retry(dev, send)
+
+    def interface(self, dev, addr=None, up=None):
+        """
+        Configure an interface.
+
+        See :func:`topology_lib_ip.library.interface` for the description of
+        the parameters.
+        """
+        if addr is not None:
+            self._modify_addr(
+                _RTM_NEWADDR, _NLM_F_CREATE | _NLM_F_EXCL, dev, addr
+            )
+
+        if up is not None:
+            self.request(
+                _RTM_NEWLINK, _NLM_F_ACK,
+                _IFINFOMSG.pack(
+                    socket.AF_UNSPEC, 0, 0, _IFF_UP if up else 0, _IFF_UP
+                ) + _attr(_IFLA_IFNAME, dev.encode('utf-8') + b'\0')
+            )
+
+    def remove_ip(self, dev, addr):
+        """
+        Remove an IP address from an interface.
+
+        See :func:`topology_lib_ip.library.remove_ip` for the description of
+        the parameters.
+        """
+        assert ip_address(addr.split('/', 1)[0])
+        self._modify_addr(_RTM_DELADDR, 0, dev, addr)
+
+
+class NetlinkError(AssertionError):
+    """
+    Error answered by the kernel to a rtnetlink request.
+
+    It is an :class:`AssertionError`, as the errors of the ``ip`` command
+    detected by the library.
+
+    :var int errno: Error number.
+    """
+
+    def __init__(self, errno):
+        super(NetlinkError, self).__init__(
+            'RTNETLINK answers: {}'.format(strerror(errno))
+        )
+        self.errno = errno
+
+
+def netlink_socket(enode):
+    """
+    Get the rtnetlink socket of a node.
+
+    Sockets are shared by all the nodes in the same namespace.
+
+    :param enode: Engine node.
+    :type enode: topology.platforms.base.BaseNode
+    :rtype: NetlinkSocket
+    :return: The socket, or ``None`` if the node doesn't expose its
+     namespace with a ``netns_path`` attribute or the namespace cannot be
+     entered.
+    """
+    netns_path = getattr(enode, 'netns_path', None)
+    if netns_path is None:
+        return None
+
+    with _SOCKETS_LOCK:
+        if netns_path not in _SOCKETS:
+            try:
+                _SOCKETS[netns_path] = NetlinkSocket(netns_path)
+            except (OSError, AttributeError):
+                _SOCKETS[netns_path] = None
+        return _SOCKETS[netns_path]
+
+
+__all__ = ['NetlinkSocket', 'NetlinkError', 'netlink_socket', 'enter_netns']
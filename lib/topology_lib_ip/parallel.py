@@ -0,0 +1,166 @@
+# -*- coding: utf-8 -*-
+#
+# Copyright (C) 2015-2016 Hewlett Packard Enterprise Development LP
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#   http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing,
+# software distributed under the License is distributed on an
+# "AS IS" BASIS, WITHOUT WARRANTIES OR CONDITIONS OF ANY
+# KIND, either express or implied.  See the License for the
+# specific language governing permissions and limitations
+# under the License.
+
+"""
+topology_lib_ip parallel execution of library calls on several nodes.
+"""
+
+from __future__ import unicode_literals, absolute_import
+from __future__ import print_function, division
+
+from collections import OrderedDict
+from threading import Event, Lock, Thread
+
+from . import library
+
+
+class NodeResult(object):
+    """
+    Outcome of the operations run on a node by :func:`run_parallel`.
+
+    :var list results: Return values of the operations that completed, in
+     order.
+    :var exception: Exception raised by the operation that failed, or
+     ``None``. Operations after a failed one are not run.
+    :var bool cancelled: ``True`` if some operations were not run because
+     another node failed and ``fail_fast`` was set.
+    """
+
+    def __init__(self):
+        self.results = []
+        self.exception = None
+        self.cancelled = False
+
+    @property
+    def ok(self):
+        """
+        ``True`` if all the operations of the node completed.
+        """
+        return self.exception is None and not self.cancelled
+
+    def __repr__(self):
+        return '<NodeResult results={} exception={!r} cancelled={}>'.format(
+            len(self.results), self.exception, self.cancelled
+        )
+
+
+def _operation(operation):
+    """
+    Normalize an operation to a ``(func, args, kwargs)`` tuple.
+
+    :param operation: A callable, or a tuple ``(func, args)`` or
+     ``(func, args, kwargs)``. ``func`` is a callable or the name of a
+     function of :mod:`topology_lib_ip.library`.
+    :rtype: tuple
+    """
+    if callable(operation):
+        return operation, (), {}
+
+    func, args, kwargs = (tuple(operation) + ((), {}))[:3]
+
+    if not callable(func):
+        if func not in library.__all__:
+            raise ValueError('Unknown library function {}'.format(func))
+        func = getattr(library, func)
+
+    return func, tuple(args), dict(kwargs)
+
+
+def run_parallel(operations, max_workers=8, fail_fast=False):
+    """
+    Run library calls on several nodes concurrently.
+
+    The operations of each node are run in order, in a single thread, so a
+    node is never driven by two threads at the same time. Up to
+    ``max_workers`` nodes are driven at once.
+
+    ::
+
+        results = run_parallel({
+            hs1: [
+                ('interface', ('1',), {'addr': '10.0.0.1/24', 'up': True}),
+                ('add_route', ('default', '10.0.0.254'))
+            ],
+            hs2: [
+                ('interface', ('1',), {'addr': '10.0.0.2/24', 'up': True})
+            ]
+        })
+        assert all(result.ok for result in results.values())
+
+    :param operations: A mapping, or an iterable of pairs, of engine nodes to
+     lists of operations. An operation is a callable that receives the node,
+     or a tuple ``(func, args)`` or ``(func, args, kwargs)`` where ``func``
+     is a callable or the name of a function of
+     :mod:`topology_lib_ip.library`, called as ``func(enode, *args,
+     **kwargs)``.
+    :param int max_workers: Maximum number of threads.
+    :param bool fail_fast: Stop running operations on every node as soon as
+     one operation fails.
+    :rtype: OrderedDict
+    :return: A dictionary mapping each node to its :class:`NodeResult`, in
+     the order the nodes were given.
+    """
+    if hasattr(operations, 'items'):
+        operations = operations.items()
+
+    pending = []
+    results = OrderedDict()
+    for enode, node_operations in operations:
+        if enode in results:
+            raise ValueError('Node {} given more than once'.format(enode))
+        results[enode] = NodeResult()
+        pending.append(
+            (enode, [_operation(operation) for operation in node_operations])
+        )
+
+    pending.reverse()
+    lock = Lock()
+    stop = Event()
+
+    def worker():
+        while True:
+            with lock:
+                if not pending:
+                    return
+                enode, node_operations = pending.pop()
+
+            result = results[enode]
+            for func, args, kwargs in node_operations:
+                if stop.is_set():
+                    result.cancelled = True
+                    break
+                try:
+                    result.results.append(func(enode, *args, **kwargs))
+                except Exception as e:
+                    result.exception = e
+                    if fail_fast:
+                        stop.set()
+                    break
+
+    threads = [
+        Thread(target=worker) for _ in range(min(max_workers, len(pending)))
+    ]
+    for thread in threads:
+        thread.daemon = True
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    return results
+
+
+__all__ = ['NodeResult', 'run_parallel']
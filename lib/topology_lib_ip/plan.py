@@ -0,0 +1,342 @@
+# -*- coding: utf-8 -*-
+#
+# Copyright (C) 2015-2016 Hewlett Packard Enterprise Development LP
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#   http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing,
+# software distributed under the License is distributed on an
+# "AS IS" BASIS, WITHOUT WARRANTIES OR CONDITIONS OF ANY
+# KIND, either express or implied.  See the License for the
+# specific language governing permissions and limitations
+# under the License.
+
+"""
+topology_lib_ip addressing of the links of a topology.
+
+An :class:`AddressPlan` carves one subnet per link out of an address pool,
+checks the whole plan for overlapping subnets and configures the addresses
+of every node with a single ``ip -batch`` call per node:
+
+::
+
+    plan = AddressPlan('10.0.0.0/16')
+    plan.add_links([
+        [(hs1, '1'), (sw1, '1')],
+        [(hs2, '1'), (sw1, '2')]
+    ])
+    plan.reserve('10.0.255.0/24')
+    results = plan.push()
+    assert all(result.ok for result in results.values())
+
+Subnets are kept as integers until the addresses are pushed, so planning
+costs a few list operations per link.
+"""
+
+from __future__ import unicode_literals, absolute_import
+from __future__ import print_function, division
+
+from collections import OrderedDict
+from heapq import heappop, heappush
+from ipaddress import ip_network
+from socket import inet_ntoa
+from struct import Struct
+
+from .library import ip_batch
+from .parallel import run_parallel
+
+
+_IPV4 = Struct(str('!I'))
+
+
+def _format_ipv4(value):
+    """
+    Format an integer IPv4 address, faster than :class:`IPv4Address`.
+    """
+    return inet_ntoa(_IPV4.pack(value))
+
+
+class AddressConflict(AssertionError):
+    """
+    Overlapping subnets in an :class:`AddressPlan`.
+
+    :var list conflicts: List of ``(subnet, subnet)`` tuples of the subnets
+     that overlap.
+    """
+
+    def __init__(self, conflicts):
+        self.conflicts = conflicts
+        super(AddressConflict, self).__init__(
+            '{} overlapping subnets:\n{}'.format(
+                len(conflicts), '\n'.join(
+                    '{} overlaps {}'.format(first, second)
+                    for first, second in conflicts
+                )
+            )
+        )
+
+
+class AddressPlan(object):
+    """
+    Subnets of the links of a topology, and the addresses of their
+    endpoints.
+
+    Links are carved in order from the start of the pool. Endpoints get the
+    addresses of their subnet in order, skipping the network address of
+    subnets larger than two addresses, and the broadcast address too for
+    IPv4, so point-to-point ``/31`` (RFC 3021) and ``/127`` subnets use both
+    of their addresses.
+
+    :param str pool: Network to carve subnets from, like ``'10.0.0.0/8'``.
+    :param int prefixlen: Prefix length of the carved subnets. If ``None``,
+     ``31`` for IPv4 pools and ``127`` for IPv6 pools.
+    """
+
+    def __init__(self, pool, prefixlen=None):
+        network = ip_network(pool)
+        if prefixlen is None:
+            prefixlen = network.max_prefixlen - 1
+        if not network.prefixlen <= prefixlen <= network.max_prefixlen:
+            raise ValueError(
+                'Invalid prefix length {} for pool {}'.format(prefixlen, pool)
+            )
+
+        self.pool = network
+        self.prefixlen = prefixlen
+        # Integers below 2 ** 32 are IPv4 addresses for ip_address()
+        self._address = type(network.network_address)
+        self._next = int(network.network_address)
+        self._end = self._next + network.num_addresses
+
+        # One entry per subnet: start address, number of addresses and
+        # endpoints, as parallel lists
+        self._starts = []
+        self._sizes = []
+        self._endpoints = []
+
+    def __len__(self):
+        return len(self._starts)
+
+    def _usable(self, size):
+        """
+        Offset of the first address given to endpoints and number of
+        addresses available in a subnet.
+        """
+        if size <= 2:
+            return 0, size
+        if self.pool.version == 4:
+            return 1, size - 2
+        return 1, size - 1
+
+    def add_links(self, links, prefixlen=None):
+        """
+        Carve a subnet for each of several links.
+
+        :param links: Iterable of links. A link is a sequence of
+         ``(enode, portlbl)`` endpoints.
+        :param int prefixlen: Prefix length of the subnets. If ``None``, use
+         the prefix length of the plan.
+        :return: The number of links added.
+        :raises ValueError: If the pool is exhausted or a link has more
+         endpoints than its subnet has addresses.
+        """
+        if prefixlen is None:
+            prefixlen = self.prefixlen
+        if not self.pool.prefixlen <= prefixlen <= self.pool.max_prefixlen:
+            raise ValueError('Invalid prefix length {}'.format(prefixlen))
+
+        links = list(links)
+        if not links:
+            return 0
+
+        size = 1 << (self.pool.max_prefixlen - prefixlen)
+        _, usable = self._usable(size)
+        if max(map(len, links)) > usable:
+            raise ValueError(
+                'Links of more than {} endpoints do not fit a /{} subnet'
+                .format(usable, prefixlen)
+            )
+
+        # Align to the subnet size, as carved subnets may have mixed sizes
+        start = -(-self._next // size) * size
+        end = start + len(links) * size
+        if end > self._end:
+            raise ValueError('Pool {} exhausted'.format(self.pool))
+
+        self._starts.extend(range(start, end, size))
+        self._sizes.extend([size] * len(links))
+        self._endpoints.extend(links)
+        self._next = end
+        return len(links)
+
+    def add_link(self, endpoints, prefixlen=None):
+        """
+        Carve a subnet for a link.
+
+        :param endpoints: Sequence of ``(enode, portlbl)`` endpoints.
+        :param int prefixlen: Prefix length of the subnet. If ``None``, use
+         the prefix length of the plan.
+        :rtype: str
+        :return: The subnet of the link, like ``'10.0.0.0/31'``.
+        """
+        self.add_links([endpoints], prefixlen=prefixlen)
+        return self.subnet(len(self) - 1)
+
+    def assign(self, subnet, endpoints=()):
+        """
+        Add a link with a given subnet instead of a carved one.
+
+        The subnet can be outside the pool. Overlaps with other subnets are
+        reported by :meth:`check`.
+
+        :param str subnet: Subnet of the link, like ``'192.0.2.0/24'``.
+        :param endpoints: Sequence of ``(enode, portlbl)`` endpoints.
+        """
+        network = ip_network(subnet)
+        if network.version != self.pool.version:
+            raise ValueError(
+                'Subnet {} is not of the family of pool {}'.format(
+                    subnet, self.pool
+                )
+            )
+
+        endpoints = tuple(endpoints)
+        _, usable = self._usable(network.num_addresses)
+        if len(endpoints) > usable:
+            raise ValueError(
+                'Subnet {} has no room for {} endpoints'.format(
+                    subnet, len(endpoints)
+                )
+            )
+
+        self._starts.append(int(network.network_address))
+        self._sizes.append(network.num_addresses)
+        self._endpoints.append(endpoints)
+
+    def reserve(self, subnet):
+        """
+        Reserve a subnet, so :meth:`check` reports links that overlap it.
+
+        :param str subnet: Subnet to reserve.
+        """
+        self.assign(subnet)
+
+    def subnet(self, index):
+        """
+        Subnet of a link.
+
+        :param int index: Index of the link, in the order they were added.
+        :rtype: str
+        """
+        size = self._sizes[index]
+        return '{}/{}'.format(
+            self._address(self._starts[index]),
+            self.pool.max_prefixlen - size.bit_length() + 1
+        )
+
+    def check(self):
+        """
+        Check that no two subnets of the plan overlap.
+
+        Subnets are sorted by start address, which costs a single pass for
+        carved subnets as they are already in order, and each one is
+        compared with the subnets still open at its start, kept in a heap
+        by end address. Every overlapping pair is reported.
+
+        :raises AddressConflict: If any subnets overlap.
+        """
+        starts = self._starts
+        sizes = self._sizes
+
+        conflicts = []
+        active = []
+        for index in sorted(range(len(starts)), key=starts.__getitem__):
+            start = starts[index]
+            while active and active[0][0] <= start:
+                heappop(active)
+            if active:
+                conflicts.extend(
+                    (other, index) for other in sorted(
+                        (other for _, other in active),
+                        key=lambda other: (starts[other], other)
+                    )
+                )
+            heappush(active, (start + sizes[index], index))
+
+        if conflicts:
+            raise AddressConflict([
+                (self.subnet(first), self.subnet(second))
+                for first, second in conflicts
+            ])
+
+    def addresses(self):
+        """
+        Addresses of the endpoints of the plan, by node.
+
+        :rtype: OrderedDict
+        :return: A dictionary mapping each node to a list of
+         ``(portlbl, addr)`` tuples, like ``('1', '10.0.0.0/31')``, in the
+         order the links were added.
+        """
+        result = OrderedDict()
+        bits = self.pool.max_prefixlen
+        address = _format_ipv4 if self.pool.version == 4 else self._address
+
+        for start, size, endpoints in zip(
+                self._starts, self._sizes, self._endpoints):
+            if not endpoints:
+                continue
+            offset, _ = self._usable(size)
+            prefixlen = bits - size.bit_length() + 1
+            for position, (enode, portlbl) in enumerate(endpoints):
+                result.setdefault(enode, []).append((
+                    portlbl, '{}/{}'.format(
+                        address(start + offset + position), prefixlen
+                    )
+                ))
+
+        return result
+
+    def push(self, up=True, max_workers=8, shell=None, force=True):
+        """
+        Check the plan and configure the addresses of every node.
+
+        The plan is checked with :meth:`check` before sending anything. Each
+        node is then configured with a single ``ip -batch`` call, as
+        described in :func:`topology_lib_ip.library.ip_batch`, and up to
+        ``max_workers`` nodes are configured at once.
+
+        :param bool up: Bring up or down the interfaces. If ``None``, leave
+         them as they are.
+        :param int max_workers: Maximum number of nodes configured at once.
+        :param str shell: Shell name to execute commands. If ``None``, use
+         the Engine Node default shell.
+        :param bool force: Keep configuring a node after a failed command.
+        :rtype: OrderedDict
+        :return: The result of every node, as returned by
+         :func:`topology_lib_ip.parallel.run_parallel`. Failed commands are
+         reported by a :class:`topology_lib_ip.library.BatchError`.
+        :raises AddressConflict: If any subnets overlap.
+        """
+        self.check()
+
+        return run_parallel((
+            (enode, [(_push_node, (assignments, up, shell, force))])
+            for enode, assignments in self.addresses().items()
+        ), max_workers=max_workers)
+
+
+def _push_node(enode, assignments, up, shell, force):
+    """
+    Configure the addresses of a node in a single ``ip -batch`` call.
+    """
+    with ip_batch(enode, shell=shell, force=force) as batch:
+        for portlbl, addr in assignments:
+            batch.interface(portlbl, addr=addr, up=up)
+
+
+__all__ = ['AddressConflict', 'AddressPlan']
@@ -0,0 +1,283 @@
+# -*- coding: utf-8 -*-
+#
+# Copyright (C) 2015-2016 Hewlett Packard Enterprise Development LP
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#   http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing,
+# software distributed under the License is distributed on an
+# "AS IS" BASIS, WITHOUT WARRANTIES OR CONDITIONS OF ANY
+# KIND, either express or implied.  See the License for the
+# specific language governing permissions and limitations
+# under the License.
+
+"""
+topology_lib_ip compact result objects.
+
+:class:`InterfaceInfo` and :class:`LinkStats` hold the state returned by
+:func:`topology_lib_ip.library.show_interface` and
+:func:`topology_lib_ip.library.show_interfaces` in ``__slots__`` instead of
+per call dictionaries. They behave like the dictionaries they replace, so
+existing code indexing, comparing or updating results keeps working, and
+:meth:`InterfaceInfo.to_dict` exports them as plain dictionaries.
+
+Numeric fields are kept as parsed from the command output and only
+converted to integers the first time they are read.
+"""
+
+from __future__ import unicode_literals, absolute_import
+from __future__ import print_function, division
+
+from .stats import COUNTERS
+
+try:
+    from collections.abc import MutableMapping
+except ImportError:
+    from collections import MutableMapping
+
+
+_COUNTER_INDEXES = {key: index for index, key in enumerate(COUNTERS)}
+
+
+class LinkStats(MutableMapping):
+    """
+    Counters of an interface, as reported by ``ip -s link``.
+
+    Behaves as a dictionary with the keys listed in
+    :data:`topology_lib_ip.stats.COUNTERS`.
+
+    :param values: Values of the counters, in the order of
+     :data:`topology_lib_ip.stats.COUNTERS`, as integers or digit strings.
+    """
+
+    __slots__ = ('_values', '_parsed')
+
+    def __init__(self, values):
+        self._values = list(values)
+        self._parsed = False
+        assert len(self._values) == len(COUNTERS)
+
+    @classmethod
+    def from_dict(cls, values):
+        """
+        Build the counters from a dictionary, with missing counters as 0.
+
+        :param dict values: Map of counter names to values.
+        :rtype: LinkStats
+        """
+        return cls(values.get(key, 0) for key in COUNTERS)
+
+    def _parse(self):
+        if not self._parsed:
+            self._values = [int(value) for value in self._values]
+            self._parsed = True
+        return self._values
+
+    def __getitem__(self, key):
+        return self._parse()[_COUNTER_INDEXES[key]]
+
+    def __setitem__(self, key, value):
+        self._parse()[_COUNTER_INDEXES[key]] = value
+
+    def __delitem__(self, key):
+        raise TypeError('Counters can not be removed')
+
+    def __contains__(self, key):
+        return key in _COUNTER_INDEXES
+
+    def __iter__(self):
+        return iter(COUNTERS)
+
+    def __len__(self):
+        return len(COUNTERS)
+
+    def __getstate__(self):
+        return self._values, self._parsed
+
+    def __setstate__(self, state):
+        self._values, self._parsed = state
+
+    def values(self):
+        return list(self._parse())
+
+    def items(self):
+        return list(zip(COUNTERS, self._parse()))
+
+    def to_dict(self):
+        """
+        Export the counters as a dictionary.
+
+        :rtype: dict
+        """
+        return dict(zip(COUNTERS, self._parse()))
+
+    def __repr__(self):
+        return 'LinkStats({!r})'.format(self.to_dict())
+
+
+# Numeric interface fields, converted on first access
+_INTERFACE_INTS = frozenset(('os_index', 'mtu'))
+
+# Interface fields, in the order of the dictionaries they replace
+_INTERFACE_FIELDS = (
+    'os_index', 'dev', 'falgs_str', 'mtu', 'state', 'link_type',
+    'mac_address', 'inet', 'inet_mask', 'inet6', 'inet6_mask', 'addresses'
+)
+
+_INTERFACE_SLOTS = frozenset(_INTERFACE_FIELDS)
+
+
+class InterfaceInfo(MutableMapping):
+    """
+    Configured parameters and stats of an interface.
+
+    Behaves as the dictionary documented in
+    :func:`topology_lib_ip.library.show_interface`: the ``inet``,
+    ``inet_mask``, ``inet6`` and ``inet6_mask`` keys are only present if set,
+    and the counters of :attr:`stats` are only present if the interface has
+    them. Other keys are kept in a separate dictionary.
+
+    :param fields: Interface fields.
+    :var stats: The counters of the interface, or ``None``.
+    :vartype stats: LinkStats
+    """
+
+    __slots__ = _INTERFACE_FIELDS + ('_stats', '_extra')
+
+    def __init__(self, **fields):
+        self._stats = None
+        self._extra = None
+        for key, value in fields.items():
+            if key in _INTERFACE_SLOTS:
+                setattr(self, key, value)
+            else:
+                self[key] = value
+
+    @property
+    def stats(self):
+        return self._stats
+
+    @stats.setter
+    def stats(self, value):
+        if value is not None and not isinstance(value, LinkStats):
+            value = LinkStats.from_dict(value)
+        self._stats = value
+
+    def __getitem__(self, key):
+        if key in _INTERFACE_SLOTS:
+            try:
+                value = getattr(self, key)
+            except AttributeError:
+                raise KeyError(key)
+            if key in _INTERFACE_INTS and value is not None:
+                value = int(value)
+                setattr(self, key, value)
+            return value
+
+        if key in _COUNTER_INDEXES and self._stats is not None:
+            return self._stats[key]
+        if self._extra is not None and key in self._extra:
+            return self._extra[key]
+        raise KeyError(key)
+
+    def __setitem__(self, key, value):
+        if key in _INTERFACE_SLOTS:
+            setattr(self, key, value)
+        elif key in _COUNTER_INDEXES:
+            if self._stats is None:
+                self._stats = LinkStats.from_dict({})
+            self._stats[key] = value
+        else:
+            if self._extra is None:
+                self._extra = {}
+            self._extra[key] = value
+
+    def __delitem__(self, key):
+        if key in _INTERFACE_SLOTS:
+            try:
+                delattr(self, key)
+            except AttributeError:
+                raise KeyError(key)
+        elif key in _COUNTER_INDEXES and self._stats is not None:
+            self._stats = None
+        elif self._extra is not None and key in self._extra:
+            del self._extra[key]
+        else:
+            raise KeyError(key)
+
+    def __contains__(self, key):
+        if key in _INTERFACE_SLOTS:
+            return hasattr(self, key)
+        if key in _COUNTER_INDEXES:
+            return self._stats is not None
+        return self._extra is not None and key in self._extra
+
+    def __iter__(self):
+        for key in _INTERFACE_FIELDS:
+            if hasattr(self, key):
+                yield key
+        if self._stats is not None:
+            for key in COUNTERS:
+                yield key
+        if self._extra:
+            for key in self._extra:
+                yield key
+
+    def __len__(self):
+        return sum(1 for _ in self)
+
+    # Truth testing stops at the first key instead of counting them all
+    def __bool__(self):
+        for _ in self:
+            return True
+        return False
+
+    __nonzero__ = __bool__
+
+    def __getstate__(self):
+        return self.to_dict()
+
+    def __setstate__(self, state):
+        self.__init__(**state)
+
+    def copy(self):
+        """
+        Shallow copy of the interface, with its own counters.
+
+        :rtype: InterfaceInfo
+        """
+        result = InterfaceInfo()
+        for key in _INTERFACE_FIELDS:
+            if hasattr(self, key):
+                setattr(result, key, getattr(self, key))
+        if self._stats is not None:
+            result._stats = LinkStats(self._stats.values())
+        if self._extra is not None:
+            result._extra = dict(self._extra)
+        return result
+
+    def to_dict(self):
+        """
+        Export the interface as a dictionary.
+
+        The addresses are copied, so the dictionary doesn't share state with
+        the interface.
+
+        :rtype: dict
+        """
+        result = {key: self[key] for key in self}
+        if 'addresses' in result:
+            result['addresses'] = [
+                dict(address) for address in result['addresses']
+            ]
+        return result
+
+    def __repr__(self):
+        return 'InterfaceInfo({!r})'.format(self.to_dict())
+
+
+__all__ = ['InterfaceInfo', 'LinkStats']
@@ -0,0 +1,124 @@
+# -*- coding: utf-8 -*-
+#
+# Copyright (C) 2015-2016 Hewlett Packard Enterprise Development LP
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#   http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing,
+# software distributed under the License is distributed on an
+# "AS IS" BASIS, WITHOUT WARRANTIES OR CONDITIONS OF ANY
+# KIND, either express or implied.  See the License for the
+# specific language governing permissions and limitations
+# under the License.
+
+"""
+topology_lib_ip route table helpers.
+"""
+
+from __future__ import unicode_literals, absolute_import
+from __future__ import print_function, division
+
+from bisect import insort
+from ipaddress import ip_address, ip_network
+
+
+def _metric(route):
+    return route.get('metric') or 0
+
+
+class RouteTable(object):
+    """
+    Routes of a node, indexed for longest prefix match lookups.
+
+    Routes are kept in one hash table per address family and prefix length,
+    keyed by the integer value of their network address. A lookup masks the
+    address once per prefix length present in the table, longest first, so
+    it costs at most 33 (IPv4) or 129 (IPv6) dictionary accesses however many
+    routes the table holds.
+
+    When several routes have the same destination, for example with
+    different metrics, the one with the lowest metric is used for lookups.
+
+    Tables are built by :func:`topology_lib_ip.library.show_routes`.
+
+    :param list routes: Route dictionaries to add, as returned by
+     :func:`topology_lib_ip.library._parse_ip_route_show`.
+    """
+
+    def __init__(self, routes=None):
+        self._routes = []
+        self._index = {4: {}, 6: {}}
+        # Negated prefix lengths, so the sorted list is longest first
+        self._lengths = {4: [], 6: []}
+
+        for route in routes or ():
+            self.add(route)
+
+    def __len__(self):
+        return len(self._routes)
+
+    def __iter__(self):
+        return iter(self._routes)
+
+    def add(self, route):
+        """
+        Add a route to the table.
+
+        :param dict route: Route dictionary. Its ``dst`` key holds the
+         destination network, like ``'10.0.0.0/8'`` or ``'::/0'``.
+        """
+        network = ip_network(route['dst'], strict=False)
+        self._routes.append(route)
+
+        index = self._index[network.version]
+        if network.prefixlen not in index:
+            index[network.prefixlen] = {}
+            insort(self._lengths[network.version], -network.prefixlen)
+
+        networks = index[network.prefixlen]
+        key = int(network.network_address)
+        if key not in networks or _metric(route) < _metric(networks[key]):
+            networks[key] = route
+
+    def get(self, dst):
+        """
+        Get the route to an exact destination.
+
+        :param str dst: Destination network, like ``'10.0.0.0/8'``.
+        :rtype: dict
+        :return: The route, or ``None`` if the table has no route to the
+         destination.
+        """
+        network = ip_network(dst, strict=False)
+        networks = self._index[network.version].get(network.prefixlen, {})
+        return networks.get(int(network.network_address))
+
+    def lookup(self, addr):
+        """
+        Find the route used to reach an address.
+
+        :param addr: IPv4 or IPv6 address, like ``'10.1.2.3'``.
+        :type addr: str or ipaddress.IPv4Address or ipaddress.IPv6Address
+        :rtype: dict
+        :return: The route with the longest prefix that contains the address,
+         or ``None`` if no route does.
+        """
+        addr = ip_address(addr)
+        value = int(addr)
+        bits = addr.max_prefixlen
+        index = self._index[addr.version]
+
+        for length in self._lengths[addr.version]:
+            shift = bits + length
+            route = index[-length].get(value >> shift << shift)
+            if route is not None:
+                return route
+
+        return None
+
+
+__all__ = ['RouteTable']
@@ -0,0 +1,229 @@
+# -*- coding: utf-8 -*-
+#
+# Copyright (C) 2015-2016 Hewlett Packard Enterprise Development LP
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#   http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing,
+# software distributed under the License is distributed on an
+# "AS IS" BASIS, WITHOUT WARRANTIES OR CONDITIONS OF ANY
+# KIND, either express or implied.  See the License for the
+# specific language governing permissions and limitations
+# under the License.
+
+"""
+topology_lib_ip snapshots of the interfaces of a node, and their changes.
+
+:func:`take_snapshot` reads every interface of a node at once, and
+:meth:`InterfaceSnapshot.diff` reports what changed since an earlier
+snapshot, so convergence can be followed without comparing whole results:
+
+::
+
+    previous = take_snapshot(hs1)
+    while True:
+        sleep(1)
+        snapshot = take_snapshot(hs1)
+        for change in snapshot.diff(previous, threshold=1000).values():
+            print(change)
+        previous = snapshot
+
+Each snapshot keeps two tuples per interface, one of its state and one of
+its counters, built once. Interfaces whose tuples are equal to the previous
+snapshot are skipped without comparing their fields one by one. The tuples
+only hold plain values, so snapshots taken by different processes can be
+compared too.
+"""
+
+from __future__ import unicode_literals, absolute_import
+from __future__ import print_function, division
+
+from collections import namedtuple, OrderedDict
+
+from .library import show_interfaces
+from .stats import COUNTERS, counter_delta
+
+try:
+    from time import monotonic
+except ImportError:
+    from time import time as monotonic
+
+
+# Fields of the state of an interface compared by the diffs
+FIELDS = ('state', 'mtu', 'mac_address', 'addresses')
+
+
+class InterfaceChange(namedtuple('InterfaceChange', [
+        'dev', 'change', 'fields'])):
+    """
+    Change of an interface between two snapshots.
+
+    :var str dev: Device name.
+    :var str change: ``'added'``, ``'removed'`` or ``'changed'``.
+    :var dict fields: Map of the names of the fields and counters that
+     changed to their ``(previous, current)`` values. Addresses are
+     compared as sorted tuples of ``'address/prefix'`` strings. Empty for
+     added and removed interfaces.
+    """
+    __slots__ = ()
+
+
+def _state(d):
+    """
+    Extract the compared state of an interface.
+
+    :rtype: tuple
+    :return: The values of :data:`FIELDS`.
+    """
+    return (
+        d.get('state'),
+        d.get('mtu'),
+        d.get('mac_address'),
+        tuple(sorted(
+            '{}/{}'.format(address['address'], address['prefix'])
+            for address in d.get('addresses') or ()
+        ))
+    )
+
+
+def _counters(d):
+    """
+    Extract the counters of an interface.
+
+    :rtype: tuple
+    :return: The values of :data:`topology_lib_ip.stats.COUNTERS`, or
+     ``None`` if the interface has no counters.
+    """
+    stats = getattr(d, 'stats', None)
+    if stats is not None:
+        return tuple(stats.values())
+    if COUNTERS[0] not in d:
+        return None
+    return tuple(d[key] for key in COUNTERS)
+
+
+class InterfaceSnapshot(object):
+    """
+    State and counters of the interfaces of a node at a point in time.
+
+    Snapshots are usually taken with :func:`take_snapshot`.
+
+    :param interfaces: Map of device names to dictionaries, as returned by
+     :func:`topology_lib_ip.library.show_interfaces`.
+    :param float timestamp: Time of the snapshot, in seconds. If ``None``,
+     the current time of a monotonic clock.
+    :var OrderedDict interfaces: The interfaces of the snapshot.
+    :var float timestamp: Time of the snapshot.
+    """
+
+    def __init__(self, interfaces, timestamp=None):
+        self.interfaces = interfaces
+        self.timestamp = monotonic() if timestamp is None else timestamp
+
+        self._states = OrderedDict(
+            (dev, _state(d)) for dev, d in interfaces.items()
+        )
+        self._counters = {
+            dev: _counters(d) for dev, d in interfaces.items()
+        }
+
+    def __len__(self):
+        return len(self.interfaces)
+
+    def __iter__(self):
+        return iter(self.interfaces)
+
+    def __contains__(self, dev):
+        return dev in self.interfaces
+
+    def __getitem__(self, dev):
+        return self.interfaces[dev]
+
+    def diff(self, previous, threshold=0):
+        """
+        Report the interfaces that changed since an earlier snapshot.
+
+        :param InterfaceSnapshot previous: The earlier snapshot.
+        :param threshold: Minimum increment of a counter to report it, as an
+         integer for all the counters or a dictionary of counter names to
+         integers. Counters missing from the dictionary are not reported.
+         Increments are computed with
+         :func:`topology_lib_ip.stats.counter_delta`.
+        :rtype: OrderedDict
+        :return: A dictionary mapping the device names of the interfaces
+         that changed to an :class:`InterfaceChange`, in the order of this
+         snapshot followed by the removed interfaces.
+        """
+        if hasattr(threshold, 'items'):
+            thresholds = [
+                (index, key, threshold[key])
+                for index, key in enumerate(COUNTERS) if key in threshold
+            ]
+        else:
+            thresholds = [
+                (index, key, threshold) for index, key in enumerate(COUNTERS)
+            ]
+
+        result = OrderedDict()
+        states = previous._states
+
+        for dev, state in self._states.items():
+            previous_state = states.get(dev)
+            if previous_state is None:
+                result[dev] = InterfaceChange(dev, 'added', {})
+                continue
+
+            fields = {}
+            if state != previous_state:
+                for name, old, new in zip(FIELDS, previous_state, state):
+                    if old != new:
+                        fields[name] = (old, new)
+
+            old = previous._counters[dev]
+            new = self._counters[dev]
+            if old != new and old is not None and new is not None:
+                for index, key, minimum in thresholds:
+                    delta = counter_delta(old[index], new[index])
+                    if delta and delta >= minimum:
+                        fields[key] = (old[index], new[index])
+
+            if fields:
+                result[dev] = InterfaceChange(dev, 'changed', fields)
+
+        for dev in states:
+            if dev not in self._states:
+                result[dev] = InterfaceChange(dev, 'removed', {})
+
+        return result
+
+
+def take_snapshot(enode, devs=None, shell=None, use_json=None):
+    """
+    Take a snapshot of the interfaces of a node.
+
+    The interfaces are read at once with
+    :func:`topology_lib_ip.library.show_interfaces`.
+
+    :param enode: Engine node to communicate with.
+    :type enode: topology.platforms.base.BaseNode
+    :param devs: Unix network device names to include in the snapshot. If
+     ``None``, include all the interfaces of the node.
+    :type devs: list or None
+    :param str shell: Shell name to execute commands. If ``None``, use the
+     Engine Node default shell.
+    :param bool use_json: Force (``True``) or disable (``False``) the use of
+     the JSON output. If ``None``, use it when the node supports it.
+    :rtype: InterfaceSnapshot
+    """
+    timestamp = monotonic()
+    return InterfaceSnapshot(
+        show_interfaces(enode, devs=devs, shell=shell, use_json=use_json),
+        timestamp=timestamp
+    )
+
+
+__all__ = ['FIELDS', 'InterfaceChange', 'InterfaceSnapshot', 'take_snapshot']
@@ -0,0 +1,149 @@
+# -*- coding: utf-8 -*-
+#
+# Copyright (C) 2015-2016 Hewlett Packard Enterprise Development LP
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#   http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing,
+# software distributed under the License is distributed on an
+# "AS IS" BASIS, WITHOUT WARRANTIES OR CONDITIONS OF ANY
+# KIND, either express or implied.  See the License for the
+# specific language governing permissions and limitations
+# under the License.
+
+"""
+topology_lib_ip interface counters helpers.
+"""
+
+from __future__ import unicode_literals, absolute_import
+from __future__ import print_function, division
+
+from array import array
+from collections import OrderedDict
+
+
+# Counters reported by 'ip -s link', in output order
+COUNTERS = (
+    'rx_bytes', 'rx_packets', 'rx_errors', 'rx_dropped', 'rx_overrun',
+    'rx_mcast', 'tx_bytes', 'tx_packets', 'tx_errors', 'tx_dropped',
+    'tx_carrier', 'tx_collisions'
+)
+
+# Array type code of an unsigned 64 bits integer. Python 2 lacks 'Q', but
+# 'L' is 64 bits wide on the LP64 platforms where the nodes run.
+try:
+    array(str('Q'))
+    _COUNTER_TYPECODE = str('Q')
+except ValueError:
+    _COUNTER_TYPECODE = str('L')
+
+
+def counter_delta(previous, current):
+    """
+    Compute the increment of a counter between two samples.
+
+    A decreasing counter is assumed to have wrapped around once: at 32 bits if
+    the previous value fits in 32 bits (as reported by old kernels and
+    drivers), at 64 bits otherwise. A counter reset, for example because the
+    interface was recreated, is indistinguishable from a wrap around.
+
+    :param int previous: Value of the counter in the previous sample.
+    :param int current: Value of the counter in the current sample.
+    :rtype: int
+    """
+    if current >= previous:
+        return current - previous
+    if previous < 2 ** 32:
+        return current + 2 ** 32 - previous
+    return current + 2 ** 64 - previous
+
+
+class StatsBuffer(object):
+    """
+    Compact history of interface counters samples.
+
+    Timestamps and counters are kept in :class:`array.array` columns, one per
+    device and counter, so long captures only take a few bytes per value.
+
+    Samples produced by :func:`topology_lib_ip.library.sample_stats` are
+    recorded by passing a buffer in its ``buffer`` argument.
+    """
+
+    def __init__(self):
+        self._timestamps = OrderedDict()
+        self._counters = {}
+
+    def __len__(self):
+        return max([len(ts) for ts in self._timestamps.values()] or [0])
+
+    @property
+    def devs(self):
+        """
+        List of the devices recorded in the buffer.
+        """
+        return list(self._timestamps)
+
+    def append(self, timestamp, counters):
+        """
+        Record the counters of a sample.
+
+        :param float timestamp: Time of the sample, in seconds.
+        :param dict counters: Map of device names to dictionaries with the
+         values of the counters listed in :data:`COUNTERS`.
+        """
+        for dev, values in counters.items():
+            if dev not in self._timestamps:
+                self._timestamps[dev] = array(str('d'))
+                self._counters[dev] = [
+                    array(_COUNTER_TYPECODE) for _ in COUNTERS
+                ]
+
+            self._timestamps[dev].append(timestamp)
+            for column, key in zip(self._counters[dev], COUNTERS):
+                column.append(values[key])
+
+    def timestamps(self, dev):
+        """
+        Timestamps of the samples recorded for a device.
+
+        :param str dev: Device name.
+        :rtype: array.array
+        """
+        return self._timestamps[dev]
+
+    def counters(self, dev, key):
+        """
+        Values of a counter recorded for a device.
+
+        :param str dev: Device name.
+        :param str key: Counter name, one of :data:`COUNTERS`.
+        :rtype: array.array
+        """
+        return self._counters[dev][COUNTERS.index(key)]
+
+    def rates(self, dev, key):
+        """
+        Per second rates of a counter between consecutive samples.
+
+        :param str dev: Device name.
+        :param str key: Counter name, one of :data:`COUNTERS`.
+        :rtype: array.array
+        :return: An array of floats, one item shorter than the samples.
+        """
+        timestamps = self._timestamps[dev]
+        values = self.counters(dev, key)
+        rates = array(str('d'))
+
+        for index in range(1, len(values)):
+            elapsed = timestamps[index] - timestamps[index - 1]
+            delta = counter_delta(values[index - 1], values[index])
+            rates.append(delta / elapsed if elapsed > 0 else 0.0)
+
+        return rates
+
+
+__all__ = ['COUNTERS', 'counter_delta', 'StatsBuffer']
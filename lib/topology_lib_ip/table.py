@@ -0,0 +1,220 @@
+# -*- coding: utf-8 -*-
+#
+# Copyright (C) 2015-2016 Hewlett Packard Enterprise Development LP
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#   http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing,
+# software distributed under the License is distributed on an
+# "AS IS" BASIS, WITHOUT WARRANTIES OR CONDITIONS OF ANY
+# KIND, either express or implied.  See the License for the
+# specific language governing permissions and limitations
+# under the License.
+
+"""
+topology_lib_ip columnar interface counters of several nodes.
+
+:func:`collect_stats_table` gathers the counters of every interface of a set
+of nodes in a :class:`StatsTable`, one row per interface. Counters are kept
+in :class:`array.array` columns, which expose the buffer protocol, so they
+can be wrapped without copies by ``numpy.frombuffer`` or Arrow arrays when
+those are available.
+"""
+
+from __future__ import unicode_literals, absolute_import
+from __future__ import print_function, division
+
+from array import array
+from collections import OrderedDict
+from heapq import nlargest
+
+from .capabilities import _node_name
+from .library import _show_link_stats
+from .parallel import run_parallel
+from .stats import COUNTERS, _COUNTER_TYPECODE
+
+
+class StatsTable(object):
+    """
+    Interface counters of several nodes, in columns.
+
+    Rows are grouped by node, in the order the nodes were added, and the
+    interfaces of a node are in the order listed by the node.
+
+    :var list nodes: Names of the nodes in the table.
+    :var OrderedDict errors: Map of the names of the nodes whose counters
+     couldn't be collected to the exception raised.
+    """
+
+    def __init__(self):
+        self.nodes = []
+        self.errors = OrderedDict()
+        self._offsets = [0]
+        self._node_index = array(str('l'))
+        self._devs = []
+        self._counters = OrderedDict(
+            (key, array(_COUNTER_TYPECODE)) for key in COUNTERS
+        )
+
+    def __len__(self):
+        return len(self._devs)
+
+    @property
+    def columns(self):
+        """
+        Names of the columns of the table: ``node``, ``dev`` and the counters
+        listed in :data:`topology_lib_ip.stats.COUNTERS`.
+        """
+        return ('node', 'dev') + COUNTERS
+
+    def append(self, node, counters):
+        """
+        Add the interfaces of a node.
+
+        :param str node: Name of the node.
+        :param dict counters: Map of device names to dictionaries with the
+         values of the counters listed in :data:`COUNTERS`. Missing counters
+         are recorded as 0.
+        """
+        index = len(self.nodes)
+        self.nodes.append(node)
+
+        self._devs.extend(counters)
+        self._node_index.extend([index] * len(counters))
+        for key, column in self._counters.items():
+            column.extend(values.get(key, 0) for values in counters.values())
+        self._offsets.append(len(self._devs))
+
+    def column(self, name):
+        """
+        Values of a column.
+
+        :param str name: Column name, one of :attr:`columns`.
+        :return: A list for ``node`` and ``dev``, an :class:`array.array` of
+         unsigned integers for the counters.
+        """
+        if name == 'node':
+            return [self.nodes[index] for index in self._node_index]
+        if name == 'dev':
+            return self._devs
+        if name not in self._counters:
+            raise ValueError('Unknown column {}'.format(name))
+        return self._counters[name]
+
+    def sum(self, key, by_node=False):
+        """
+        Sum a counter over all the interfaces.
+
+        :param str key: Counter name.
+        :param bool by_node: Sum the interfaces of each node separately.
+        :return: The sum, or an OrderedDict mapping each node name to its
+         sum if ``by_node`` is set.
+        """
+        column = self.column(key)
+        if not by_node:
+            return sum(column)
+        return OrderedDict(
+            (node, sum(column[start:end])) for node, start, end in zip(
+                self.nodes, self._offsets, self._offsets[1:]
+            )
+        )
+
+    def top(self, key, count=10):
+        """
+        Interfaces with the highest values of a counter.
+
+        :param str key: Counter name.
+        :param int count: Number of interfaces to return.
+        :rtype: list
+        :return: A list of ``(node, dev, value)`` tuples, highest first.
+        """
+        column = self.column(key)
+        return [
+            (self.nodes[self._node_index[row]], self._devs[row], column[row])
+            for row in nlargest(
+                count, range(len(column)), key=column.__getitem__
+            )
+        ]
+
+    def rows(self):
+        """
+        Iterate over the rows of the table.
+
+        :return: An iterator of tuples with the values of :attr:`columns`.
+        """
+        return zip(
+            self.column('node'), self._devs, *self._counters.values()
+        )
+
+    def to_columns(self):
+        """
+        Export the table as a mapping of column names to columns.
+
+        The counter columns are the arrays of the table, not copies.
+
+        :rtype: OrderedDict
+        """
+        return OrderedDict((name, self.column(name)) for name in self.columns)
+
+    def to_csv(self, fileobj):
+        """
+        Write the table in CSV format, with a header line.
+
+        :param fileobj: Text file object to write to.
+        """
+        fileobj.write(','.join(self.columns) + '\n')
+        for row in self.rows():
+            fileobj.write(','.join(str(value) for value in row) + '\n')
+
+
+def collect_stats_table(enodes, max_workers=8, shell=None, use_json=None):
+    """
+    Collect the counters of every interface of several nodes in a table.
+
+    A single ``ip -s link show`` command (``ip -j -s link show`` if the node
+    supports JSON output) is sent to each node, and up to ``max_workers``
+    nodes are queried at once as described in
+    :func:`topology_lib_ip.parallel.run_parallel`.
+
+    ::
+
+        table = collect_stats_table([hs1, hs2, sw1])
+        print(table.sum('rx_bytes', by_node=True))
+        print(table.top('rx_dropped', 5))
+
+    :param enodes: Engine nodes to query, or a mapping of names to engine
+     nodes. Nodes are named after their ``identifier`` otherwise.
+    :param int max_workers: Maximum number of nodes queried at once.
+    :param str shell: Shell name to execute commands. If ``None``, use the
+     Engine Node default shell.
+    :param bool use_json: Force (``True``) or disable (``False``) the use of
+     the JSON output. If ``None``, use it when the node supports it.
+    :rtype: StatsTable
+    :return: The table. Nodes whose counters couldn't be collected are
+     listed in its ``errors`` attribute instead.
+    """
+    if hasattr(enodes, 'items'):
+        names = OrderedDict((enode, name) for name, enode in enodes.items())
+    else:
+        names = OrderedDict((enode, _node_name(enode)) for enode in enodes)
+
+    operation = (_show_link_stats, (), {'shell': shell, 'use_json': use_json})
+    results = run_parallel(
+        ((enode, [operation]) for enode in names), max_workers=max_workers
+    )
+
+    table = StatsTable()
+    for enode, result in results.items():
+        if result.ok:
+            table.append(names[enode], result.results[0])
+        else:
+            table.errors[names[enode]] = result.exception
+
+    return table
+
+
+__all__ = ['StatsTable', 'collect_stats_table']
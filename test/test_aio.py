@@ -0,0 +1,228 @@
+# -*- coding: utf-8 -*-
+#
+# Copyright (C) 2015-2016 Hewlett Packard Enterprise Development LP
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#   http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing,
+# software distributed under the License is distributed on an
+# "AS IS" BASIS, WITHOUT WARRANTIES OR CONDITIONS OF ANY
+# KIND, either express or implied.  See the License for the
+# specific language governing permissions and limitations
+# under the License.
+
+"""
+Test suite for module topology_lib_ip.aio.
+"""
+
+from asyncio import new_event_loop
+from inspect import iscoroutinefunction, signature
+
+import pytest
+
+from topology_lib_ip import aio, library
+from topology_lib_ip.library import BatchError
+
+from test_capabilities import IP_V_PROBE
+from test_library import (
+    MockNode, IP_J_S_D_ADDR_SHOW, IP_S_LINK_LIST, IP_S_LINK_LIST_LO,
+    IP_O_MONITOR, ShellNode
+)
+
+
+class AsyncMockNode(MockNode):
+    """
+    Engine node double with a coroutine ``__call__``.
+    """
+
+    async def __call__(self, cmd, shell=None):
+        return MockNode.__call__(self, cmd, shell=shell)
+
+
+class AsyncShellNode(ShellNode):
+    """
+    :class:`test_library.ShellNode` with a coroutine ``__call__``.
+    """
+
+    async def __call__(self, cmd, shell=None):
+        return ShellNode.__call__(self, cmd, shell=shell)
+
+
+def run(coroutine):
+    loop = new_event_loop()
+    try:
+        return loop.run_until_complete(coroutine)
+    finally:
+        loop.close()
+
+
+def test_all():
+    assert set(library.__all__) <= set(aio.__all__)
+    for name in library.__all__:
+        func = getattr(aio, name)
+        assert 'netns' in signature(func).parameters, name
+        if name not in ('ip_batch', 'sample_stats', 'monitor'):
+            assert iscoroutinefunction(func), name
+            assert ':param str netns:' in func.__doc__, name
+
+
+@pytest.mark.parametrize('node_class', [MockNode, AsyncMockNode])
+def test_interface(node_class):
+    enode = node_class()
+    run(aio.interface(enode, '1', addr='10.0.0.1/24', up=True))
+
+    assert enode.sent == [
+        'ip addr add 10.0.0.1/24 dev eth1',
+        'ip link set dev eth1 up'
+    ]
+
+
+@pytest.mark.parametrize('node_class', [MockNode, AsyncMockNode])
+def test_show_interfaces_json(node_class):
+    enode = node_class({'ip -j -s -d addr show': IP_J_S_D_ADDR_SHOW})
+
+    interfaces = run(aio.show_interfaces(enode))
+    assert interfaces == library.show_interfaces(
+        MockNode({'ip -j -s -d addr show': IP_J_S_D_ADDR_SHOW})
+    )
+    assert enode.sent == ['ip -j -s -d addr show']
+
+
+def test_ip_batch():
+    enode = AsyncMockNode({
+        'ip -force -batch': (
+            'RTNETLINK answers: File exists\n'
+            'Command failed -:2\n'
+        )
+    })
+
+    async def configure():
+        async with aio.ip_batch(enode) as batch:
+            batch.add_link_type_vlan('1', 'eth1.10', '10')
+            batch.interface('eth1.10', addr='10.0.0.1/24')
+
+    with pytest.raises(BatchError) as excinfo:
+        run(configure())
+
+    assert len(enode.sent) == 1
+    assert excinfo.value.failures[0].command == \
+        'addr add 10.0.0.1/24 dev eth1.10'
+    assert enode.ports['eth1.10'] == 'eth1.10'
+
+
+def test_sample_stats():
+    enode = AsyncMockNode({
+        'ip -s link show': IP_S_LINK_LIST_LO + IP_S_LINK_LIST
+    })
+
+    async def collect():
+        return [
+            sample async for sample in aio.sample_stats(
+                enode, ['eth0', 'lo'], interval=0, count=2, use_json=False
+            )
+        ]
+
+    samples = run(collect())
+    assert len(samples) == 2
+    assert samples[1]['deltas']['eth0']['tx_bytes'] == 0
+    assert enode.sent == ['ip -s link show'] * 2
+
+
+def test_monitor():
+    enode = AsyncMockNode({'timeout 0.5 ip -o monitor': IP_O_MONITOR})
+
+    async def collect():
+        events = []
+        async for event in aio.monitor(enode, events=['link'], window=0.5):
+            events.append(event)
+            if len(events) == 2:
+                break
+        return events
+
+    events = run(collect())
+    assert [(event.kind, event.dev) for event in events] == [
+        ('link', 'v1'), ('link', 'v1')
+    ]
+
+
+def test_capabilities():
+    enode = AsyncMockNode({'ip -V': IP_V_PROBE})
+
+    record = run(aio.capabilities(enode))
+    assert run(aio.capabilities(enode)) is record
+    assert enode.sent == [library._CAPABILITIES_CMD]
+
+    async def configure():
+        async with aio.ip_batch(enode) as batch:
+            batch.interface('1', up=True)
+            batch.add_route('default', '192.0.2.1')
+
+    run(configure())
+    assert enode.sent[1:] == [
+        'ip link set dev eth1 up',
+        'ip route add default via 192.0.2.1'
+    ]
+
+
+def test_pipelining():
+    enode = AsyncShellNode()
+
+    run(aio.enable_pipelining(enode))
+    run(aio.interface(enode, '1', addr='10.0.0.1/24'))
+    run(aio.interface(enode, '1', up=True))
+    assert enode.sent == []
+
+    run(aio.disable_pipelining(enode))
+    assert len(enode.sent) == 1
+    assert enode.sent[0].startswith(
+        'ip addr add 10.0.0.1/24 dev eth1 && printf '
+    )
+    assert enode not in library._PIPELINES
+
+    # Commands in a namespace are sent after the queued ones
+    run(aio.enable_pipelining(enode))
+    run(aio.interface(enode, '1', up=False))
+    run(aio.interface(enode, '1', up=True, netns='ns1'))
+    assert enode.sent[1].startswith('ip link set dev eth1 down && printf ')
+    assert enode.sent[2] == 'ip -n ns1 link set dev eth1 up'
+
+
+def test_pipelining_ip_batch():
+    enode = AsyncShellNode()
+
+    async def configure():
+        await aio.enable_pipelining(enode)
+        await aio.add_link_type_vlan(enode, '1', 'eth1.10', '10')
+        async with aio.ip_batch(enode) as batch:
+            batch.interface('eth1.10', addr='10.0.0.1/24')
+        await aio.disable_pipelining(enode)
+
+    run(configure())
+    assert len(enode.sent) == 2
+    assert enode.sent[0].startswith(
+        'ip link add link eth1 name eth1.10 type vlan id 10 && printf '
+    )
+    assert enode.sent[1].startswith('ip -force -batch')
+
+
+def test_netns():
+    enode = AsyncMockNode()
+
+    run(aio.interface(enode, '1', addr='10.0.0.1/24', netns='ns1'))
+    run(aio.interface(enode, '1', up=True, netns='ns1'))
+    assert enode.sent == [
+        'ip -n ns1 addr add 10.0.0.1/24 dev eth1',
+        'ip -n ns1 link set dev eth1 up'
+    ]
+
+
+def test_wrap():
+    enode = AsyncMockNode()
+    interface = aio._wrap('interface')
+
+    run(interface(enode, '1', up=False))
+    assert enode.sent == ['ip link set dev eth1 down']
@@ -0,0 +1,53 @@
+# -*- coding: utf-8 -*-
+#
+# Copyright (C) 2015-2016 Hewlett Packard Enterprise Development LP
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#   http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing,
+# software distributed under the License is distributed on an
+# "AS IS" BASIS, WITHOUT WARRANTIES OR CONDITIONS OF ANY
+# KIND, either express or implied.  See the License for the
+# specific language governing permissions and limitations
+# under the License.
+
+"""
+Test suite for module topology_lib_ip.cache.
+"""
+
+from __future__ import unicode_literals, absolute_import
+from __future__ import print_function, division
+
+from topology_lib_ip.cache import InterfaceCache
+
+
+def test_interface_cache():
+    cache = InterfaceCache(ttl=None, maxsize=2)
+    cache.put('eth0', {'state': 'UP'})
+    cache.put('eth1', {'state': 'DOWN'})
+
+    # Results are copies
+    cache.get('eth0')['state'] = 'DOWN'
+    assert cache.get('eth0') == {'state': 'UP'}
+
+    # eth1 is the least recently used
+    cache.put('eth2', {'state': 'UP'})
+    assert 'eth1' not in cache
+    assert list(cache.get_many(['eth2', 'eth0'])) == ['eth2', 'eth0']
+    assert cache.get_many(['eth0', 'eth1']) is None
+
+    cache.invalidate('eth0')
+    assert len(cache) == 1
+    cache.invalidate()
+    assert len(cache) == 0
+
+
+def test_interface_cache_ttl():
+    cache = InterfaceCache(ttl=0)
+    cache.put('eth0', {'state': 'UP'})
+
+    assert cache.get('eth0') is None
@@ -0,0 +1,90 @@
+# -*- coding: utf-8 -*-
+#
+# Copyright (C) 2015-2016 Hewlett Packard Enterprise Development LP
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#   http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing,
+# software distributed under the License is distributed on an
+# "AS IS" BASIS, WITHOUT WARRANTIES OR CONDITIONS OF ANY
+# KIND, either express or implied.  See the License for the
+# specific language governing permissions and limitations
+# under the License.
+
+
+"""
+Test suite for module topology_lib_ip.capabilities.
+"""
+
+from __future__ import unicode_literals, absolute_import
+from __future__ import print_function, division
+
+from topology_lib_ip import capabilities as capabilities_module
+from topology_lib_ip.capabilities import (
+    Capabilities, get_capabilities, load_capabilities, save_capabilities
+)
+from topology_lib_ip.library import capabilities, show_interface, ip_batch
+
+from test_library import MockNode, IP_ADDR_LIST, IP_S_LINK_LIST
+
+
+IP_V_PROBE = """\
+ip utility, iproute2-ss130716
+capability -d
+"""
+
+
+def test_capabilities():
+    enode = MockNode({'ip -V': IP_V_PROBE})
+
+    record = capabilities(enode)
+    assert record == Capabilities(
+        version='ss130716', json=False, brief=False, batch=False,
+        details=True
+    )
+    assert capabilities(enode) is record
+    assert len(enode.sent) == 1
+
+    # No JSON attempt, and commands sent one by one
+    enode.responses.update({
+        'ip addr list': IP_ADDR_LIST,
+        'ip -s link list': IP_S_LINK_LIST
+    })
+    assert show_interface(enode, 'eth0')['rx_bytes'] == 414194
+    with ip_batch(enode) as batch:
+        batch.interface('1', up=True)
+        batch.add_route('default', '192.0.2.1')
+    assert enode.sent[1:] == [
+        'ip addr list dev eth0',
+        'ip -s link list dev eth0',
+        'ip link set dev eth1 up',
+        'ip route add default via 192.0.2.1'
+    ]
+
+
+def test_capabilities_unknown():
+    enode = MockNode()
+
+    assert not capabilities(enode).probed
+    assert get_capabilities(enode) == Capabilities()
+
+
+def test_load_save_capabilities(tmpdir, monkeypatch):
+    monkeypatch.setattr(capabilities_module, '_LOADED', {})
+    path = str(tmpdir.join('capabilities.json'))
+    enode = MockNode({'ip -V': IP_V_PROBE})
+    enode.identifier = 'hs1'
+    capabilities(enode)
+
+    save_capabilities(path, [enode])
+    records = load_capabilities(path)
+    assert records == {'hs1': get_capabilities(enode)}
+
+    other = MockNode()
+    other.identifier = 'hs1'
+    assert capabilities(other).version == 'ss130716'
+    assert other.sent == []
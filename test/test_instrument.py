@@ -0,0 +1,79 @@
+# -*- coding: utf-8 -*-
+#
+# Copyright (C) 2015-2016 Hewlett Packard Enterprise Development LP
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#   http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing,
+# software distributed under the License is distributed on an
+# "AS IS" BASIS, WITHOUT WARRANTIES OR CONDITIONS OF ANY
+# KIND, either express or implied.  See the License for the
+# specific language governing permissions and limitations
+# under the License.
+
+
+"""
+Test suite for module topology_lib_ip.instrument.
+"""
+
+from __future__ import unicode_literals, absolute_import
+from __future__ import print_function, division
+
+from topology_lib_ip import library
+from topology_lib_ip.instrument import (
+    enable_instrumentation, disable_instrumentation, get_recorder,
+    _command_type
+)
+
+from test_library import MockNode, IP_ADDR_LIST, IP_S_LINK_LIST
+
+
+def test_command_type():
+    assert _command_type('ip -s link list dev eth0') == 'ip -s link list'
+    assert _command_type('ip -4 route add 10.0.0.0/8 via 192.0.2.1') == \
+        'ip -4 route add'
+    assert _command_type('ip -force -batch - <<IP_BATCH_EOF\nlink') == \
+        'ip -force -batch -'
+    assert _command_type('timeout 1 ip -o monitor label link') == \
+        'ip -o monitor label'
+
+
+def test_instrumentation():
+    send = library._send
+    enode = MockNode({
+        'ip addr list': IP_ADDR_LIST,
+        'ip -s link list': IP_S_LINK_LIST
+    })
+    enode.identifier = 'hs1'
+    measurements = []
+
+    recorder = enable_instrumentation()
+    try:
+        assert get_recorder() is recorder
+        recorder.add_callback(measurements.append)
+        library.show_interface(enode, 'eth0', use_json=False)
+        library.interface(enode, '1', addr='10.0.0.1/24')
+    finally:
+        assert disable_instrumentation() is recorder
+
+    assert library._send is send
+    assert get_recorder() is None
+
+    histograms = recorder.histograms()
+    assert histograms[('hs1', 'command', 'ip addr list')].count == 1
+    assert histograms[('hs1', 'command', 'ip addr add')].count == 1
+    assert histograms[('hs1', 'parse', 'parse_ip_addr_show')].count == 1
+    assert histograms[('hs1', 'validate', 'ip_interface')].count == 1
+    assert len(measurements) == sum(
+        histogram.count for histogram in histograms.values()
+    )
+
+    row = recorder.export()[0]
+    assert row['p50'] <= row['p99'] <= row['max']
+    summary = recorder.summary().splitlines()
+    assert summary[0].split()[:3] == ['node', 'kind', 'name']
+    assert len(summary) == len(histograms) + 1
@@ -0,0 +1,907 @@
+# -*- coding: utf-8 -*-
+#
+# Copyright (C) 2015-2016 Hewlett Packard Enterprise Development LP
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#   http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing,
+# software distributed under the License is distributed on an
+# "AS IS" BASIS, WITHOUT WARRANTIES OR CONDITIONS OF ANY
+# KIND, either express or implied.  See the License for the
+# specific language governing permissions and limitations
+# under the License.
+
+"""
+Test suite for module topology_lib_ip.library.
+"""
+
+from __future__ import unicode_literals, absolute_import
+from __future__ import print_function, division
+
+from itertools import islice
+
+import pytest
+
+from topology_lib_ip.library import (
+    _parse_ip_addr_show, _parse_ip_monitor, interface, add_link_type_vlan,
+    ip_batch, BatchError, show_interface, show_interfaces, sample_stats,
+    apply_state, show_routes, add_routes, add_link_type_vlans,
+    remove_link_type_vlans, monitor, wait_for, WaitTimeout,
+    list_interfaces_brief, show_neighbors, add_neighbors, add_route,
+    enable_pipelining, flush_pipeline, disable_pipelining, PipelineError,
+    show_interfaces_all_netns
+)
+from topology_lib_ip.cache import enable_cache
+from topology_lib_ip.stats import StatsBuffer
+
+
+IP_ADDR_LIST = """\
+4: eth0: <BROADCAST,MULTICAST,UP,LOWER_UP> mtu 1400 qdisc pfifo_fast state UP \
+group default qlen 1000
+    link/ether 02:fc:00:00:00:01 brd ff:ff:ff:ff:ff:ff
+    inet 192.0.2.2/24 brd 192.0.2.255 scope global eth0
+       valid_lft forever preferred_lft forever
+    inet6 fd00::2/64 scope global nodad
+       valid_lft forever preferred_lft forever
+    inet6 fe80::fc:ff:fe00:1/64 scope link
+       valid_lft forever preferred_lft forever
+"""
+
+IP_S_LINK_LIST = """\
+4: eth0: <BROADCAST,MULTICAST,UP,LOWER_UP> mtu 1400 qdisc pfifo_fast state UP \
+mode DEFAULT group default qlen 1000
+    link/ether 02:fc:00:00:00:01 brd ff:ff:ff:ff:ff:ff
+    RX:  bytes packets errors dropped  missed   mcast
+        414194      92      0       0       0       0
+    TX:  bytes packets errors dropped carrier collsns
+         18090      91      0       0       0       0
+"""
+
+IP_ADDR_LIST_LO = """\
+1: lo: <LOOPBACK,UP,LOWER_UP> mtu 65536 qdisc noqueue state UNKNOWN group \
+default qlen 1000
+    link/loopback 00:00:00:00:00:00 brd 00:00:00:00:00:00
+    inet 127.0.0.1/8 scope host lo
+       valid_lft forever preferred_lft forever
+    inet6 ::1/128 scope host
+       valid_lft forever preferred_lft forever
+"""
+
+IP_S_LINK_LIST_LO = """\
+1: lo: <LOOPBACK,UP,LOWER_UP> mtu 65536 qdisc noqueue state UNKNOWN mode \
+DEFAULT group default qlen 1000
+    link/loopback 00:00:00:00:00:00 brd 00:00:00:00:00:00
+    RX:  bytes packets errors dropped  missed   mcast
+       3263753     520      0       0       0       0
+    TX:  bytes packets errors dropped carrier collsns
+       3263753     520      0       0       0       0
+"""
+
+IP_J_S_D_ADDR_SHOW = (
+    '[{"ifindex":4,"ifname":"eth0","flags":["BROADCAST","MULTICAST",'
+    '"UP","LOWER_UP"],"mtu":1400,"qdisc":"pfifo_fast",'
+    '"operstate":"UP","group":"default","txqlen":1000,'
+    '"link_type":"ether","address":"02:fc:00:00:00:01",'
+    '"broadcast":"ff:ff:ff:ff:ff:ff","addr_info":[{"family":"inet",'
+    '"local":"192.0.2.2","prefixlen":24,"broadcast":"192.0.2.255",'
+    '"scope":"global","label":"eth0"},{"family":"inet6",'
+    '"local":"fd00::2","prefixlen":64,"scope":"global",'
+    '"nodad":true},{"family":"inet6","local":"fe80::fc:ff:fe00:1",'
+    '"prefixlen":64,"scope":"link"}],"stats64":{"rx":{"bytes":414194,'
+    '"packets":92,"errors":0,"dropped":0,"over_errors":0,'
+    '"multicast":0},"tx":{"bytes":18090,"packets":91,"errors":0,'
+    '"dropped":0,"carrier_errors":0,"collisions":0}}}]'
+)
+
+IP_J_4_ROUTE_SHOW = (
+    '[{"dst":"default","gateway":"192.0.2.254","dev":"eth0","flags":[]},'
+    '{"dst":"192.0.2.0/24","dev":"eth0","protocol":"kernel","scope":"link",'
+    '"prefsrc":"192.0.2.2","flags":[]}]'
+)
+
+IP_4_ROUTE_SHOW = """\
+default via 192.0.2.254 dev eth0
+10.0.0.0/8 proto static metric 20
+\tnexthop via 192.0.2.10 dev eth0 weight 1
+\tnexthop via 192.0.2.11 dev eth0 weight 2
+10.1.0.0/16 via 192.0.2.12 dev eth0 proto static metric 20
+10.1.2.3 via 192.0.2.13 dev eth0
+blackhole 10.2.0.0/16 proto static
+192.0.2.0/24 dev eth0 proto kernel scope link src 192.0.2.2
+"""
+
+IP_O_MONITOR = """\
+[ADDR]2: v1    inet 10.8.0.1/24 scope global v1\\       valid_lft forever \
+preferred_lft forever
+[ROUTE]local 10.8.0.1 dev v1 table local proto kernel scope host src 10.8.0.1
+[LINK]2: v1@v0: <BROADCAST,MULTICAST> mtu 1500 qdisc noqueue state DOWN \
+group default \\    link/ether c6:8e:66:0d:13:f5 brd ff:ff:ff:ff:ff:ff
+[ROUTE]Deleted fd02::/64 via fd01::2 dev v1 metric 1024 pref medium
+[ADDR]Deleted 3: v0    inet6 fd01::1/64 scope global tentative \\       \
+valid_lft forever preferred_lft forever
+[NEIGH]192.0.2.1 dev v0 lladdr 02:fc:00:00:00:02 REACHABLE
+"""
+
+IP_BR_LINK_ADDR = """\
+lo               UNKNOWN        00:00:00:00:00:00 <LOOPBACK,UP,LOWER_UP>
+eth0             UP             02:fc:00:00:00:01 <BROADCAST,MULTICAST,UP>
+v1@v0            DOWN           c6:8e:66:0d:13:f5 <BROADCAST,MULTICAST>
+IP_BRIEF_ADDR
+lo               UNKNOWN        127.0.0.1/8 ::1/128
+eth0             UP             192.0.2.2/24 fd00::2/64
+v1@v0            DOWN
+"""
+
+IP_NEIGH_SHOW = """\
+192.0.2.1 dev eth0 lladdr 02:00:00:00:00:01 REACHABLE
+192.0.2.9 dev eth0 FAILED
+fe80::1 dev eth0 lladdr 02:00:00:00:00:01 router STALE
+192.0.2.1 dev eth1 lladdr 02:00:00:00:01:01 PERMANENT
+"""
+
+IP_J_NEIGH_SHOW = """\
+[{"dst":"fd00::9","lladdr":"02:00:00:00:00:09","router":null,\
+"state":["STALE"]}]
+"""
+
+
+class MockNode(object):
+    """
+    Engine node double that records the commands sent to it.
+
+    :param dict responses: Map of command prefixes to the raw output returned
+     when a command starting with that prefix is sent.
+    """
+
+    def __init__(self, responses=None, ports=None):
+        self.responses = responses or {}
+        self.ports = ports if ports is not None else {'1': 'eth1'}
+        self.sent = []
+
+    def __call__(self, cmd, shell=None):
+        self.sent.append(cmd)
+        for prefix, response in self.responses.items():
+            if cmd.startswith(prefix):
+                return response
+        return ''
+
+
+def test_interface():
+    enode = MockNode()
+    interface(enode, '1', addr='10.0.0.1/24', up=True)
+
+    assert enode.sent == [
+        'ip addr add 10.0.0.1/24 dev eth1',
+        'ip link set dev eth1 up'
+    ]
+
+
+def test_add_link_type_vlan():
+    enode = MockNode()
+    add_link_type_vlan(enode, '1', 'eth1.10', '10')
+
+    assert enode.sent == ['ip link add link eth1 name eth1.10 type vlan id 10']
+    assert enode.ports['eth1.10'] == 'eth1.10'
+
+    with pytest.raises(ValueError):
+        add_link_type_vlan(enode, '1', 'eth1.10', '10')
+
+
+def test_ip_batch():
+    enode = MockNode()
+
+    with ip_batch(enode) as batch:
+        batch.add_link_type_vlan('1', 'eth1.10', '10')
+        batch.interface('eth1.10', addr='10.0.0.1/24', up=True)
+        batch.add_route('default', '10.0.0.254')
+
+    assert enode.sent == [
+        'ip -force -batch - <<\'IP_BATCH_EOF\'\n'
+        'link add link eth1 name eth1.10 type vlan id 10\n'
+        'addr add 10.0.0.1/24 dev eth1.10\n'
+        'link set dev eth1.10 up\n'
+        'route add default via 10.0.0.254\n'
+        'IP_BATCH_EOF'
+    ]
+    assert enode.ports['eth1.10'] == 'eth1.10'
+
+
+def test_ip_batch_errors():
+    enode = MockNode({
+        'ip -force -batch': (
+            '> > > > RTNETLINK answers: File exists\n'
+            'Command failed -:2\n'
+            'RTNETLINK answers: Network is unreachable\n'
+            'Command failed -:4\n'
+        )
+    })
+
+    with pytest.raises(BatchError) as excinfo:
+        with ip_batch(enode) as batch:
+            batch.add_link_type_vlan('1', 'eth1.10', '10')
+            batch.interface('1', addr='10.0.0.1/24', up=True)
+            batch.add_route('10.1.0.0/16', '10.2.0.1')
+
+    failures = excinfo.value.failures
+    assert [failure.call for failure in failures] == [
+        "interface('1', addr='10.0.0.1/24', up=True)",
+        "add_route('10.1.0.0/16', '10.2.0.1')"
+    ]
+    assert failures[0].command == 'addr add 10.0.0.1/24 dev eth1'
+    assert failures[0].message == 'RTNETLINK answers: File exists'
+    assert enode.ports['eth1.10'] == 'eth1.10'
+
+
+def test_ip_batch_discard():
+    enode = MockNode()
+
+    with pytest.raises(RuntimeError):
+        with ip_batch(enode) as batch:
+            batch.interface('1', up=True)
+            raise RuntimeError()
+
+    assert not enode.sent
+
+
+def test_show_interface_json():
+    text_node = MockNode({
+        'ip addr list dev eth0': IP_ADDR_LIST,
+        'ip -s link list dev eth0': IP_S_LINK_LIST
+    })
+    json_node = MockNode({'ip -j -s -d addr show': IP_J_S_D_ADDR_SHOW})
+
+    expected = show_interface(text_node, 'eth0', use_json=False)
+
+    assert show_interface(json_node, 'eth0') == expected
+    assert json_node.sent == ['ip -j -s -d addr show dev eth0']
+
+
+def test_show_interface_json_fallback():
+    enode = MockNode({
+        'ip -j': 'Option "-j" is unknown, try "ip -help".',
+        'ip addr list dev eth0': IP_ADDR_LIST,
+        'ip -s link list dev eth0': IP_S_LINK_LIST
+    })
+
+    first = show_interface(enode, 'eth0')
+    assert first['inet'] == '192.0.2.2'
+    assert first['tx_bytes'] == 18090
+    assert len(enode.sent) == 3
+
+    # JSON support is not probed again
+    assert show_interface(enode, 'eth0') == first
+    assert len(enode.sent) == 5
+
+
+def test_show_interfaces():
+    enode = MockNode({
+        'ip addr show': IP_ADDR_LIST_LO + IP_ADDR_LIST,
+        'ip -s link show': IP_S_LINK_LIST_LO + IP_S_LINK_LIST
+    })
+
+    interfaces = show_interfaces(enode, use_json=False)
+    assert list(interfaces) == ['lo', 'eth0']
+    assert interfaces['lo']['inet'] == '127.0.0.1'
+    assert interfaces['lo']['rx_bytes'] == 3263753
+    assert len(enode.sent) == 2
+
+    eth0 = MockNode({
+        'ip addr list dev eth0': IP_ADDR_LIST,
+        'ip -s link list dev eth0': IP_S_LINK_LIST
+    })
+    assert interfaces['eth0'] == show_interface(eth0, 'eth0', use_json=False)
+
+    interfaces = show_interfaces(enode, devs=['eth0'], use_json=False)
+    assert list(interfaces) == ['eth0']
+
+
+def test_show_interface_cache():
+    enode = MockNode({'ip -j -s -d addr show': IP_J_S_D_ADDR_SHOW})
+    enable_cache(enode, ttl=None)
+
+    first = show_interfaces(enode)['eth0']
+    assert show_interface(enode, 'eth0') == first
+    assert show_interfaces(enode, ['eth0'])['eth0'] == first
+    assert len(enode.sent) == 1
+
+    enode.ports['1'] = 'eth0'
+    interface(enode, '1', up=True)
+    assert show_interface(enode, 'eth0') == first
+    assert enode.sent[-1] == 'ip -j -s -d addr show dev eth0'
+
+
+def test_show_interfaces_json():
+    enode = MockNode({'ip -j -s -d addr show': IP_J_S_D_ADDR_SHOW})
+
+    interfaces = show_interfaces(enode)
+    assert list(interfaces) == ['eth0']
+    assert interfaces['eth0']['tx_packets'] == 91
+    assert enode.sent == ['ip -j -s -d addr show']
+
+
+def test_parse_ip_addr_show_addresses():
+    result = _parse_ip_addr_show(
+        IP_ADDR_LIST +
+        '    inet 192.0.2.3/24 scope global secondary eth0\n'
+        '    inet 10.0.0.1 peer 10.0.0.2/31 scope global eth0\n'
+        '    inet6 2001:db8::1/128 scope global dynamic noprefixroute\n'
+    )
+
+    assert result['os_index'] == 4
+    assert result['mac_address'] == '02:fc:00:00:00:01'
+    assert result['inet'] == '192.0.2.2'
+    assert result['inet_mask'] == 24
+    assert result['inet6'] == 'fd00::2'
+    assert result['inet6_mask'] == 64
+    assert [
+        (addr['address'], addr['prefix'], addr['scope'], addr['flags'])
+        for addr in result['addresses']
+    ] == [
+        ('192.0.2.2', 24, 'global', []),
+        ('fd00::2', 64, 'global', ['nodad']),
+        ('fe80::fc:ff:fe00:1', 64, 'link', []),
+        ('192.0.2.3', 24, 'global', ['secondary']),
+        ('10.0.0.1', 31, 'global', []),
+        ('2001:db8::1', 128, 'global', ['dynamic', 'noprefixroute'])
+    ]
+
+    assert _parse_ip_addr_show('Device "eth9" does not exist.') is None
+
+
+def test_sample_stats():
+    outputs = iter([
+        IP_S_LINK_LIST_LO + IP_S_LINK_LIST,
+        IP_S_LINK_LIST_LO + IP_S_LINK_LIST.replace('18090', '20090')
+    ])
+
+    def enode(cmd, shell=None):
+        assert cmd == 'ip -s link show'
+        return next(outputs)
+
+    buffer = StatsBuffer()
+    samples = list(sample_stats(
+        enode, ['eth0', 'lo'], interval=0, count=2, buffer=buffer,
+        use_json=False
+    ))
+
+    assert len(samples) == 2
+    assert samples[0]['rates'] is None
+    assert list(samples[1]['counters']) == ['lo', 'eth0']
+    assert samples[1]['deltas']['eth0']['tx_bytes'] == 2000
+    assert samples[1]['deltas']['eth0']['rx_bytes'] == 0
+    assert samples[1]['rates']['eth0']['tx_bytes'] > 0
+    assert list(buffer.counters('eth0', 'tx_bytes')) == [18090, 20090]
+
+
+def test_apply_state():
+    enode = MockNode({
+        'ip -j addr show': (
+            IP_J_S_D_ADDR_SHOW + '\nIP_STATE_ROUTES\n' + IP_J_4_ROUTE_SHOW
+        )
+    }, ports={'1': 'eth0'})
+    spec = {
+        'interfaces': {
+            '1': {'addresses': ['192.0.2.2/24', '192.0.2.3/24'], 'up': True}
+        },
+        'vlans': {
+            'eth0.10': {'port': '1', 'vlan_id': '10', 'up': True}
+        },
+        'routes': {
+            'default': '192.0.2.1',
+            '10.0.0.0/8': '192.0.2.1',
+            '192.0.2.0/24': '192.0.2.1'
+        }
+    }
+
+    cmds = apply_state(enode, spec)
+    assert enode.sent[0] == (
+        'ip -j addr show; echo IP_STATE_ROUTES; ip -j -4 route show'
+    )
+    assert cmds[:4] == [
+        'link add link eth0 name eth0.10 type vlan id 10',
+        'addr del fd00::2/64 dev eth0',
+        'addr add 192.0.2.3/24 dev eth0',
+        'link set dev eth0.10 up'
+    ]
+    assert sorted(cmds[4:]) == [
+        'route add 10.0.0.0/8 via 192.0.2.1',
+        'route replace 192.0.2.0/24 via 192.0.2.1',
+        'route replace default via 192.0.2.1'
+    ]
+    assert len(enode.sent) == 2
+    assert enode.ports['eth0.10'] == 'eth0.10'
+
+
+def test_apply_state_unchanged():
+    enode = MockNode({'ip addr show': IP_ADDR_LIST}, ports={'1': 'eth0'})
+    spec = {
+        'interfaces': {
+            '1': {'addresses': ['192.0.2.2/24', 'fd00::2/64'], 'up': True}
+        }
+    }
+
+    assert apply_state(enode, spec) == []
+    assert apply_state(enode, spec) == []
+    assert enode.sent == ['ip -j addr show', 'ip addr show', 'ip addr show']
+
+    # Nodes with CRLF line endings
+    enode = MockNode({
+        'ip -j addr show': (
+            IP_J_S_D_ADDR_SHOW + '\nIP_STATE_ROUTES\n' + IP_J_4_ROUTE_SHOW
+        ).replace('\n', '\r\n')
+    }, ports={'1': 'eth0'})
+    spec['routes'] = {'default': '192.0.2.254'}
+    assert apply_state(enode, spec) == []
+    assert enode.sent == [
+        'ip -j addr show; echo IP_STATE_ROUTES; ip -j -4 route show'
+    ]
+
+
+def test_show_routes():
+    enode = MockNode({
+        'ip -4 route show': IP_4_ROUTE_SHOW,
+        'ip -j -4 route show': IP_J_4_ROUTE_SHOW
+    })
+
+    routes = show_routes(enode, family='inet', use_json=False)
+    assert enode.sent == ['ip -4 route show']
+    assert len(routes) == 6
+    assert [hop['via'] for hop in routes.get('10.0.0.0/8')['nexthops']] == [
+        '192.0.2.10', '192.0.2.11'
+    ]
+    assert routes.get('10.1.0.0/16')['metric'] == 20
+    assert routes.lookup('10.1.2.3')['via'] == '192.0.2.13'
+    assert routes.lookup('10.1.2.4')['via'] == '192.0.2.12'
+    assert routes.lookup('10.2.0.1')['type'] == 'blackhole'
+    assert routes.lookup('10.3.0.1')['via'] is None
+    assert routes.lookup('192.0.2.1')['src'] == '192.0.2.2'
+    assert routes.lookup('198.51.100.1')['dst'] == '0.0.0.0/0'
+    assert routes.lookup('2001:db8::1') is None
+
+    routes = show_routes(enode, family='inet')
+    assert enode.sent[-1] == 'ip -j -4 route show'
+    assert [route['dst'] for route in routes] == [
+        '0.0.0.0/0', '192.0.2.0/24'
+    ]
+    assert routes.lookup('192.0.2.1')['proto'] == 'kernel'
+
+    with pytest.raises(ValueError):
+        show_routes(enode, family='inet4')
+
+
+def test_add_routes():
+    enode = MockNode()
+
+    result = add_routes(enode, (route for route in [
+        ('10.0.0.0/24', '192.0.2.1'),
+        {'dst': '10.0.1.0/24', 'via': '192.0.2.1', 'metric': 20},
+        {'dst': 'default', 'nexthops': [
+            '192.0.2.1', {'via': '192.0.2.2', 'dev': 'eth0', 'weight': 2}
+        ]}
+    ]), replace=True, chunk_size=2)
+
+    assert result.routes == 3
+    assert result.chunks == 2
+    assert result.rate > 0
+    assert enode.sent == [
+        'ip -force -batch - <<\'IP_BATCH_EOF\'\n'
+        'route replace 10.0.0.0/24 via 192.0.2.1\n'
+        'route replace 10.0.1.0/24 via 192.0.2.1 metric 20\n'
+        'IP_BATCH_EOF',
+        'ip -force -batch - <<\'IP_BATCH_EOF\'\n'
+        'route replace default nexthop via 192.0.2.1 '
+        'nexthop via 192.0.2.2 dev eth0 weight 2\n'
+        'IP_BATCH_EOF'
+    ]
+
+
+def test_add_routes_errors():
+    enode = MockNode({
+        'ip -batch': (
+            'RTNETLINK answers: File exists\n'
+            'Command failed -:2\n'
+        )
+    })
+    routes = [('10.0.{}.0/24'.format(i), '192.0.2.1') for i in range(5)]
+
+    with pytest.raises(BatchError) as excinfo:
+        add_routes(enode, routes, chunk_size=2, force=False)
+
+    assert len(enode.sent) == 1
+    assert [failure.command for failure in excinfo.value.failures] == [
+        'route add 10.0.1.0/24 via 192.0.2.1'
+    ]
+
+
+def test_add_link_type_vlans():
+    enode = MockNode(ports={'1': 'eth1', 'eth1.20': 'eth1.20'})
+
+    with pytest.raises(ValueError):
+        add_link_type_vlans(enode, '1', [10, 20])
+    assert not enode.sent
+
+    names = add_link_type_vlans(enode, '1', [10, 11, 12], chunk_size=2)
+    assert names == ['eth1.10', 'eth1.11', 'eth1.12']
+    assert len(enode.sent) == 2
+    assert all(enode.ports[name] == name for name in names)
+
+    remove_link_type_vlans(enode, names)
+    assert enode.sent[-1] == (
+        'ip -force -batch - <<\'IP_BATCH_EOF\'\n'
+        'link del link dev eth1.10\n'
+        'link del link dev eth1.11\n'
+        'link del link dev eth1.12\n'
+        'IP_BATCH_EOF'
+    )
+    assert list(enode.ports) == ['1', 'eth1.20']
+
+
+def test_add_link_type_vlans_rollback():
+    enode = MockNode({
+        'ip -force -batch - <<\'IP_BATCH_EOF\'\nlink add': (
+            'RTNETLINK answers: File exists\n'
+            'Command failed -:2\n'
+        )
+    })
+
+    with pytest.raises(BatchError) as excinfo:
+        add_link_type_vlans(enode, '1', [10, 11, 12], name_fmt='vlan{vlan_id}')
+
+    assert excinfo.value.failures[0].call == \
+        "add_link_type_vlan('1', 'vlan11', 11)"
+    assert enode.sent[-1] == (
+        'ip -force -batch - <<\'IP_BATCH_EOF\'\n'
+        'link del link dev vlan10\n'
+        'link del link dev vlan12\n'
+        'IP_BATCH_EOF'
+    )
+    assert list(enode.ports) == ['1']
+
+
+def test_monitor():
+    enode = MockNode({'timeout 0.5 ip -o monitor': IP_O_MONITOR})
+    events = monitor(enode, window=0.5)
+
+    assert [
+        (event.kind, event.deleted, event.dev) for event in [
+            next(events) for _ in range(5)
+        ]
+    ] == [
+        ('address', False, 'v1'),
+        ('route', False, 'v1'),
+        ('link', False, 'v1'),
+        ('route', True, 'v1'),
+        ('address', True, 'v0')
+    ]
+    events.close()
+    assert enode.sent[0].startswith('(path=$(mktemp)')
+    assert enode.sent[1:] == [
+        'timeout 0.5 ip -o monitor label link address route'
+    ]
+
+    events = list(islice(monitor(enode, events=['route'], window=0.5), 2))
+    assert [event.data['dst'] for event in events] == [
+        '10.8.0.1/32', 'fd02::/64'
+    ]
+    assert events[1].data['family'] == 'inet6'
+
+    with pytest.raises(ValueError):
+        next(monitor(enode, events=['neigh']))
+
+
+class MonitorNode(MockNode):
+    """
+    Engine node double that runs ``ip monitor`` in the background, with
+    ``log`` as the file written by the process.
+    """
+
+    def __init__(self, log):
+        super(MonitorNode, self).__init__()
+        self.log = log
+
+    def __call__(self, cmd, shell=None):
+        self.sent.append(cmd)
+        if cmd.startswith('(path=$(mktemp)'):
+            return 'IP_MONITOR /tmp/tmp.monitor 42'
+        if cmd.startswith('sleep'):
+            offset = int(cmd.split('tail -n +')[1].split()[0])
+            lines = self.log[offset - 1:]
+            # A change written while the next read is sent
+            self.log.append(self.log[0])
+            return '\n'.join(lines)
+        return ''
+
+
+def test_monitor_background():
+    enode = MonitorNode(IP_O_MONITOR.splitlines())
+    events = monitor(enode, events=['address'], window=0.5)
+
+    devs = [next(events).dev for _ in range(4)]
+    events.close()
+    assert devs == ['v1', 'v0', 'v1', 'v1']
+    assert enode.sent[1:3] == [
+        'sleep 0.5; tail -n +1 /tmp/tmp.monitor; '
+        'kill -0 42 2>/dev/null || echo IP_MONITOR_EXITED',
+        'sleep 0.5; tail -n +7 /tmp/tmp.monitor; '
+        'kill -0 42 2>/dev/null || echo IP_MONITOR_EXITED'
+    ]
+    assert enode.sent[-1] == 'kill 42 2>/dev/null; rm -f /tmp/tmp.monitor'
+
+    enode = MonitorNode(['Cannot open netlink socket', 'IP_MONITOR_EXITED'])
+    with pytest.raises(AssertionError):
+        next(monitor(enode))
+    assert enode.sent[-1] == 'kill 42 2>/dev/null; rm -f /tmp/tmp.monitor'
+
+
+def test_parse_ip_monitor_route_family():
+    for line, family in [
+            ('[ROUTE]unreachable fd0a::/64 dev lo metric 1024', 'inet6'),
+            ('[ROUTE]default via inet6 fe80::1 dev eth0', 'inet'),
+            ('[ROUTE]default via fe80::1 dev eth0 metric 1024', 'inet6'),
+            ('[ROUTE]default dev wg0 metric 1024 pref medium', 'inet6'),
+            ('[ROUTE]Deleted 10.0.0.0/8 dev eth0 src 10.0.0.1', 'inet')]:
+        assert _parse_ip_monitor(line).data['family'] == family, line
+
+
+def test_wait_for():
+    states = ['UP', 'DOWN']
+
+    def enode(cmd, shell=None):
+        if cmd.startswith('timeout 0.5 ip -o monitor label link'):
+            return IP_O_MONITOR.replace('v1', 'eth0')
+        if cmd == 'ip addr list dev eth0':
+            state = states.pop() if states else 'DOWN'
+            return IP_ADDR_LIST.replace('state UP', 'state ' + state)
+        if cmd == 'ip -s link list dev eth0':
+            return IP_S_LINK_LIST
+        return ''
+
+    d = wait_for(enode, 'eth0', addr='192.0.2.2/24', window=0.5)
+    assert d['state'] == 'UP'
+
+    with pytest.raises(WaitTimeout) as excinfo:
+        wait_for(enode, 'eth0', addr='fd00::3', timeout=0, window=0.5)
+    assert excinfo.value.interface['dev'] == 'eth0'
+
+
+def test_list_interfaces_brief():
+    enode = MockNode({'ip -br': IP_BR_LINK_ADDR}, ports={'1': 'v1'})
+
+    result = list_interfaces_brief(enode)
+    assert list(result) == ['lo', 'eth0', 'v1']
+    assert result['eth0'].mac_address == '02:fc:00:00:00:01'
+    assert result['eth0'].flags == ['BROADCAST', 'MULTICAST', 'UP']
+    assert result['eth0'].addresses == ['192.0.2.2/24', 'fd00::2/64']
+    assert result['v1'].addresses == []
+    assert enode.sent == [
+        'ip -br link show; echo IP_BRIEF_ADDR; ip -br addr show'
+    ]
+
+    assert list(list_interfaces_brief(enode, state='up')) == ['eth0']
+    assert list(list_interfaces_brief(enode, labels=['1'])) == ['v1']
+
+
+def test_list_interfaces_brief_unsupported():
+    enode = MockNode({
+        'ip -br': 'Option "-br" is unknown, try "ip -help".',
+        'ip addr show': IP_ADDR_LIST,
+        'ip -s link show': IP_S_LINK_LIST
+    })
+
+    for _ in range(2):
+        result = list_interfaces_brief(enode)
+        assert result['eth0'].state == 'UP'
+        assert result['eth0'].addresses == [
+            '192.0.2.2/24', 'fd00::2/64', 'fe80::fc:ff:fe00:1/64'
+        ]
+    assert enode.sent.count(
+        'ip -br link show; echo IP_BRIEF_ADDR; ip -br addr show'
+    ) == 1
+
+
+def test_show_neighbors():
+    enode = MockNode({
+        'ip neigh show': IP_NEIGH_SHOW,
+        'ip -j neigh show dev eth0': IP_J_NEIGH_SHOW
+    })
+
+    neighbors = show_neighbors(enode, use_json=False)
+    assert enode.sent == ['ip neigh show']
+    assert list(neighbors) == [
+        ('eth0', '192.0.2.1'), ('eth0', '192.0.2.9'), ('eth0', 'fe80::1'),
+        ('eth1', '192.0.2.1')
+    ]
+    assert neighbors[('eth0', '192.0.2.1')] == {
+        'family': 'inet', 'dst': '192.0.2.1', 'dev': 'eth0',
+        'lladdr': '02:00:00:00:00:01', 'router': False,
+        'state': ['REACHABLE']
+    }
+    assert neighbors[('eth0', '192.0.2.9')]['lladdr'] is None
+    assert neighbors[('eth0', 'fe80::1')]['router']
+    assert neighbors[('eth0', 'fe80::1')]['family'] == 'inet6'
+
+    neighbors = show_neighbors(enode, dev='eth0')
+    assert enode.sent[-1] == 'ip -j neigh show dev eth0'
+    assert neighbors[('eth0', 'fd00::9')]['router']
+    assert neighbors[('eth0', 'fd00::9')]['state'] == ['STALE']
+
+
+def test_add_neighbors():
+    enode = MockNode({
+        'ip -force -batch': (
+            'RTNETLINK answers: File exists\n'
+            'Command failed -:1\n'
+        )
+    })
+
+    with pytest.raises(BatchError) as excinfo:
+        add_neighbors(enode, iter([
+            ('192.0.2.1', '02:00:00:00:00:01', 'eth0'),
+            {'dst': 'fd00::1', 'lladdr': '02:00:00:00:00:02', 'dev': 'eth0',
+             'state': 'stale', 'router': True},
+            ('192.0.2.3', '02:00:00:00:00:03', 'eth0')
+        ]), chunk_size=2)
+
+    assert len(enode.sent) == 2
+    assert enode.sent[0] == (
+        'ip -force -batch - <<\'IP_BATCH_EOF\'\n'
+        'neigh add 192.0.2.1 lladdr 02:00:00:00:00:01 dev eth0 '
+        'nud permanent\n'
+        'neigh add fd00::1 lladdr 02:00:00:00:00:02 dev eth0 nud stale '
+        'router\n'
+        'IP_BATCH_EOF'
+    )
+    assert [failure.call for failure in excinfo.value.failures] == [
+        "add_neighbors(('192.0.2.1', '02:00:00:00:00:01', 'eth0'))",
+        "add_neighbors(('192.0.2.3', '02:00:00:00:00:03', 'eth0'))"
+    ]
+
+
+class ShellNode(MockNode):
+    """
+    Engine node double that runs command lines chained with ``&&``, printing
+    the markers of the ``printf`` commands.
+    """
+
+    def __call__(self, cmd, shell=None):
+        self.sent.append(cmd)
+        output = []
+        for part in cmd.split(' && '):
+            if part.startswith('printf '):
+                _, _, token, index = part.split(' ')
+                output.append('{}_{}'.format(token, index))
+                continue
+            response = MockNode.__call__(self, part, shell=shell)
+            self.sent.pop()
+            if response:
+                output.append(response)
+                break
+        return '\n'.join(output)
+
+
+def test_pipelining():
+    enode = ShellNode({
+        'ip addr add 10.0.0.3/24': 'Error: ipv4: Address already assigned.'
+    }, ports={'1': 'eth1', '2': 'eth2'})
+    enable_pipelining(enode, max_commands=3)
+
+    interface(enode, '1', addr='10.0.0.1/24', up=True)
+    assert not enode.sent
+    add_route(enode, '10.1.0.0/16', '10.0.0.254')
+    assert len(enode.sent) == 1
+    assert enode.sent[0].startswith(
+        'ip addr add 10.0.0.1/24 dev eth1 && printf '
+    )
+
+    interface(enode, '2', addr='10.0.0.2/24')
+    assert not show_neighbors(enode, use_json=False)
+    assert enode.sent[2] == 'ip neigh show'
+
+    interface(enode, '2', addr='10.0.0.3/24')
+    add_link_type_vlan(enode, '1', 'eth1.20', 20)
+    assert 'eth1.20' in enode.ports
+    with pytest.raises(PipelineError) as excinfo:
+        flush_pipeline(enode)
+    assert excinfo.value.command == 'ip addr add 10.0.0.3/24 dev eth2'
+    assert excinfo.value.response == 'Error: ipv4: Address already assigned.'
+    assert excinfo.value.skipped == [
+        'ip link add link eth1 name eth1.20 type vlan id 20'
+    ]
+    assert 'eth1.20' not in enode.ports
+
+    interface(enode, '1', up=False)
+    disable_pipelining(enode)
+    interface(enode, '1', up=True)
+    assert enode.sent[-2:] == [
+        'ip link set dev eth1 down && printf \'%s_%d\\n\' {} 0'.format(
+            enode.sent[-2].split(' ')[-2]
+        ),
+        'ip link set dev eth1 up'
+    ]
+
+
+def test_netns():
+    enode = MockNode({'ip -n ns1 -j -s -d addr show': IP_J_S_D_ADDR_SHOW})
+
+    interface(enode, '1', addr='10.0.0.1/24', netns='ns1')
+    list_interfaces_brief(enode, netns='ns1')
+    assert enode.sent == [
+        'ip -n ns1 addr add 10.0.0.1/24 dev eth1',
+        'ip netns exec ns1 sh -c \'ip -br link show; echo IP_BRIEF_ADDR; '
+        'ip -br addr show\''
+    ]
+
+    assert list(show_interfaces(enode, netns='ns1')) == ['eth0']
+    assert enode.sent[-1] == 'ip -n ns1 -j -s -d addr show'
+
+    with pytest.raises(ValueError):
+        interface(enode, '1', up=True, netns='ns1; reboot')
+
+    # Labels of the node, or device names
+    interface(enode, 'eth9', up=True, netns='ns1')
+    assert enode.sent[-1] == 'ip -n ns1 link set dev eth9 up'
+    for portlbl in ('1 ', 'eth0/1', '..', 'a' * 16):
+        with pytest.raises(KeyError):
+            interface(enode, portlbl, up=True, netns='ns1')
+
+
+def test_show_interfaces_all_netns():
+    json_node = MockNode({
+        'ip -j -s -d addr show; echo IP_ALL_NETNS': (
+            IP_J_S_D_ADDR_SHOW + '\nIP_ALL_NETNS\n\nnetns: ns1\n' +
+            IP_J_S_D_ADDR_SHOW + '\n\nnetns: ns2\n[]\n'
+        )
+    })
+    text_node = MockNode({
+        'ip addr show; echo IP_NETNS_STATS': (
+            IP_ADDR_LIST + 'IP_NETNS_STATS\n' + IP_S_LINK_LIST +
+            'IP_ALL_NETNS\n\nnetns: ns1\n' +
+            IP_ADDR_LIST + 'IP_NETNS_STATS\n' + IP_S_LINK_LIST +
+            '\nnetns: ns2\nIP_NETNS_STATS\n'
+        )
+    })
+
+    json_result = show_interfaces_all_netns(json_node)
+    text_result = show_interfaces_all_netns(text_node, use_json=False)
+    assert len(json_node.sent) == len(text_node.sent) == 1
+
+    for result in (json_result, text_result):
+        assert list(result) == [None, 'ns1', 'ns2']
+        assert list(result[None]) == list(result['ns1']) == ['eth0']
+        assert not result['ns2']
+        assert result['ns1']['eth0']['addresses'][0]['address'] == \
+            '192.0.2.2'
+    assert text_result['ns1']['eth0'].stats == \
+        json_result['ns1']['eth0'].stats
+
+    # Nodes with CRLF line endings
+    text_node.responses = {
+        prefix: response.replace('\n', '\r\n')
+        for prefix, response in text_node.responses.items()
+    }
+    crlf_result = show_interfaces_all_netns(text_node, use_json=False)
+    assert crlf_result['ns1']['eth0'].stats == \
+        text_result['ns1']['eth0'].stats
+
+    # A namespace without output has no interfaces, a failed one raises
+    enode = MockNode({
+        'ip -j -s -d addr show; echo IP_ALL_NETNS': (
+            IP_J_S_D_ADDR_SHOW + '\nIP_ALL_NETNS\n\nnetns: ns1\n'
+        )
+    })
+    assert show_interfaces_all_netns(enode)['ns1'] == {}
+
+    for use_json, response in [
+            (True, IP_J_S_D_ADDR_SHOW),
+            (False, IP_ADDR_LIST + 'IP_NETNS_STATS\n' + IP_S_LINK_LIST)]:
+        enode = MockNode({'ip': (
+            response + '\nIP_ALL_NETNS\n\nnetns: ns1\n'
+            'setting the network namespace "ns1" failed: Invalid argument\n'
+        )})
+        with pytest.raises(AssertionError) as excinfo:
+            show_interfaces_all_netns(enode, use_json=use_json)
+        assert 'network namespace ns1' in str(excinfo.value)
@@ -0,0 +1,127 @@
+# -*- coding: utf-8 -*-
+#
+# Copyright (C) 2015-2016 Hewlett Packard Enterprise Development LP
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#   http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing,
+# software distributed under the License is distributed on an
+# "AS IS" BASIS, WITHOUT WARRANTIES OR CONDITIONS OF ANY
+# KIND, either express or implied.  See the License for the
+# specific language governing permissions and limitations
+# under the License.
+
+"""
+Test suite for module topology_lib_ip.netlink.
+"""
+
+from __future__ import unicode_literals, absolute_import
+from __future__ import print_function, division
+
+import socket
+from sys import platform
+
+import pytest
+
+from topology_lib_ip import netlink
+from topology_lib_ip.library import (
+    interface, show_interface, add_link_type_vlan, enable_pipelining,
+    disable_pipelining
+)
+from topology_lib_ip.netlink import (
+    NetlinkSocket, _address_flags, _attr, _link_flags, _parse_attrs
+)
+
+from test_library import MockNode, ShellNode
+
+
+def test_flags():
+    assert _link_flags(0x1003, False) == 'NO-CARRIER,BROADCAST,MULTICAST,UP'
+    assert _link_flags(0x11043, False) == \
+        'BROADCAST,MULTICAST,UP,LOWER_UP'
+    assert _link_flags(0x1002, True) == 'BROADCAST,MULTICAST,M-DOWN'
+
+    assert _address_flags(socket.AF_INET, 0x81) == ['secondary']
+    assert _address_flags(socket.AF_INET6, 0x203) == [
+        'temporary', 'nodad', 'dynamic', 'noprefixroute'
+    ]
+
+
+def test_attrs():
+    data = _attr(3, b'eth0\0') + _attr(4, b'\xdc\x05\0\0')
+    assert _parse_attrs(data, 0) == {3: b'eth0\0', 4: b'\xdc\x05\0\0'}
+
+
+@pytest.mark.skipif(
+    not platform.startswith('linux'), reason='rtnetlink requires Linux'
+)
+def test_show_interfaces():
+    sock = NetlinkSocket()
+    try:
+        lo = sock.show_interface('lo')
+        assert sock.show_interface('nonexistent0') is None
+    finally:
+        sock.close()
+
+    assert lo['link_type'] == 'loopback'
+    assert lo['mac_address'] == '00:00:00:00:00:00'
+    assert 'LOOPBACK' in lo['falgs_str'].split(',')
+    assert 'rx_bytes' in lo
+
+
+class FakeSocket(object):
+
+    def __init__(self):
+        self.calls = []
+
+    def interface(self, dev, addr=None, up=None):
+        self.calls.append(('interface', dev, addr, up))
+
+    def show_interface(self, dev):
+        self.calls.append(('show_interface', dev))
+        return {'dev': dev}
+
+
+def test_backend_selection(monkeypatch):
+    sock = FakeSocket()
+    monkeypatch.setitem(netlink._SOCKETS, '/run/netns/hs1', sock)
+
+    enode = MockNode()
+    enode.netns_path = '/run/netns/hs1'
+    interface(enode, '1', addr='10.0.0.1/24', up=True)
+    assert show_interface(enode, 'eth1') == {'dev': 'eth1'}
+
+    # JSON and text outputs can still be requested explicitly
+    show_interface(enode, 'eth1', use_json=False)
+
+    assert sock.calls == [
+        ('interface', 'eth1', '10.0.0.1/24', True),
+        ('show_interface', 'eth1')
+    ]
+    assert enode.sent == ['ip addr list dev eth1']
+
+
+def test_backend_pipelining(monkeypatch):
+    sock = FakeSocket()
+    monkeypatch.setitem(netlink._SOCKETS, '/run/netns/hs1', sock)
+
+    enode = ShellNode()
+    enode.netns_path = '/run/netns/hs1'
+    enable_pipelining(enode)
+    try:
+        add_link_type_vlan(enode, '1', 'eth1.10', 10)
+        assert not enode.sent
+
+        # The vlan device is created before its address is set
+        interface(enode, 'eth1.10', addr='10.0.0.1/24')
+        assert len(enode.sent) == 1
+        assert enode.sent[0].startswith(
+            'ip link add link eth1 name eth1.10 type vlan id 10 && printf '
+        )
+        assert sock.calls == [('interface', 'eth1.10', '10.0.0.1/24', None)]
+    finally:
+        disable_pipelining(enode)
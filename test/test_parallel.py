@@ -0,0 +1,79 @@
+# -*- coding: utf-8 -*-
+#
+# Copyright (C) 2015-2016 Hewlett Packard Enterprise Development LP
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#   http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing,
+# software distributed under the License is distributed on an
+# "AS IS" BASIS, WITHOUT WARRANTIES OR CONDITIONS OF ANY
+# KIND, either express or implied.  See the License for the
+# specific language governing permissions and limitations
+# under the License.
+
+"""
+Test suite for module topology_lib_ip.parallel.
+"""
+
+from __future__ import unicode_literals, absolute_import
+from __future__ import print_function, division
+
+from topology_lib_ip.library import add_route
+from topology_lib_ip.parallel import run_parallel
+
+
+class MockNode(object):
+
+    def __init__(self, response=''):
+        self.response = response
+        self.ports = {'1': 'eth1'}
+        self.sent = []
+
+    def __call__(self, cmd, shell=None):
+        self.sent.append(cmd)
+        return self.response
+
+
+def test_run_parallel():
+    nodes = [MockNode() for _ in range(10)]
+
+    results = run_parallel(
+        [
+            (enode, [
+                ('interface', ('1',), {'up': True}),
+                (add_route, ('default', '10.0.0.{}'.format(index + 1)))
+            ]) for index, enode in enumerate(nodes)
+        ],
+        max_workers=4
+    )
+
+    assert list(results) == nodes
+    assert all(result.ok for result in results.values())
+    assert nodes[3].sent == [
+        'ip link set dev eth1 up',
+        'ip -4 route add default via 10.0.0.4'
+    ]
+
+
+def test_run_parallel_errors():
+    failing = MockNode('RTNETLINK answers: File exists')
+    nodes = [failing, MockNode(), MockNode()]
+    operations = [(enode, [('interface', ('1',), {'up': True})] * 2)
+                  for enode in nodes]
+
+    results = run_parallel(operations)
+    assert isinstance(results[failing].exception, AssertionError)
+    assert len(failing.sent) == 1
+    assert results[nodes[1]].ok
+
+    for enode in nodes:
+        enode.sent = []
+
+    results = run_parallel(operations, max_workers=1, fail_fast=True)
+    assert not results[failing].ok
+    assert results[nodes[1]].cancelled
+    assert not nodes[1].sent
@@ -0,0 +1,111 @@
+# -*- coding: utf-8 -*-
+#
+# Copyright (C) 2015-2016 Hewlett Packard Enterprise Development LP
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#   http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing,
+# software distributed under the License is distributed on an
+# "AS IS" BASIS, WITHOUT WARRANTIES OR CONDITIONS OF ANY
+# KIND, either express or implied.  See the License for the
+# specific language governing permissions and limitations
+# under the License.
+
+"""
+Test suite for module topology_lib_ip.plan.
+"""
+
+from __future__ import unicode_literals, absolute_import
+from __future__ import print_function, division
+
+import pytest
+
+from topology_lib_ip.plan import AddressPlan, AddressConflict
+
+from test_library import MockNode
+
+
+def test_address_plan():
+    hs1 = MockNode(ports={'1': 'eth1'})
+    sw1 = MockNode(ports={'1': 'eth1', '2': 'eth2', '3': 'eth3'})
+
+    plan = AddressPlan('10.0.0.0/24')
+    assert plan.add_links([
+        [(hs1, '1'), (sw1, '1')],
+        [(sw1, '2'), (sw1, '3')]
+    ]) == 2
+    assert plan.add_link([(sw1, '3')], prefixlen=29) == '10.0.0.8/29'
+    assert [plan.subnet(index) for index in range(len(plan))] == [
+        '10.0.0.0/31', '10.0.0.2/31', '10.0.0.8/29'
+    ]
+    assert plan.addresses() == {
+        hs1: [('1', '10.0.0.0/31')],
+        sw1: [('1', '10.0.0.1/31'), ('2', '10.0.0.2/31'),
+              ('3', '10.0.0.3/31'), ('3', '10.0.0.9/29')]
+    }
+
+    results = plan.push()
+    assert all(result.ok for result in results.values())
+    assert hs1.sent == [
+        'ip -force -batch - <<\'IP_BATCH_EOF\'\n'
+        'addr add 10.0.0.0/31 dev eth1\n'
+        'link set dev eth1 up\n'
+        'IP_BATCH_EOF'
+    ]
+
+    with pytest.raises(ValueError):
+        plan.add_links([[(hs1, '1')] * 3])
+    with pytest.raises(ValueError):
+        AddressPlan('10.0.0.0/30').add_links([[]] * 3)
+
+
+def test_address_plan_conflicts():
+    hs1 = MockNode()
+
+    plan = AddressPlan('10.0.0.0/16')
+    plan.add_links([[(hs1, '1')]] * 4)
+    plan.reserve('10.0.0.4/30')
+    plan.assign('192.0.2.0/24', [(hs1, '1')])
+    plan.assign('192.0.2.128/25')
+
+    with pytest.raises(AddressConflict) as excinfo:
+        plan.push()
+
+    assert excinfo.value.conflicts == [
+        ('10.0.0.4/31', '10.0.0.4/30'),
+        ('10.0.0.4/30', '10.0.0.6/31'),
+        ('192.0.2.0/24', '192.0.2.128/25')
+    ]
+    assert not hs1.sent
+
+    with pytest.raises(ValueError):
+        plan.assign('fd00::/64')
+
+
+def test_address_plan_nested_conflicts():
+    plan = AddressPlan('10.0.0.0/8')
+    plan.reserve('10.0.0.0/24')
+    plan.reserve('10.0.0.16/28')
+    plan.reserve('10.0.0.24/29')
+    plan.reserve('10.0.1.0/24')
+
+    with pytest.raises(AddressConflict) as excinfo:
+        plan.check()
+
+    assert excinfo.value.conflicts == [
+        ('10.0.0.0/24', '10.0.0.16/28'),
+        ('10.0.0.0/24', '10.0.0.24/29'),
+        ('10.0.0.16/28', '10.0.0.24/29')
+    ]
+
+
+def test_address_plan_ipv6_low_range():
+    hs1 = MockNode()
+
+    plan = AddressPlan('::/96')
+    assert plan.add_link([(hs1, '1'), (hs1, '2')]) == '::/127'
+    assert plan.addresses() == {hs1: [('1', '::/127'), ('2', '::1/127')]}
@@ -0,0 +1,81 @@
+# -*- coding: utf-8 -*-
+#
+# Copyright (C) 2015-2016 Hewlett Packard Enterprise Development LP
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#   http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing,
+# software distributed under the License is distributed on an
+# "AS IS" BASIS, WITHOUT WARRANTIES OR CONDITIONS OF ANY
+# KIND, either express or implied.  See the License for the
+# specific language governing permissions and limitations
+# under the License.
+
+
+"""
+Test suite for module topology_lib_ip.results.
+"""
+
+from __future__ import unicode_literals, absolute_import
+from __future__ import print_function, division
+
+from copy import deepcopy
+from pickle import dumps, loads
+
+import pytest
+
+from topology_lib_ip.results import InterfaceInfo, LinkStats
+from topology_lib_ip.stats import COUNTERS
+
+
+def test_link_stats():
+    stats = LinkStats(str(value) for value in range(12))
+
+    assert stats['rx_bytes'] == 0
+    assert stats['tx_collisions'] == 11
+    assert list(stats) == list(COUNTERS)
+    assert stats.to_dict() == dict(zip(COUNTERS, range(12)))
+
+    stats['rx_bytes'] = 5
+    assert stats == dict(zip(COUNTERS, [5] + list(range(1, 12))))
+    assert LinkStats.from_dict({'tx_bytes': 3})['tx_bytes'] == 3
+
+    with pytest.raises(KeyError):
+        stats['rx_missed']
+
+
+def test_interface_info():
+    d = InterfaceInfo(
+        os_index='4', dev='eth0', mtu='1500', state='UP', addresses=[]
+    )
+
+    assert d['os_index'] == 4
+    assert d['mtu'] == 1500
+    assert 'inet' not in d
+    assert 'rx_bytes' not in d
+    assert d
+
+    d.stats = {'rx_bytes': 10}
+    d['inet'] = '192.0.2.1'
+    d['vrf'] = 'red'
+    assert d['rx_bytes'] == 10
+    assert d.get('tx_bytes') == 0
+    assert d == dict(
+        d.stats.to_dict(), os_index=4, dev='eth0', mtu=1500, state='UP',
+        inet='192.0.2.1', addresses=[], vrf='red'
+    )
+
+    del d['inet']
+    assert 'inet' not in d
+    with pytest.raises(KeyError):
+        del d['inet']
+
+    for copy in (d.copy(), deepcopy(d), loads(dumps(d))):
+        assert copy == d
+        copy['tx_bytes'] = 1
+        assert d['tx_bytes'] == 0
+    assert type(d.to_dict()) is dict
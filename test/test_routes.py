@@ -0,0 +1,44 @@
+# -*- coding: utf-8 -*-
+#
+# Copyright (C) 2015-2016 Hewlett Packard Enterprise Development LP
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#   http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing,
+# software distributed under the License is distributed on an
+# "AS IS" BASIS, WITHOUT WARRANTIES OR CONDITIONS OF ANY
+# KIND, either express or implied.  See the License for the
+# specific language governing permissions and limitations
+# under the License.
+
+"""
+Test suite for module topology_lib_ip.routes.
+"""
+
+from __future__ import unicode_literals, absolute_import
+from __future__ import print_function, division
+
+from topology_lib_ip.routes import RouteTable
+
+
+def test_route_table_lookup():
+    table = RouteTable([
+        {'dst': '::/0', 'via': 'fd00::1'},
+        {'dst': '2001:db8::/32', 'via': 'fd00::2'},
+        {'dst': '2001:db8:1::/48', 'via': 'fd00::3', 'metric': 20},
+        {'dst': '2001:db8:1::/48', 'via': 'fd00::4', 'metric': 10},
+        {'dst': '10.0.0.0/8', 'via': '192.0.2.1'}
+    ])
+
+    assert len(table) == 5
+    assert table.lookup('2001:db8:1::1')['via'] == 'fd00::4'
+    assert table.lookup('2001:db8:2::1')['via'] == 'fd00::2'
+    assert table.lookup('fd01::1')['via'] == 'fd00::1'
+    assert table.lookup('10.255.255.255')['via'] == '192.0.2.1'
+    assert table.lookup('11.0.0.0') is None
+    assert table.get('2001:db8::/32')['via'] == 'fd00::2'
+    assert table.get('2001:db8::/33') is None
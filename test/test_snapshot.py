@@ -0,0 +1,80 @@
+# -*- coding: utf-8 -*-
+#
+# Copyright (C) 2015-2016 Hewlett Packard Enterprise Development LP
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#   http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing,
+# software distributed under the License is distributed on an
+# "AS IS" BASIS, WITHOUT WARRANTIES OR CONDITIONS OF ANY
+# KIND, either express or implied.  See the License for the
+# specific language governing permissions and limitations
+# under the License.
+
+
+"""
+Test suite for module topology_lib_ip.snapshot.
+"""
+
+from __future__ import unicode_literals, absolute_import
+from __future__ import print_function, division
+
+from topology_lib_ip.snapshot import (
+    InterfaceChange, InterfaceSnapshot, take_snapshot
+)
+
+from test_library import (
+    MockNode, IP_ADDR_LIST, IP_ADDR_LIST_LO, IP_S_LINK_LIST,
+    IP_S_LINK_LIST_LO
+)
+
+
+def test_snapshot_diff():
+    enode = MockNode({
+        'ip addr show': IP_ADDR_LIST_LO + IP_ADDR_LIST,
+        'ip -s link show': IP_S_LINK_LIST_LO + IP_S_LINK_LIST
+    })
+    previous = take_snapshot(enode, use_json=False)
+    assert list(previous) == ['lo', 'eth0']
+    assert not previous.diff(previous)
+
+    enode.responses = {
+        'ip addr show': IP_ADDR_LIST.replace(
+            'state UP', 'state DOWN'
+        ).replace('192.0.2.2/24', '192.0.2.3/24'),
+        'ip -s link show': IP_S_LINK_LIST.replace(
+            '414194      92', '414294      93'
+        )
+    }
+    snapshot = take_snapshot(enode, use_json=False)
+
+    assert snapshot.diff(previous) == {
+        'eth0': InterfaceChange('eth0', 'changed', {
+            'state': ('UP', 'DOWN'),
+            'addresses': (
+                ('192.0.2.2/24', 'fd00::2/64', 'fe80::fc:ff:fe00:1/64'),
+                ('192.0.2.3/24', 'fd00::2/64', 'fe80::fc:ff:fe00:1/64')
+            ),
+            'rx_bytes': (414194, 414294),
+            'rx_packets': (92, 93)
+        }),
+        'lo': InterfaceChange('lo', 'removed', {})
+    }
+    fields = snapshot.diff(previous, threshold=1000)['eth0'].fields
+    assert set(fields) == {'state', 'addresses'}
+    changes = snapshot.diff(previous, threshold={'rx_packets': 1})
+    fields = changes['eth0'].fields
+    assert set(fields) == {'state', 'addresses', 'rx_packets'}
+    assert previous.diff(snapshot)['lo'].change == 'added'
+
+
+def test_snapshot_diff_equal_hashes():
+    # hash(-1) == hash(-2) in CPython, so both states hash the same
+    previous = InterfaceSnapshot({'eth0': {'state': 'UP', 'mtu': -1}})
+    snapshot = InterfaceSnapshot({'eth0': {'state': 'UP', 'mtu': -2}})
+
+    assert snapshot.diff(previous)['eth0'].fields == {'mtu': (-1, -2)}
@@ -0,0 +1,46 @@
+# -*- coding: utf-8 -*-
+#
+# Copyright (C) 2015-2016 Hewlett Packard Enterprise Development LP
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#   http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing,
+# software distributed under the License is distributed on an
+# "AS IS" BASIS, WITHOUT WARRANTIES OR CONDITIONS OF ANY
+# KIND, either express or implied.  See the License for the
+# specific language governing permissions and limitations
+# under the License.
+
+"""
+Test suite for module topology_lib_ip.stats.
+"""
+
+from __future__ import unicode_literals, absolute_import
+from __future__ import print_function, division
+
+from topology_lib_ip.stats import COUNTERS, counter_delta, StatsBuffer
+
+
+def test_counter_delta():
+    assert counter_delta(100, 150) == 50
+    assert counter_delta(2 ** 32 - 10, 5) == 15
+    assert counter_delta(2 ** 40, 5) == 2 ** 64 - 2 ** 40 + 5
+
+
+def test_stats_buffer():
+    buffer = StatsBuffer()
+
+    for timestamp, rx_bytes in ((0.0, 2 ** 32 - 100), (2.0, 100)):
+        counters = dict.fromkeys(COUNTERS, 0)
+        counters['rx_bytes'] = rx_bytes
+        buffer.append(timestamp, {'eth0': counters})
+
+    assert len(buffer) == 2
+    assert buffer.devs == ['eth0']
+    assert list(buffer.counters('eth0', 'rx_bytes')) == [2 ** 32 - 100, 100]
+    assert list(buffer.rates('eth0', 'rx_bytes')) == [100.0]
+    assert list(buffer.rates('eth0', 'tx_bytes')) == [0.0]
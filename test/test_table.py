@@ -0,0 +1,66 @@
+# -*- coding: utf-8 -*-
+#
+# Copyright (C) 2015-2016 Hewlett Packard Enterprise Development LP
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#   http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing,
+# software distributed under the License is distributed on an
+# "AS IS" BASIS, WITHOUT WARRANTIES OR CONDITIONS OF ANY
+# KIND, either express or implied.  See the License for the
+# specific language governing permissions and limitations
+# under the License.
+
+
+"""
+Test suite for module topology_lib_ip.table.
+"""
+
+from __future__ import unicode_literals, absolute_import
+from __future__ import print_function, division
+
+from io import StringIO
+
+from topology_lib_ip.table import collect_stats_table
+
+from test_library import MockNode, IP_S_LINK_LIST, IP_S_LINK_LIST_LO
+
+
+def test_collect_stats_table():
+    hs1 = MockNode({'ip -s link show': IP_S_LINK_LIST_LO + IP_S_LINK_LIST})
+    hs2 = MockNode({'ip -s link show': IP_S_LINK_LIST.replace(
+        '414194', '1000'
+    )})
+    hs3 = MockNode()
+    hs3.responses = None
+
+    table = collect_stats_table(
+        {'hs1': hs1, 'hs2': hs2, 'hs3': hs3}, use_json=False
+    )
+
+    assert len(table) == 3
+    assert table.nodes == ['hs1', 'hs2']
+    assert list(table.errors) == ['hs3']
+    assert hs1.sent == ['ip -s link show']
+    assert table.column('node') == ['hs1', 'hs1', 'hs2']
+    assert table.column('dev') == ['lo', 'eth0', 'eth0']
+
+    rx_bytes = table.column('rx_bytes')
+    assert table.sum('rx_bytes') == sum(rx_bytes)
+    assert table.sum('rx_bytes', by_node=True) == {
+        'hs1': rx_bytes[0] + 414194, 'hs2': 1000
+    }
+    assert table.top('rx_bytes', 2) == [
+        ('hs1', 'lo', rx_bytes[0]), ('hs1', 'eth0', 414194)
+    ]
+
+    output = StringIO()
+    table.to_csv(output)
+    lines = output.getvalue().splitlines()
+    assert lines[0].startswith('node,dev,rx_bytes,rx_packets,')
+    assert lines[3].startswith('hs2,eth0,1000,92,')
+    assert list(table.to_columns()) == list(table.columns)